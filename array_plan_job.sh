@@ -0,0 +1,44 @@
+#!/bin/bash
+#SBATCH --partition=anywhere
+#SBATCH --job-name=flapy
+#SBATCH --time=24:00:00
+#SBATCH --mem=16GB
+#SBATCH --nodes=1-1
+#SBATCH --ntasks=1
+#SBATCH --signal=B:TERM@300
+#SBATCH --array=1-1
+
+# Runs the group of projects of one array task, see flapy/cluster_plan.py
+
+n=${SLURM_ARRAY_TASK_ID}
+plan_dir=$1
+task_csv="${plan_dir}/task_${n}.csv"
+
+LOCAL="/local/hdd/${USER}"
+mkdir -p "${LOCAL}"
+
+echo "Run Jobs of ${task_csv}"
+
+function sighdl {
+  # The campaign queues the running project again, such that
+  # `flapy plan requeue' picks it up
+  kill -TERM "${srunPid}" || true
+}
+
+mkdir -p "/scratch/${USER}/flapy-results/run"
+OUT_FILE="/scratch/${USER}/flapy-results/run/task-${SLURM_ARRAY_JOB_ID}_${n}.txt"
+
+srun \
+  --user-cgroups=on \
+  --output="${OUT_FILE}" \
+  --error="${OUT_FILE}" \
+  -- \
+  poetry run flapy campaign "${task_csv}" \
+    --local "${LOCAL}" \
+    --logs "/scratch/${USER}/flapy-results/run/task-${SLURM_ARRAY_JOB_ID}_${n}" \
+    --events "${task_csv}.events.jsonl" \
+  & srunPid=$!
+
+trap sighdl INT TERM HUP QUIT
+
+while ! wait; do true; done
@@ -0,0 +1,192 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Decides which tests need further runs until their verdict is settled."""
+import math
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flapy.junit import iter_testcases
+
+
+def _binomial_cdf(k: int, n: int, p: float) -> float:
+    """Returns P(X <= k) for X ~ Binomial(n, p)."""
+    if k < 0:
+        return 0.0
+    if k >= n or p <= 0.0:
+        return 1.0
+    if p >= 1.0:
+        return 0.0
+    return min(
+        1.0,
+        sum(
+            math.exp(
+                math.lgamma(n + 1)
+                - math.lgamma(i + 1)
+                - math.lgamma(n - i + 1)
+                + i * math.log(p)
+                + (n - i) * math.log(1 - p)
+            )
+            for i in range(k + 1)
+        ),
+    )
+
+
+def _bisect(function: Callable[[float], float]) -> float:
+    """Finds the root of a function increasing on [0, 1]."""
+    low, high = 0.0, 1.0
+    for _ in range(60):
+        middle = (low + high) / 2
+        if function(middle) < 0:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def flake_rate_interval(k: int, n: int, confidence: float) -> Tuple[float, float]:
+    """Computes the Clopper-Pearson interval of a rate.
+
+    :param k: Number of runs with the rarer outcome
+    :param n: Number of runs
+    :param confidence: Confidence level of the interval, e.g., 0.95
+    :return: Lower and upper bound of the rate
+    """
+    if n == 0:
+        return 0.0, 1.0
+    alpha = 1 - confidence
+    lower = 0.0
+    if k > 0:
+        lower = _bisect(lambda p: 1 - _binomial_cdf(k - 1, n, p) - alpha / 2)
+    upper = 1.0
+    if k < n:
+        upper = _bisect(lambda p: alpha / 2 - _binomial_cdf(k, n, p))
+    return lower, upper
+
+
+# pylint: disable=too-few-public-methods
+@dataclass
+class Outcomes:
+    """The outcomes of a single test over all iterations so far."""
+
+    passed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    iterations: int = 0
+    durations: List[float] = field(default_factory=list)
+
+    @property
+    def runs(self) -> int:
+        """Returns the number of runs that passed or failed."""
+        return self.passed + self.failed
+
+    @property
+    def suspicious(self) -> bool:
+        """Checks whether the test shows signs of possible flakiness.
+
+        Tests are suspicious, if they have failed (a rare pass may follow) or if
+        their duration varies strongly, which indicates waiting for timers,
+        network or other resources.
+        """
+        if self.failed > 0:
+            return True
+        return (
+            len(self.durations) > 1
+            and max(self.durations) > 2 * min(self.durations) + 0.5
+        )
+
+    def interval(self, confidence: float) -> Tuple[float, float]:
+        """Returns the interval of the rate of the rarer outcome."""
+        return flake_rate_interval(min(self.passed, self.failed), self.runs, confidence)
+
+
+class AdaptiveBudget:
+    """Collects the outcomes of the iterations and decides which tests still need
+    runs.
+
+    A test is settled, once it has both passed and failed (it is flaky), or once
+    it was run in min_runs iterations and either is not suspicious or the upper
+    bound of its flake rate is below the target.
+    """
+
+    def __init__(self, min_runs: int, confidence: float, flake_rate: float) -> None:
+        """
+        :param min_runs: Number of iterations every test is run in
+        :param confidence: Confidence level of the flake-rate intervals
+        :param flake_rate: Suspicious tests are rerun until the upper bound of
+            their flake rate is below this rate
+        """
+        self._min_runs = min_runs
+        self._confidence = confidence
+        self._flake_rate = flake_rate
+        self.tests: Dict[str, Outcomes] = {}
+
+    def record(self, xml_file: str) -> None:
+        """Adds the outcomes of a JUnit XML file."""
+        seen = set()
+        for testcase in iter_testcases(xml_file):
+            nodeid = testcase.nodeid
+            outcomes = self.tests.setdefault(nodeid, Outcomes())
+            if testcase.result == "skipped":
+                outcomes.skipped += 1
+            elif testcase.failed:
+                outcomes.failed += 1
+            else:
+                outcomes.passed += 1
+            outcomes.durations.append(testcase.time)
+            if nodeid not in seen:
+                seen.add(nodeid)
+                outcomes.iterations += 1
+
+    def settlement(self, nodeid: str) -> Optional[str]:
+        """Returns why the verdict of a test is settled, or None if it is not."""
+        outcomes = self.tests[nodeid]
+        if outcomes.passed > 0 and outcomes.failed > 0:
+            return "flaky"
+        if outcomes.iterations < self._min_runs:
+            return None
+        if outcomes.runs == 0:
+            return "skipped"
+        if not outcomes.suspicious:
+            return "stable"
+        if outcomes.interval(self._confidence)[1] < self._flake_rate:
+            return "confident"
+        return None
+
+    def unsettled(self) -> List[str]:
+        """Returns the node ids of the tests that need further runs."""
+        return sorted(
+            nodeid for nodeid in self.tests if self.settlement(nodeid) is None
+        )
+
+    @property
+    def executions(self) -> int:
+        """Returns the number of test executions recorded so far."""
+        return sum(outcomes.runs + outcomes.skipped for outcomes in self.tests.values())
+
+    def report(self) -> Dict[str, Any]:
+        """Returns the outcomes, flake-rate interval and settlement of all tests."""
+        return {
+            "confidence": self._confidence,
+            "executions": self.executions,
+            "tests": {
+                nodeid: {
+                    "passed": outcomes.passed,
+                    "failed": outcomes.failed,
+                    "skipped": outcomes.skipped,
+                    "iterations": outcomes.iterations,
+                    "flake_rate_interval": outcomes.interval(self._confidence),
+                    "settled": self.settlement(nodeid),
+                }
+                for nodeid, outcomes in sorted(self.tests.items())
+            },
+        }
@@ -0,0 +1,111 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Folds the results of the iterations into per-test verdicts as they finish."""
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional, Set
+
+from flapy.junit import iter_testcases
+
+LOGGER = logging.getLogger("RepositoryAnalyser.Aggregation")
+
+
+class ResultAggregator:
+    """Counts how often each test passed and failed over the iterations.
+
+    A test is flaky, once it has both passed and failed.  The JUnit XML files are
+    read incrementally, such that the memory needed depends on the number of
+    tests only.  After every file, the state is written to a summary file, which
+    shows the progress of a running analysis and allows resuming it.
+    """
+
+    def __init__(self, project: str, summary_file: Optional[str] = None) -> None:
+        """
+        :param project: The name of the project, written to the summary
+        :param summary_file: The JSON file the state is written to, if any
+        """
+        self._project = project
+        self._summary_file = summary_file
+        self.files: List[str] = []
+        # The number of passed and failed executions of each test
+        self.tests: Dict[str, Dict[str, int]] = {}
+        self.flaky_tests: Set[str] = set()
+
+    def resume(self) -> int:
+        """Restores the state from the summary file, if it exists.
+
+        :return: The number of result files already folded
+        """
+        if self._summary_file is None or not os.path.exists(self._summary_file):
+            return 0
+        with open(self._summary_file) as file:
+            summary = json.load(file)
+        self.files = summary["files"]
+        self.tests = summary["tests"]
+        self.flaky_tests = set(summary["flaky_tests"])
+        return len(self.files)
+
+    def has(self, xml_file: str) -> bool:
+        """Checks whether the results of a file have already been folded."""
+        return xml_file in self.files
+
+    def fold(self, xml_file: str) -> List[str]:
+        """Adds the results of a JUnit XML file, unless they have already been
+        added, and rewrites the summary file.
+
+        :return: The tests found flaky by this file
+        """
+        if self.has(xml_file):
+            return []
+        new_flaky = []
+        try:
+            for testcase in iter_testcases(xml_file):
+                if not testcase.classname or not testcase.name:
+                    continue
+                name = testcase.classname + "." + testcase.name
+                counts = self.tests.setdefault(name, {"passed": 0, "failed": 0})
+                counts["failed" if testcase.result == "failure" else "passed"] += 1
+                if (
+                    counts["passed"] > 0
+                    and counts["failed"] > 0
+                    and name not in self.flaky_tests
+                ):
+                    self.flaky_tests.add(name)
+                    new_flaky.append(name)
+        except ET.ParseError as error:
+            LOGGER.warning("Could not read %s: %s", xml_file, error)
+        self.files.append(xml_file)
+        self.write()
+        return new_flaky
+
+    def summary(self) -> Dict[str, Any]:
+        """Returns the current state as a JSON serializable dict."""
+        return {
+            "project": self._project,
+            "time": time.time(),
+            "files": self.files,
+            "number_of_tests": len(self.tests),
+            "flaky_tests": sorted(self.flaky_tests),
+            "tests": self.tests,
+        }
+
+    def write(self) -> None:
+        """Atomically replaces the summary file with the current state."""
+        if self._summary_file is None:
+            return
+        with open(self._summary_file + ".tmp", "w") as file:
+            json.dump(self.summary(), file, indent=2)
+        os.replace(self._summary_file + ".tmp", self._summary_file)
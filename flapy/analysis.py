@@ -13,16 +13,21 @@
 # along with this project.  If not, see <https://www.gnu.org/licenses>.
 """Provides an analysis for possible flaky tests."""
 import argparse
+import concurrent.futures
 import contextlib
+import hashlib
+import json
 import logging
+import multiprocessing
 import os
 import re
+import shlex
 import shutil
 import subprocess
 import sys
 import xml.etree.ElementTree as ET
 from abc import ABCMeta, abstractmethod
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from enum import Enum
 from typing import (
     Union,
@@ -41,12 +46,44 @@ import pipfile  # type: ignore
 import virtualenv as virtenv  # type: ignore
 
 from flapy import tempfile_seeded
+from flapy.adaptive import AdaptiveBudget
+from flapy.aggregation import ResultAggregator
+from flapy.coverage_policy import POLICIES, CoverageOverhead, wants_coverage
+from flapy.durations import DurationStore, derive_timeouts
+from flapy.failures import FailureTracker, classify_run, write_failure_report
+from flapy.install_planner import InstallPlanner, InstallReport
+from flapy.junit import iter_testcases, strip_repeat_suffix
+from flapy.order import coverage, plan_orders
+from flapy.sidecar import read_summary, sidecar_file
+from flapy.suspects import rank_suspects
+from flapy.utils import git_revision
+from flapy.venv_cache import VenvCache
+from flapy.wheelhouse import Wheelhouse
+from flapy.workspace import (
+    DEFAULT_EXCLUDES,
+    CopyStats,
+    CopyStrategy,
+    ExclusionSpec,
+    WorkspaceSnapshot,
+    WorkspaceStrategy,
+    select_strategy,
+)
+
+# The fork server run by PyTestRunner.run_zygote
+ZYGOTE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zygote.py")
+
+# The pytest plugins loaded by name (`-p flapy_order') from PYTHONPATH
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pytest_plugins")
+
+# Seconds after which pytest-timeout stops a test, unless --adaptive-timeouts
+DEFAULT_TIMEOUT = 10
 
 
 class FileUtils:
     """Provides static file utility methods."""
 
     _copies: List[Any] = []
+    last_copy_stats: Optional[CopyStats] = None
 
     @classmethod
     def get_available_tempdir_path(cls, tmp_dir_prefix):
@@ -66,14 +103,22 @@ class FileUtils:
         src_dir: Union[str, os.PathLike],
         tmp_dir_prefix: str = None,
         tmp_dir_path: str = None,
+        strategy: WorkspaceStrategy = None,
+        ignore: Optional[
+            Callable[[Union[str, os.PathLike], List[str]], Iterable[str]]
+        ] = None,
     ) -> Union[str, os.PathLike]:
         """Provides a copy of the given source directory and returns the path to it.
 
+        The accounting of the copy is available as `last_copy_stats` afterwards.
+
         :param src_dir: Path to the source directory
         :param tmp_dir_prefix: Optional prefix for temporary directories
         :param tmp_dir_path: Path to the temporary directory.
             If this option is specified, not a random directory will be created but this one.
             In this case tmp_dir_prefix will be ignore.
+        :param strategy: How the files are copied, a plain copy by default
+        :param ignore: A function for ignoring several files/folders
         :return: Path to the copied version
         """
         if tmp_dir_path:
@@ -81,7 +126,9 @@ class FileUtils:
             tmp_dir = tmp_dir_path
         else:
             tmp_dir = tempfile_seeded.mkdtemp(dir=tmp_dir_prefix)  # type: ignore
-        cls.copy_tree(src_dir, tmp_dir)
+        cls.last_copy_stats = cls.copy_tree(
+            src_dir, tmp_dir, ignore=ignore, strategy=strategy
+        )
         cls._copies.append(tmp_dir)
         return tmp_dir
 
@@ -96,21 +143,20 @@ class FileUtils:
             Callable[[str, List[str]], Iterable[str]],
             Callable[[Union[str, os.PathLike], List[str]], Iterable[str]],
         ] = None,
-    ) -> None:
+        strategy: WorkspaceStrategy = None,
+    ) -> CopyStats:
         """Copies a tree in the filesystem from src to dst.
 
         :param src: Path to the source
         :param dst: Path to the destination
         :param symlinks: A flag indicating whether symlinks should be copied
         :param ignore: A function for ignoring several files/folders
+        :param strategy: How the files are copied, a plain copy by default
+        :return: The number of copied files and bytes
         """
-        for item in os.listdir(src):
-            source_path = os.path.join(src, item)
-            dest_path = os.path.join(dst, item)
-            if os.path.isdir(source_path):
-                shutil.copytree(source_path, dest_path, symlinks, ignore)
-            else:
-                shutil.copy2(source_path, dest_path)
+        if strategy is None:
+            strategy = CopyStrategy()
+        return strategy.copy_tree(src, dst, symlinks, ignore)  # type: ignore
 
     @classmethod
     def delete_copy(cls, copy_path: Union[str, os.PathLike]) -> None:
@@ -140,18 +186,28 @@ class FileUtils:
 class VirtualEnvironment:
     """Wraps a virtual environment."""
 
-    def __init__(self, env_name: str, tmp_dir: Any = None) -> None:
+    def __init__(self, env_name: str, tmp_dir: Any = None, env_dir: str = None) -> None:
         """Creates a new virtual environment in a temporary folder.
 
         :param env_name: Name of the virtual environment.
         :param tmp_dir: Directory where the temporary folder should be created
+        :param env_dir: Optional directory of the virtual environment.  If it
+            already contains an environment, this one is used instead of creating
+            a new one.  In this case tmp_dir will be ignored.
         """
         self._env_name = env_name
         self._packages: List[str] = []
-        self._env_dir = tempfile_seeded.mkdtemp(  # type: ignore
-            suffix=env_name, dir=tmp_dir
-        )
-        virtenv.create_environment(self._env_dir)
+        self._install_options = ""
+        self.install_report: Optional[InstallReport] = None
+        if env_dir is None:
+            self._env_dir = tempfile_seeded.mkdtemp(  # type: ignore
+                suffix=env_name, dir=tmp_dir
+            )
+        else:
+            self._env_dir = env_dir
+            os.makedirs(self._env_dir, exist_ok=True)
+        if not os.path.isfile(os.path.join(self._env_dir, "bin", "activate")):
+            virtenv.create_environment(self._env_dir)
 
     def cleanup(self) -> None:
         """Cleans up the virtual environment."""
@@ -188,6 +244,32 @@ class VirtualEnvironment:
         """
         self._packages.extend(package_names)
 
+    def set_install_options(self, options: str) -> None:
+        """Sets additional options that are passed to `pip install`.
+
+        :param options: Options for pip, e.g., `--no-index --find-links=/wheels`
+        """
+        self._install_options = options
+
+    def install_packages(self, cwd: Optional[str] = None) -> Tuple[str, str]:
+        """Installs all packages added for installation so far.
+
+        The packages are installed by an InstallPlanner, i.e., with a single pip
+        invocation if possible; the outcome is available as `install_report`.
+        Afterwards, the list of packages is cleared, thus subsequent calls of
+        `run_commands` will not install them again.  This allows to populate the
+        environment once and run commands in it several times.
+
+        :param cwd: The directory pip is run in, relative requirement lines like
+            `-e .` are resolved against it.  Defaults to the current directory.
+        :return: A tuple of output and error output of the installation process
+        """
+        self.install_report = InstallPlanner(
+            lambda args: self._pip_install(args, cwd)
+        ).install(self._packages)
+        self._packages = []
+        return self.install_report.out, self.install_report.err
+
     def run_commands(self, commands: List[str]) -> Tuple[str, str]:
         """Run commands in the virtual environment setting.
 
@@ -198,19 +280,74 @@ class VirtualEnvironment:
         :param commands: A list of commands to be executed in the virtual environment
         :return: A tuple of output and error output of the process
         """
-        command_list = [
-            "source {}".format(os.path.join(self._env_dir, "bin", "activate")),
-            "python -V",
-        ]
+        command_list = ["python -V"]
         for package in self._packages:
-            command_list.append(f"pip install {package}")
+            command_list.append(f"pip install {self._install_options} {package}")
         command_list.extend(commands)
+        _, out, err = self._run_shell(command_list)
+        return out, err
+
+    def _pip_install(
+        self, args: List[str], cwd: Optional[str] = None
+    ) -> Tuple[bool, str, str]:
+        returncode, out, err = self._run_shell(
+            [
+                f"pip install {self._install_options} "
+                + " ".join(shlex.quote(arg) for arg in args)
+            ],
+            cwd,
+        )
+        return returncode == 0, out, err
+
+    def _run_shell(
+        self, commands: List[str], cwd: Optional[str] = None
+    ) -> Tuple[int, str, str]:
+        command_list = [
+            "source {}".format(os.path.join(self._env_dir, "bin", "activate"))
+        ] + commands
         cmd = ";".join(command_list)
         process = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, cwd=cwd
         )
         out, err = process.communicate()
-        return out.decode("utf-8"), err.decode("utf-8")
+        return process.returncode, out.decode("utf-8"), err.decode("utf-8")
+
+    def fingerprint(self) -> str:
+        """Computes a fingerprint of the installed packages.
+
+        The fingerprint is a hash over path, size and modification time of all files
+        in the environment's site-packages directories.  Byte-code files are ignored,
+        because they are (re-)generated whenever a module gets imported.  If a test
+        installs, removes or alters a package, the fingerprint changes.
+
+        :return: A hex digest identifying the current state of the environment
+        """
+        return self.fingerprint_directory(self._env_dir)
+
+    @staticmethod
+    def fingerprint_directory(env_dir: str) -> str:
+        """Computes the fingerprint of the virtual environment in env_dir.
+
+        :param env_dir: The directory of a virtual environment
+        :return: A hex digest identifying the current state of the environment
+        """
+        digest = hashlib.sha256()
+        lib_dir = os.path.join(env_dir, "lib")
+        for root, dirs, files in os.walk(lib_dir):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for file_name in sorted(files):
+                if file_name.endswith((".pyc", ".pyo")):
+                    continue
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.lstat(path)
+                except FileNotFoundError:
+                    continue
+                digest.update(
+                    f"{os.path.relpath(path, lib_dir)}:{stat.st_size}:"
+                    f"{stat.st_mtime_ns}\n".encode("utf-8")
+                )
+        return digest.hexdigest()
 
     def __str__(self) -> str:
         return f"VirtualEnvironment {self._env_name} in directory {self.env_dir}"
@@ -353,6 +490,14 @@ class AbstractRunner(metaclass=ABCMeta):
 class PyTestRunner(AbstractRunner):
     """A runner implementation for PyTest."""
 
+    TOOL_PACKAGES = [
+        "pytest==5.3.1",
+        "pytest-cov==2.8.1",
+        "benchexec==3.8",
+        "pytest-repeat",
+        "pytest-timeout",
+    ]
+
     # pylint: disable=too-many-arguments
     def __init__(
         self,
@@ -367,6 +512,10 @@ class PyTestRunner(AbstractRunner):
         venv_path: Union[str, os.PathLike] = None,
         tests_to_be_run: str = "",
         full_access_dir: str = None,
+        env: VirtualEnvironment = None,
+        pytest_options: str = "",
+        plugin_dir: str = None,
+        results_file: Union[str, os.PathLike] = None,
     ) -> None:
         super().__init__(project_name, path)
         self._config = config
@@ -378,60 +527,195 @@ class PyTestRunner(AbstractRunner):
         self._venv_path = venv_path
         self._tests_to_be_run = tests_to_be_run
         self._full_access_dir = full_access_dir
+        # An already populated environment; if None, a fresh one is created per run
+        self._env = env
+        # Further pytest arguments, e.g., for the plugins found in plugin_dir
+        self._pytest_options = pytest_options
+        self._plugin_dir = plugin_dir
+        # Written by the flapy_results plugin, requires the plugin_dir
+        self._results_file = results_file
+        self.install_report: Optional[InstallReport] = None
 
     def run(self) -> Optional[Tuple[str, str]]:
+        if self._env is not None:
+            return self._run_in_environment(self._env)
         with virtualenv(self._project_name, self._venv_path) as env:
-            old_dir = os.getcwd()
-            os.chdir(self._path)
-
-            if self._output_log_file is None:
-                self._output_log_file = os.path.join(os.getcwd(), "output.log")
-
-            project_name = self._extract_project_name()
-            packages = self._extract_necessary_packages()
-            env.add_packages_for_installation(packages)
-            env.add_package_for_installation("pytest==5.3.1")
-            env.add_package_for_installation("pytest-cov==2.8.1")
-            env.add_package_for_installation("benchexec==3.8")
-            env.add_package_for_installation("pytest-repeat")
-            env.add_package_for_installation("pytest-timeout")
-
-            command = "runexec --output=/dev/stdout --hidden-dir=/home "  # --container "
-            if self._full_access_dir is not None:
-                command += f"--full-access-dir={self._full_access_dir} "
-            if self._time_limit > 0:
-                command += f"--timelimit={self._time_limit}s "
-            command += "-- "
+            self.prepare_environment(env)
+            return self._run_in_environment(env)
 
-            if self._config.trace not in [None, ""]:
-                command += (
-                    f'pytest_trace "{self._config.trace}" {self._trace_output_file} '
-                )
-            else:
-                command += "pytest "
-
-            command += (
-                f"--cov={project_name} "
-                f"--cov-report=term-missing "
-                f"--cov-branch "
-                f"-v "
-                f"--rootdir=. "
-                f"{self._tests_to_be_run} "
-                f"--count=2 "
-                f"--repeat-scope=function "
-                f"--timeout=10 "
+    def required_packages(self) -> List[str]:
+        """Returns the project's requirements and the packages needed by the runner.
+
+        :return: A list of requirement lines in the order they are installed
+        """
+        return self._extract_necessary_packages() + self.TOOL_PACKAGES
+
+    def prepare_environment(self, env: VirtualEnvironment) -> None:
+        """Adds the project's requirements and the packages needed by the runner to
+        the given environment.
 
+        :param env: The virtual environment the tests shall be run in
+        """
+        if self._config.wheelhouse is not None:
+            env.set_install_options(
+                Wheelhouse(self._config.wheelhouse).install_options()
             )
+        env.add_packages_for_installation(self.required_packages())
+
+    def _run_in_environment(self, env: VirtualEnvironment) -> Tuple[str, str]:
+        old_dir = os.getcwd()
+        os.chdir(self._path)
+
+        if self._output_log_file is None:
+            self._output_log_file = os.path.join(os.getcwd(), "output.log")
+
+        install_out, install_err = env.install_packages()
+        self.install_report = env.install_report
+        command = self._build_command(self._extract_project_name())
+        out, err = env.run_commands([command])
+        os.chdir(old_dir)
+        return install_out + out, install_err + err
+
+    def run_zygote(
+        self, iterations: List["Iteration"], plan_file: str, report_file: str
+    ) -> Tuple[str, str]:
+        """Runs several iterations in the repository as forks of a single process.
+
+        The process imports pytest and the project's test modules once by
+        collecting the tests, then every iteration is run by a forked child that
+        writes the same result files as a separate run and its output to the
+        iteration's output log file.  The fork server undoes the changes of each
+        child to the repository before forking the next one.  Requires the runner
+        to be created with a populated environment.
+
+        :param iterations: The iterations to run, one after another
+        :param plan_file: Path the plan of the fork server is written to
+        :param report_file: Path the fork server writes its timing report to
+        :return: Output and error output of the fork server
+        """
+        if self._env is None:
+            raise ValueError("The fork server requires a populated environment")
+        old_dir = os.getcwd()
+        os.chdir(self._path)
+
+        install_out, install_err = self._env.install_packages()
+        self.install_report = self._env.install_report
+        project_name = self._extract_project_name()
+        tests = dict.fromkeys(iteration.test_to_be_run for iteration in iterations)
+        plan = {
+            "collect": shlex.split(f"--rootdir=. {' '.join(tests)}"),
+            "runs": [
+                {
+                    "args": shlex.split(
+                        self._pytest_arguments(
+                            project_name,
+                            iteration.test_to_be_run,
+                            iteration.xml_output_file,
+                            iteration.xml_coverage_file if iteration.coverage else None,
+                        )
+                        + self._results_arguments(iteration.results_file)
+                        + f" {iteration.pytest_options} {self._pytest_options}"
+                    ),
+                    "output": iteration.output_log_file,
+                }
+                for iteration in iterations
+            ],
+            "backup": os.path.join(
+                os.path.dirname(plan_file), f"flapy_zygote_backup_{os.getpid()}"
+            ),
+            "report": report_file,
+        }
+        with open(plan_file, "w") as file:
+            json.dump(plan, file, indent=2)
+        # The script runs with the environment's interpreter, which cannot import
+        # flapy, thus it is copied next to the plan
+        script = os.path.join(os.path.dirname(plan_file), "flapy_zygote.py")
+        shutil.copy(ZYGOTE_SCRIPT, script)
+        command = (
+            self._python_path()
+            + self._runexec_command()
+            + f"python {shlex.quote(script)} {shlex.quote(plan_file)}"
+        )
+        out, err = self._env.run_commands([command])
+        os.chdir(old_dir)
+        return install_out + out, install_err + err
+
+    def _build_command(self, project_name: str) -> str:
+        command = self._python_path()
+        command += self._runexec_command()
+        if self._config.trace not in [None, ""]:
+            command += f'pytest_trace "{self._config.trace}" {self._trace_output_file} '
+        else:
+            command += "pytest "
+        command += self._pytest_arguments(
+            project_name,
+            self._tests_to_be_run,
+            self._xml_output_file,
+            self._xml_coverage_file,
+        )
+        command += self._results_arguments(self._results_file)
+        if self._pytest_options:
+            command += " " + self._pytest_options
+        return command
+
+    def _python_path(self) -> str:
+        """Returns the assignment putting the plugin_dir on the PYTHONPATH."""
+        if self._plugin_dir is None:
+            return ""
+        path = shlex.quote(self._plugin_dir)
+        return f"PYTHONPATH={path}${{PYTHONPATH:+:$PYTHONPATH}} "
+
+    def _results_arguments(self, results_file: Optional[str]) -> str:
+        """Returns the arguments letting the flapy_results plugin write the
+        results of the tests to the given sidecar file."""
+        if results_file is None or self._plugin_dir is None:
+            return ""
+        return f" -p flapy_results --flapy-results={shlex.quote(str(results_file))}"
+
+    def _runexec_command(self) -> str:
+        command = "runexec --output=/dev/stdout --hidden-dir=/home "  # --container "
+        if self._full_access_dir is not None:
+            command += f"--full-access-dir={self._full_access_dir} "
+        if self._time_limit > 0:
+            command += f"--timelimit={self._time_limit}s "
+        command += "-- "
+        return command
+
+    def _pytest_arguments(
+        self,
+        project_name: str,
+        tests_to_be_run: str,
+        xml_output_file: Optional[Union[str, os.PathLike]],
+        xml_coverage_file: Optional[Union[str, os.PathLike]],
+    ) -> str:
+        # Without a coverage file, coverage is not measured at all
+        command = ""
+        if xml_coverage_file is not None:
+            command += f"--cov={project_name} --cov-report=term-missing --cov-branch "
+        command += (
+            f"-v "
+            f"--rootdir=. "
+            f"{tests_to_be_run} "
+            f"--count=2 "
+            f"--repeat-scope=function "
+            f"{self._timeout_argument()} "
+        )
+
+        if xml_output_file is not None:
+            command += f" --junitxml={xml_output_file}"
 
-            if self._xml_output_file is not None:
-                command += f" --junitxml={self._xml_output_file}"
+        if xml_coverage_file is not None:
+            command += f" --cov-report xml:{xml_coverage_file}"
 
-            if self._xml_coverage_file is not None:
-                command += f" --cov-report xml:{self._xml_coverage_file}"
+        return command
 
-            out, err = env.run_commands([command])
-            os.chdir(old_dir)
-            return out, err
+    def _timeout_argument(self) -> str:
+        """Returns the pytest-timeout argument: the fixed default, or with adaptive
+        timeouts their ceiling, which the flapy_timeouts plugin lowers per test."""
+        seconds = DEFAULT_TIMEOUT
+        if self._config.adaptive_timeouts:
+            seconds = self._config.timeout_ceiling
+        return f"--timeout={seconds:g}"
 
     def _extract_project_name(self) -> str:
         if "-" in self._project_name and os.path.exists(
@@ -458,6 +742,37 @@ class PyTestRunner(AbstractRunner):
         return project_name
 
     def extract_run_result(self, log: str) -> RunResult:
+        """Reads the RunResult from the sidecar file written by the flapy_results
+        plugin; only if it is missing, the counts are searched in the log."""
+        if self._results_file is not None and os.path.exists(self._results_file):
+            summary = read_summary(str(self._results_file))
+            if summary is not None:
+                return self._run_result_from_summary(summary)
+        return self._extract_run_result_from_log(log)
+
+    def _run_result_from_summary(self, summary: Dict[str, Any]) -> RunResult:
+        result = RunResult(
+            failed=summary["failed"],
+            passed=summary["passed"],
+            skipped=summary["skipped"] + summary["xfailed"],
+            warnings=summary["warnings"] if summary["warnings"] is not None else -1,
+            error=summary["error"],
+            time=summary["duration"],
+        )
+        if summary["coverage"] is not None:
+            result.coverage = summary["coverage"]
+        if self._xml_coverage_file is not None and os.path.exists(
+            self._xml_coverage_file
+        ):
+            try:
+                root = ET.parse(self._xml_coverage_file).getroot()
+                result.statements = int(root.get("lines-valid", -1))
+                result.missing = result.statements - int(root.get("lines-covered", 0))
+            except (ET.ParseError, ValueError):
+                pass
+        return result
+
+    def _extract_run_result_from_log(self, log: str) -> RunResult:
         statements = -1
         missing = -1
         coverage = -1.0
@@ -528,65 +843,136 @@ class PyTestRunner(AbstractRunner):
 class RandomPyTestRunner(PyTestRunner):
     """Extends the PyTestRunner for random test execution."""
 
-    def run(self) -> Optional[Tuple[str, str]]:
-        with virtualenv(self._project_name, self._venv_path) as env:
-            old_dir = os.getcwd()
-            os.chdir(self._path)
-
-            if self._output_log_file is None:
-                self._output_log_file = os.path.join(os.getcwd(), "output.log")
-
-            project_name = self._extract_project_name()
-            packages = self._extract_necessary_packages()
-            env.add_packages_for_installation(packages)
-            env.add_package_for_installation("pytest==5.3.1")
-            env.add_package_for_installation("pytest-cov==2.8.1")
-            env.add_package_for_installation("benchexec==3.8")
-            env.add_package_for_installation("pytest-random-order==1.0.4")
-            env.add_package_for_installation("pytest-repeat")
-            env.add_package_for_ionstallation("pytest-timeout")
-
-            # command = ""
-            command = "runexec --output=/dev/stdout --hidden-dir=/home "  # --container "
-            # if self._full_access_dir is not None:
-            #     command += f"--full-access-dir={self._full_access_dir} "
-            if self._time_limit > 0:
-                command += f"--timelimit={self._time_limit}s "
-            command += "-- "
+    TOOL_PACKAGES = [
+        "pytest==5.3.1",
+        "pytest-cov==2.8.1",
+        "benchexec==3.8",
+        "pytest-random-order==1.0.4",
+        "pytest-repeat",
+        "pytest-timeout",
+    ]
+
+    def _runexec_command(self) -> str:
+        # command = ""
+        command = "runexec --output=/dev/stdout --hidden-dir=/home "  # --container "
+        # if self._full_access_dir is not None:
+        #     command += f"--full-access-dir={self._full_access_dir} "
+        if self._time_limit > 0:
+            command += f"--timelimit={self._time_limit}s "
+        command += "-- "
+        return command
+
+    def _pytest_arguments(
+        self,
+        project_name: str,
+        tests_to_be_run: str,
+        xml_output_file: Optional[Union[str, os.PathLike]],
+        xml_coverage_file: Optional[Union[str, os.PathLike]],
+    ) -> str:
+        command = ""
+        if xml_coverage_file is not None:
+            command += f"--cov={project_name} --cov-report=term-missing --cov-branch "
+        command += (
+            f"--random-order-bucket={self._config.random_order_bucket} "
+            f"-v "
+            f"--rootdir=. {tests_to_be_run} "
+            f"--count=2 "
+            f"--repeat-scope=function "
+            f"{self._timeout_argument()} "
+        )
 
-            if self._config.trace not in [None, ""]:
-                command += (
-                    f'pytest_trace "{self._config.trace}" {self._trace_output_file} '
-                )
-            else:
-                command += "pytest "
-
-            command += (
-                f"--cov={project_name} "
-                f"--cov-report=term-missing "
-                f"--cov-branch "
-                f"--random-order-bucket={self._config.random_order_bucket} "
-                f"-v "
-                f"--rootdir=. {self._tests_to_be_run} "
-                f"--count=2 "
-                f"--repeat-scope=function "
-                f"--timeout=10 "
-            )
+        if self._config.random_order_seed is not None:
+            command += " --random-order-seed={}".format(self._config.random_order_seed)
+
+        if xml_output_file is not None:
+            command += " --junitxml={}".format(xml_output_file)
+
+        if xml_coverage_file is not None:
+            command += f" --cov-report xml:{xml_coverage_file}"
+
+        return command
 
-            if self._config.random_order_seed is not None:
-                command += " --random-order-seed={}".format(
-                    self._config.random_order_seed
-                )
 
-            if self._xml_output_file is not None:
-                command += " --junitxml={}".format(self._xml_output_file)
+# pylint: disable=too-few-public-methods
+@dataclass
+class Iteration:
+    """A single run of the tests of a project.
+
+    The names of all files created by the run are derived from the project's name,
+    the number of the iteration and the tests to be run.
+    """
+
+    repo_name: str
+    temp_path: str
+    number: int
+    test_to_be_run: str = ""
+    # Shell-quoted node ids run instead of test_to_be_run, not part of file names
+    selection: str = ""
+    # Further shell-quoted pytest arguments, not part of file names
+    pytest_options: str = ""
+    # Whether coverage is measured, see FlakyAnalyser._apply_coverage_policy
+    coverage: bool = True
+
+    def file(self, kind: str, extension: str = "") -> str:
+        """Returns the path of a result file of this iteration.
+
+        :param kind: The kind of the file, e.g., `output' or `coverage'
+        :param extension: The file extension including the dot
+        """
+        return os.path.join(
+            self.temp_path,
+            "{}_{}{}{}{}".format(
+                self.repo_name,
+                kind,
+                self.number,
+                self.test_to_be_run.replace("/", "."),
+                extension,
+            ),
+        )
 
-            if self._xml_coverage_file is not None:
-                command += f" --cov-report xml:{self._xml_coverage_file}"
+    @property
+    def xml_output_file(self) -> str:
+        """Returns the path of the JUnit XML file."""
+        return self.file("output", ".xml")
 
-            out, err = env.run_commands([command])
-            os.chdir(old_dir)
-            return out, err
+    @property
+    def xml_coverage_file(self) -> str:
+        """Returns the path of the coverage XML file."""
+        return self.file("coverage", ".xml")
+
+    @property
+    def results_file(self) -> str:
+        """Returns the path of the sidecar file of the JUnit XML file, see
+        flapy.sidecar."""
+        return sidecar_file(self.xml_output_file)
+
+    @property
+    def output_log_file(self) -> str:
+        """Returns the path of the log file."""
+        return self.file("output", ".log")
+
+    @property
+    def trace_file(self) -> str:
+        """Returns the path prefix of the trace files."""
+        return self.file("trace")
+
+
+def available_memory() -> Optional[int]:
+    """Returns the memory available for new processes in bytes, if known."""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _pin_worker(cores: Optional[multiprocessing.Queue]) -> None:
+    """Pins the calling worker process to one of the given cores."""
+    if cores is not None:
+        os.sched_setaffinity(0, {cores.get()})
 
 
 # pylint: disable=too-many-instance-attributes, too-few-public-methods
@@ -596,15 +982,96 @@ class FlakyAnalyser:
     def __init__(self, argv: List[str]) -> None:
         parser = self._create_parser()
         self._config = parser.parse_args(argv[1:])
+        self._check_modes(parser, self._config)
         self._logger = self._configure_logger()
         self._runs = self._config.runs
         self._repo_path = self._config.repository
         self._temp_path = self._config.temp
         self._repo_name = self._extract_repo_name(self._repo_path)
         self._generated_files: Set[str] = set()
+        self._aggregator = ResultAggregator(self._repo_name)
         self._flaky_tests: Set[str] = set()
-        self._test_cases: Dict[str, str] = {}
+        self._test_cases: Dict[str, Dict[str, int]] = {}
         self._tests_to_be_run: str = self._config.tests_to_be_run
+        self._env: Optional[VirtualEnvironment] = None
+        self._env_fingerprint: str = ""
+        self._wheelhouse: Optional[Wheelhouse] = None
+        if self._config.wheelhouse is not None:
+            self._wheelhouse = Wheelhouse(self._config.wheelhouse)
+        self._workspace_strategy: Optional[WorkspaceStrategy] = None
+        # The workspace kept between iterations with --workspace-reset delta
+        self._workspace: Optional[WorkspaceSnapshot] = None
+        # The failures of every entry of --tests-to-be-run and the entries whose
+        # remaining iterations are skipped
+        self._failures: Dict[str, FailureTracker] = {}
+        self._aborted: Set[str] = set()
+        self._last_failure: Tuple[Optional[str], str] = (None, "")
+        self._adaptive_report: Optional[Dict[str, Any]] = None
+        self._plugin_dir: Optional[str] = None
+        # Derived from the first finished iteration with --adaptive-timeouts
+        self._timeouts_file: Optional[str] = None
+        self._naming_offset = 0
+        self._coverage_overhead = CoverageOverhead()
+        self._exclusions = ExclusionSpec(
+            self._repo_path,
+            patterns=([] if self._config.no_default_excludes else DEFAULT_EXCLUDES)
+            + self._config.copy_exclude,
+            honor_gitignore=self._config.honor_gitignore,
+        )
+        self._project_hash = ""
+        self._durations: Optional[DurationStore] = None
+        if self._config.duration_store is not None:
+            self._project_hash = self._config.project_hash or git_revision(
+                self._repo_path
+            )
+            self._durations = DurationStore(self._config.duration_store)
+        self._venv_cache: Optional[VenvCache] = None
+        if self._config.venv_cache is not None:
+            self._venv_cache = VenvCache(
+                self._config.venv_cache, int(self._config.venv_cache_size * 1024**3)
+            )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The worker processes of --jobs get a pickled copy of the analyser.  The
+        # durations are recorded by the parent, the workers do not need the
+        # store, whose connection cannot be pickled.
+        state = self.__dict__.copy()
+        state["_durations"] = None
+        return state
+
+    @staticmethod
+    def _check_modes(
+        parser: argparse.ArgumentParser, config: argparse.Namespace
+    ) -> None:
+        """Rejects combinations of options that cannot be run together.
+
+        The adaptive, two-phase and ordered modes decide after every iteration
+        what to run next, thus they run their iterations one after another, in
+        separate processes.
+        """
+        modes = [
+            option
+            for option, active in [
+                ("--adaptive", config.adaptive),
+                ("--two-phase", config.two_phase),
+                (
+                    "--order-schedule",
+                    config.order_schedule != "none" and not config.deterministic,
+                ),
+            ]
+            if active
+        ]
+        if modes and config.jobs > 1:
+            parser.error(f"{modes[0]} cannot be combined with --jobs")
+        if modes and config.zygote:
+            parser.error(f"{modes[0]} cannot be combined with --zygote")
+        if config.zygote and config.jobs > 1:
+            parser.error("--zygote cannot be combined with --jobs")
+        if config.zygote and config.workspace_reset != "recopy":
+            parser.error(
+                "--zygote resets the workspace itself, it cannot be combined with "
+                "--workspace-reset"
+            )
 
     @staticmethod
     def _extract_repo_name(path):
@@ -630,106 +1097,845 @@ class FlakyAnalyser:
         the given runner_class and creates xml files containing the results.
         """
         tmp_dir_path = FileUtils.get_available_tempdir_path(self._temp_path)
-        for test_to_be_run in self._tests_to_be_run.split() or [""]:
-            for i in range(self._runs):
-                self._logger.info(
-                    "%s Iteration %d of %d for project %s",
-                    runner_class.__name__,
-                    i,
-                    self._runs,
-                    self._repo_name,
-                )
+        self._naming_offset = naming_offset
+        self._aggregator = ResultAggregator(
+            self._repo_name,
+            os.path.join(
+                self._temp_path, f"{self._repo_name}_summary{naming_offset}.json"
+            ),
+        )
+        if self._config.resume:
+            self._logger.info(
+                "Resume with the results of %d iterations", self._aggregator.resume()
+            )
+        if self._workspace_strategy is None:
+            self._workspace_strategy = select_strategy(
+                self._config.workspace_strategy, self._repo_path, self._temp_path
+            )
+        # Before parallel workers get their own copies of the strategy
+        self._workspace_strategy.prepare(self._repo_path, self._exclusions)
+        if self._config.venv_lifecycle == "project":
+            self._provide_environment(runner_class)
+        try:
+            self._run_iterations(runner_class, naming_offset, tmp_dir_path)
+        finally:
+            self._release_workspace()
+            self._workspace_strategy.release(self._repo_path)
+            self._release_environment()
+        self._log_coverage_overhead()
+
+    def _provide_environment(self, runner_class) -> None:
+        """Creates and populates the virtual environment the following iterations are
+        run in.  If a cache of virtual environments is configured, the environment is
+        cloned from there.
+
+        :param runner_class: The runner class whose requirements shall be installed
+        """
+        runner = runner_class(self._repo_name, self._repo_path, self._config)
+        packages = runner.required_packages()
+        if self._venv_cache is not None and VenvCache.is_cacheable(packages):
+
+            def build(env_dir: str) -> InstallReport:
+                env = VirtualEnvironment(self._repo_name, env_dir=env_dir)
+                runner.prepare_environment(env)
+                self._install(env)
+                return env.install_report or InstallReport()
+
+            env_dir, _ = self._venv_cache.provide(
+                packages, build, VirtualEnvironment.fingerprint_directory
+            )
+            self._env = VirtualEnvironment(self._repo_name, env_dir=env_dir)
+        else:
+            self._logger.info("Create virtual environment for %s", self._repo_name)
+            self._env = VirtualEnvironment(self._repo_name)
+            runner.prepare_environment(self._env)
+            self._install(self._env)
+        self._env_fingerprint = self._env.fingerprint()
+
+    def _install(self, env: VirtualEnvironment) -> Tuple[str, str]:
+        # Like in a run of the runner, relative requirement lines refer to the
+        # repository
+        out, err = env.install_packages(cwd=self._repo_path)
+        self._logger.debug("INSTALL OUT: %s", out)
+        self._logger.debug("INSTALL ERR: %s", err)
+        self._log_install_report(env.install_report)
+        if self._wheelhouse is not None:
+            self._wheelhouse.mark_used(out)
+        return out, err
+
+    def _log_install_report(self, report: Optional[InstallReport]) -> None:
+        if report is None:
+            return
+        self._logger.info(
+            "Installed %d requirements with %d pip invocations (%s)",
+            len(report.installed),
+            report.pip_invocations,
+            ", ".join(f"{phase}: {secs:.1f}s" for phase, secs in report.phases.items()),
+        )
+        for requirement in report.failed:
+            self._logger.warning("Could not install requirement %s", requirement)
 
-                copy: str = FileUtils.provide_copy(
-                    self._repo_path, tmp_dir_path=tmp_dir_path
-                )
-                xml_output_file: str = os.path.join(
-                    self._temp_path,
-                    "{}_output{}{}.xml".format(
-                        self._repo_name,
-                        i + naming_offset,
-                        test_to_be_run.replace("/", "."),
-                    ),
-                )
-                xml_coverage_file: str = os.path.join(
-                    self._temp_path,
-                    "{}_coverage{}{}.xml".format(
-                        self._repo_name,
-                        i + naming_offset,
-                        test_to_be_run.replace("/", "."),
-                    ),
+    def _environment_modified(self) -> bool:
+        """Checks, whether a test run altered the shared virtual environment."""
+        return (
+            self._env is not None and self._env.fingerprint() != self._env_fingerprint
+        )
+
+    def _rebuild_environment(self, runner_class) -> None:
+        self._logger.warning(
+            "Virtual environment %s was modified by the tests, rebuilding it",
+            self._env.env_dir if self._env is not None else None,
+        )
+        self._release_environment()
+        self._provide_environment(runner_class)
+
+    def _release_environment(self) -> None:
+        if self._env is not None:
+            self._env.cleanup()
+            self._env = None
+
+    def _iterations(self, naming_offset: int) -> List[Iteration]:
+        return [
+            Iteration(
+                self._repo_name, self._temp_path, i + naming_offset, test_to_be_run
+            )
+            for test_to_be_run in self._tests_to_be_run.split() or [""]
+            for i in range(self._runs)
+        ]
+
+    def _run_iterations(self, runner_class, naming_offset, tmp_dir_path):
+        iterations = self._iterations(naming_offset)
+        self._failures = {}
+        self._aborted = set()
+        if self._config.adaptive:
+            self._run_iterations_adaptively(runner_class, naming_offset, tmp_dir_path)
+            return
+        if self._config.two_phase:
+            self._run_iterations_two_phase(runner_class, naming_offset, tmp_dir_path)
+            return
+        if self._config.order_schedule != "none" and not self._config.deterministic:
+            self._run_iterations_ordered(runner_class, naming_offset, tmp_dir_path)
+            return
+        if self._config.zygote:
+            if self._config.trace not in [None, ""]:
+                self._logger.warning("The fork server does not support tracing")
+            else:
+                self._run_iterations_in_zygote(runner_class, iterations, tmp_dir_path)
+                return
+        jobs = self._effective_jobs()
+        if jobs > 1:
+            self._run_iterations_in_parallel(
+                runner_class, iterations, tmp_dir_path, jobs
+            )
+            return
+        self._run_sequentially(runner_class, iterations, tmp_dir_path)
+
+    def _run_sequentially(
+        self, runner_class, iterations: List[Iteration], tmp_dir_path: str
+    ) -> bool:
+        """Runs the iterations one after another.  After a deterministic
+        infrastructure failure, the remaining iterations of the same entry of
+        --tests-to-be-run are skipped, the other entries are run nevertheless.
+
+        :return: True, if the remaining iterations of all entries of the given
+            iterations were skipped
+        """
+        entries = {iteration.test_to_be_run for iteration in iterations}
+        iterations = [
+            iteration
+            for iteration in self._pending(iterations)
+            if iteration.test_to_be_run not in self._aborted
+        ]
+        self._apply_coverage_policy(iterations)
+        for index, iteration in enumerate(iterations):
+            if iteration.test_to_be_run in self._aborted:
+                continue
+            result = self._run_iteration(runner_class, iteration, tmp_dir_path)
+            if self._finish_iteration(iteration, result):
+                self._skip_iterations(
+                    iteration,
+                    [
+                        remaining
+                        for remaining in iterations[index + 1 :]
+                        if remaining.test_to_be_run == iteration.test_to_be_run
+                    ],
                 )
-                output_log_file: str = os.path.join(
-                    self._temp_path,
-                    "{}_output{}{}.log".format(
-                        self._repo_name,
-                        i + naming_offset,
-                        test_to_be_run.replace("/", "."),
-                    ),
+            if self._environment_modified():
+                self._rebuild_environment(runner_class)
+        return bool(entries) and entries <= self._aborted
+
+    def _full_iterations(self, number: int) -> List[Iteration]:
+        """Returns the iterations running all tests to be run once."""
+        return [
+            Iteration(self._repo_name, self._temp_path, number, test_to_be_run)
+            for test_to_be_run in self._tests_to_be_run.split() or [""]
+        ]
+
+    def _run_iterations_two_phase(self, runner_class, naming_offset, tmp_dir_path):
+        """Runs all tests once, then only the suspected tests for the remaining
+        iterations, except for a full run every --spot-check-every iterations.
+        The suspects are written to `{project}_suspects{offset}.json'.
+        """
+        baseline = self._full_iterations(naming_offset)
+        if self._run_sequentially(runner_class, baseline, tmp_dir_path):
+            return
+        suspects = rank_suspects(
+            [
+                iteration.xml_output_file
+                for iteration in baseline
+                if os.path.exists(iteration.xml_output_file)
+            ],
+            self._repo_path,
+        )
+        self._logger.info("Suspect %d tests after the baseline run", len(suspects))
+        with open(
+            os.path.join(
+                self._temp_path, f"{self._repo_name}_suspects{naming_offset}.json"
+            ),
+            "w",
+        ) as file:
+            json.dump([asdict(suspect) for suspect in suspects], file, indent=2)
+
+        selection = " ".join(shlex.quote(suspect.nodeid) for suspect in suspects)
+        spot_check_every = self._config.spot_check_every
+        for number in range(naming_offset + 1, naming_offset + self._runs):
+            if (
+                spot_check_every > 0
+                and (number - naming_offset) % spot_check_every == 0
+            ):
+                iterations = self._full_iterations(number)
+            elif selection:
+                iterations = [
+                    Iteration(
+                        self._repo_name, self._temp_path, number, selection=selection
+                    )
+                ]
+            else:
+                continue
+            if self._run_sequentially(runner_class, iterations, tmp_dir_path):
+                return
+
+    def _run_iterations_ordered(self, runner_class, naming_offset, tmp_dir_path):
+        """Runs the tests in explicitly planned orders that cover the pairs of
+        tests in as few iterations as possible (see flapy.order).
+
+        The first iteration records the tests in the order they are run, the
+        remaining ones run them in the planned orders.  The plan and the pairs
+        covered by the executed orders are written to
+        `{project}_order_plan{offset}.json'.
+        """
+        plugin_dir = self._provide_plugin_dir()
+        first = Iteration(self._repo_name, self._temp_path, naming_offset)
+        record_file = first.file("order_record", ".json")
+        baseline = [
+            Iteration(
+                self._repo_name,
+                self._temp_path,
+                naming_offset,
+                selection=self._tests_to_be_run,
+                pytest_options="-p flapy_order "
+                f"--flapy-order-record={shlex.quote(record_file)}",
+            )
+        ]
+        if self._run_sequentially(runner_class, baseline, tmp_dir_path):
+            return
+        if not os.path.exists(record_file):
+            self._logger.warning(
+                "Could not record the order of the tests in %s, "
+                "loading the plugins from %s failed",
+                record_file,
+                plugin_dir,
+            )
+            return
+        with open(record_file) as file:
+            executed = [json.load(file)]
+        nodeids = list(dict.fromkeys(strip_repeat_suffix(test) for test in executed[0]))
+        strategy = self._config.order_schedule
+        orders, needed = plan_orders(
+            nodeids, str(self._config.random_order_bucket), strategy, self._runs - 1
+        )
+        self._logger.info(
+            "Planned %d orders of %d tests, %d needed for full %s coverage",
+            len(orders),
+            len(nodeids),
+            needed,
+            strategy,
+        )
+
+        for number, order in enumerate(orders, start=naming_offset + 1):
+            iteration = Iteration(self._repo_name, self._temp_path, number)
+            order_file = iteration.file("order", ".json")
+            record_file = iteration.file("order_record", ".json")
+            with open(order_file, "w") as file:
+                json.dump(order, file, indent=2)
+            iteration.selection = self._tests_to_be_run
+            iteration.pytest_options = (
+                f"-p flapy_order --flapy-order={shlex.quote(order_file)} "
+                f"--flapy-order-record={shlex.quote(record_file)}"
+            )
+            aborted = self._run_sequentially(runner_class, [iteration], tmp_dir_path)
+            if os.path.exists(record_file):
+                with open(record_file) as file:
+                    executed.append(json.load(file))
+            if aborted:
+                break
+
+        executed_orders = [
+            list(dict.fromkeys(strip_repeat_suffix(test) for test in order))
+            for order in executed
+        ]
+        report = dict(
+            strategy=strategy,
+            bucket=str(self._config.random_order_bucket),
+            runs_needed=needed + 1,
+            planned=orders,
+            executed=executed_orders,
+            coverage=coverage(executed_orders),
+        )
+        self._logger.info(
+            "Covered %s of %d ordered pairs of tests in %d orders",
+            report["coverage"]["ordered_pairs_covered"],
+            report["coverage"]["ordered_pairs_total"],
+            len(executed_orders),
+        )
+        with open(
+            os.path.join(
+                self._temp_path, f"{self._repo_name}_order_plan{naming_offset}.json"
+            ),
+            "w",
+        ) as file:
+            json.dump(report, file, indent=2)
+
+    def _provide_plugin_dir(self) -> str:
+        """Copies flapy's pytest plugins to the temp directory, which the tests can
+        access, and returns the path of the copy."""
+        if self._plugin_dir is None:
+            self._plugin_dir = os.path.join(self._temp_path, "flapy_pytest_plugins")
+            if not os.path.exists(self._plugin_dir):
+                shutil.copytree(
+                    PLUGIN_DIR,
+                    self._plugin_dir,
+                    ignore=shutil.ignore_patterns("__pycache__"),
                 )
-                trace_file: str = os.path.join(
-                    self._temp_path,
-                    "{}_trace{}{}".format(
+        return self._plugin_dir
+
+    def _run_iterations_adaptively(self, runner_class, naming_offset, tmp_dir_path):
+        """Runs at most the configured number of iterations, but after the first
+        --adaptive-min-runs iterations only the tests whose verdict is not yet
+        settled.  The outcomes and flake-rate interval of every test are written
+        to `{project}_adaptive{offset}.json'.
+        """
+        budget = AdaptiveBudget(
+            self._config.adaptive_min_runs,
+            self._config.confidence,
+            self._config.flake_rate,
+        )
+        for number in range(naming_offset, naming_offset + self._runs):
+            if number - naming_offset < self._config.adaptive_min_runs:
+                iterations = self._full_iterations(number)
+            else:
+                unsettled = budget.unsettled()
+                if not unsettled:
+                    self._logger.info(
+                        "All verdicts settled after %d iterations",
+                        number - naming_offset,
+                    )
+                    break
+                iterations = [
+                    Iteration(
                         self._repo_name,
-                        i + naming_offset,
-                        test_to_be_run.replace("/", "."),
-                    ),
+                        self._temp_path,
+                        number,
+                        selection=" ".join(shlex.quote(test) for test in unsettled),
+                    )
+                ]
+                self._logger.info("Rerun %d unsettled tests", len(unsettled))
+            aborted = self._run_sequentially(runner_class, iterations, tmp_dir_path)
+            for iteration in iterations:
+                if os.path.exists(iteration.xml_output_file):
+                    budget.record(iteration.xml_output_file)
+            if aborted:
+                break
+
+        self._adaptive_report = budget.report()
+        self._logger.info(
+            "Adaptive mode: %d test executions, %d tests, %d unsettled",
+            budget.executions,
+            len(budget.tests),
+            len(budget.unsettled()),
+        )
+        with open(
+            os.path.join(
+                self._temp_path, f"{self._repo_name}_adaptive{naming_offset}.json"
+            ),
+            "w",
+        ) as file:
+            json.dump(self._adaptive_report, file, indent=2)
+
+    def _run_iterations_in_parallel(
+        self, runner_class, iterations: List[Iteration], tmp_dir_path: str, jobs: int
+    ) -> None:
+        """Runs the iterations in a pool of jobs worker processes.
+
+        Each iteration gets its own copy of the repository and its own temporary
+        directory.  If the tests modify a shared virtual environment, no further
+        iterations are started until the running ones are finished and the
+        environment is rebuilt.
+        """
+        iterations = self._pending(iterations)
+        self._apply_coverage_policy(iterations)
+        cores: Optional[multiprocessing.Queue] = None
+        if self._config.pin_cores:
+            cores = multiprocessing.Queue()
+            for core in sorted(os.sched_getaffinity(0))[:jobs]:
+                cores.put(core)
+        pending = self._longest_first(iterations)
+        plugin_dir = self._provide_plugin_dir()
+        running: Dict[concurrent.futures.Future, Iteration] = {}
+        # Iteration numbers repeat for each entry of --tests-to-be-run, thus the
+        # directories of the workers are numbered in the order they are scheduled
+        scheduled = 0
+        drain = False
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=_pin_worker, initargs=(cores,)
+        ) as executor:
+            while pending or running:
+                while pending and len(running) < jobs and not drain:
+                    iteration = pending.pop(0)
+                    future = executor.submit(
+                        self._run_iteration,
+                        runner_class,
+                        iteration,
+                        f"{tmp_dir_path}_{scheduled}",
+                        isolate_tempdir=True,
+                        plugin_dir=plugin_dir,
+                    )
+                    running[future] = iteration
+                    scheduled += 1
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
                 )
-                runner = runner_class(
-                    self._repo_name,
-                    copy,
-                    self._config,
-                    # time_limit=1800,  # Does not work well with benchexec 2.7
-                    xml_output_file=xml_output_file,
-                    xml_coverage_file=xml_coverage_file,
-                    output_log_file=output_log_file,
-                    trace_output_file=trace_file,
-                    tests_to_be_run=test_to_be_run,
-                    full_access_dir=self._temp_path,
+                for future in done:
+                    iteration = running.pop(future)
+                    if self._finish_iteration(iteration, future.result()):
+                        skipped = [
+                            remaining
+                            for remaining in pending
+                            if remaining.test_to_be_run == iteration.test_to_be_run
+                        ]
+                        self._skip_iterations(iteration, skipped)
+                        pending = [it for it in pending if it not in skipped]
+                drain = drain or self._environment_modified()
+                if drain and not running:
+                    self._rebuild_environment(runner_class)
+                    drain = False
+
+    def _longest_first(self, iterations: List[Iteration]) -> List[Iteration]:
+        """Orders the iterations by the duration the duration store expects,
+        longest first, such that no long iteration is started last."""
+        if self._durations is None:
+            return list(iterations)
+        # Iteration numbers repeat for each entry of --tests-to-be-run, thus the
+        # estimates are kept by position
+        estimates = [
+            self._durations.estimate(
+                self._project_hash,
+                shlex.split(iteration.selection or iteration.test_to_be_run),
+            )
+            for iteration in iterations
+        ]
+        order = sorted(
+            range(len(iterations)), key=lambda index: estimates[index], reverse=True
+        )
+        return [iterations[index] for index in order]
+
+    def _run_iterations_in_zygote(
+        self, runner_class, iterations: List[Iteration], tmp_dir_path: str
+    ) -> None:
+        """Runs all iterations as forks of one process that has already imported
+        pytest and the project's test modules.
+
+        The iterations share one copy of the repository and one environment.
+        """
+        self._logger.info(
+            "%s Running %d iterations for project %s in a fork server",
+            runner_class.__name__,
+            len(iterations),
+            self._repo_name,
+        )
+        iterations = self._pending(iterations)
+        if not iterations:
+            return
+        self._apply_coverage_policy(iterations)
+        shared_env = self._env is not None
+        if not shared_env:
+            self._provide_environment(runner_class)
+        copy = self._provide_workspace(tmp_dir_path, reuse=False)
+        # The files of the fork server are named after the first iteration
+        first = Iteration(self._repo_name, self._temp_path, iterations[0].number)
+        runner = runner_class(
+            self._repo_name,
+            copy,
+            self._config,
+            full_access_dir=self._temp_path,
+            env=self._env,
+            pytest_options=self._timeout_options(),
+            plugin_dir=self._provide_plugin_dir(),
+        )
+        try:
+            out, err = runner.run_zygote(
+                iterations,
+                first.file("zygote_plan", ".json"),
+                first.file("zygote", ".json"),
+            )
+        finally:
+            FileUtils.delete_copy(copy)
+            if not shared_env:
+                self._release_environment()
+        # Each child wrote its own output, this is the one of the fork server
+        self._logger.debug("FORK SERVER OUT: %s", out)
+        self._logger.debug("FORK SERVER ERR: %s", err)
+        for iteration in iterations:
+            if os.path.exists(iteration.output_log_file):
+                with open(iteration.output_log_file) as file:
+                    result = (file.read(), "", runner.install_report)
+            else:
+                # The fork server did not get to fork a child for this iteration
+                result = (out, err, runner.install_report)
+            # All iterations have already run, the report is written nevertheless
+            if self._finish_iteration(iteration, result):
+                self._skip_iterations(iteration, [])
+
+        report_file = first.file("zygote", ".json")
+        if os.path.exists(report_file):
+            with open(report_file) as file:
+                report = json.load(file)
+            self._logger.info(
+                "Fork server: warm-up %.1fs, %d runs, saved %.1fs of startup time",
+                report["warmup"],
+                len(report["runs"]),
+                report["saved"],
+            )
+
+    def _run_iteration(
+        self,
+        runner_class,
+        iteration: Iteration,
+        tmp_dir_path: str,
+        isolate_tempdir: bool = False,
+        plugin_dir: Optional[str] = None,
+    ) -> Tuple[str, str, Optional[InstallReport]]:
+        """Runs the tests once in a fresh copy of the repository.
+
+        :param isolate_tempdir: Whether the tests shall get their own temporary
+            directory (TMPDIR) next to the copy of the repository
+        :param plugin_dir: The copy of flapy's pytest plugins; provided here if
+            not given.  Worker processes must get it from the parent, otherwise
+            they copy the plugins concurrently.
+        :return: Output and error output of the run and the report of the
+            installation of the requirements, if one took place
+        """
+        self._logger.info(
+            "%s Iteration %d of %d for project %s",
+            runner_class.__name__,
+            iteration.number,
+            self._runs,
+            self._repo_name,
+        )
+        if self._config.venv_lifecycle == "iteration" and self._venv_cache:
+            self._provide_environment(runner_class)
+        if isolate_tempdir:
+            os.makedirs(f"{tmp_dir_path}_tmp")
+            os.environ["TMPDIR"] = f"{tmp_dir_path}_tmp"
+        # Parallel iterations (isolate_tempdir) each need their own copy
+        copy = self._provide_workspace(tmp_dir_path, reuse=not isolate_tempdir)
+        runner = runner_class(
+            self._repo_name,
+            copy,
+            self._config,
+            # time_limit=1800,  # Does not work well with benchexec 2.7
+            xml_output_file=iteration.xml_output_file,
+            xml_coverage_file=(
+                iteration.xml_coverage_file if iteration.coverage else None
+            ),
+            output_log_file=iteration.output_log_file,
+            trace_output_file=iteration.trace_file,
+            tests_to_be_run=iteration.selection or iteration.test_to_be_run,
+            full_access_dir=self._temp_path,
+            env=self._env,
+            pytest_options=" ".join(
+                filter(None, [iteration.pytest_options, self._timeout_options()])
+            ),
+            plugin_dir=plugin_dir or self._provide_plugin_dir(),
+            results_file=iteration.results_file,
+        )
+        try:
+            out, err = runner.run()
+        finally:
+            if self._workspace is None or self._workspace.workspace != copy:
+                FileUtils.delete_copy(copy)
+            if isolate_tempdir:
+                shutil.rmtree(f"{tmp_dir_path}_tmp", ignore_errors=True)
+            if self._config.venv_lifecycle == "iteration":
+                self._release_environment()
+        return out, err, runner.install_report
+
+    def _pending(self, iterations: List[Iteration]) -> List[Iteration]:
+        """Returns the iterations whose results have not been aggregated before a
+        restart with --resume."""
+        pending = []
+        for iteration in iterations:
+            if self._aggregator.has(iteration.xml_output_file) and os.path.exists(
+                iteration.xml_output_file
+            ):
+                self._generated_files.add(iteration.xml_output_file)
+            else:
+                pending.append(iteration)
+        if len(pending) < len(iterations):
+            self._logger.info(
+                "Skip %d iterations finished before the restart",
+                len(iterations) - len(pending),
+            )
+        return pending
+
+    def _apply_coverage_policy(self, iterations: List[Iteration]) -> None:
+        """Decides in which of the given iterations coverage is measured."""
+        for iteration in iterations:
+            iteration.coverage = wants_coverage(
+                self._config.coverage,
+                iteration.number - self._naming_offset,
+                self._config.coverage_every,
+            )
+
+    def _log_coverage_overhead(self) -> None:
+        estimate = self._coverage_overhead.estimate()
+        if estimate is None:
+            self._logger.info(
+                "Cannot estimate the overhead of coverage (--coverage %s), no test "
+                "ran both with and without it",
+                self._config.coverage,
+            )
+            return
+        factor, seconds = estimate
+        self._logger.info(
+            "Coverage slowed the tests down by a factor of %.2f, which added an "
+            "estimated %.1fs to the iterations with coverage (--coverage %s)",
+            factor,
+            seconds,
+            self._config.coverage,
+        )
+
+    def _provide_workspace(self, tmp_dir_path: str, reuse: bool) -> str:
+        """Provides a pristine copy of the repository.
+
+        With `--workspace-reset delta', the copy of the previous iteration is
+        reused after undoing the changes of its test run.  If the reset cannot be
+        verified, a new copy is made.
+
+        :param tmp_dir_path: Path the copy is created at
+        :param reuse: Whether the copy may be kept for the following iterations
+        :return: Path to the copy
+        """
+        if self._workspace is not None:
+            stats = self._workspace.reset()
+            self._logger.info(
+                "Reset workspace %s (%s)", self._workspace.workspace, stats
+            )
+            if stats.verified:
+                return self._workspace.workspace
+            self._logger.warning(
+                "Could not reset workspace %s, copying it anew",
+                self._workspace.workspace,
+            )
+            self._release_workspace()
+        copy: str = FileUtils.provide_copy(
+            self._repo_path,
+            tmp_dir_path=tmp_dir_path,
+            strategy=self._workspace_strategy,
+            ignore=self._exclusions,
+        )
+        self._logger.info("Workspace %s (%s)", copy, FileUtils.last_copy_stats)
+        if reuse and self._config.workspace_reset == "delta":
+            self._workspace = WorkspaceSnapshot(
+                copy, self._repo_path, self._workspace_strategy
+            )
+        return copy
+
+    def _release_workspace(self) -> None:
+        if self._workspace is not None:
+            FileUtils.delete_copy(self._workspace.workspace)
+            self._workspace = None
+
+    def _finish_iteration(
+        self,
+        iteration: Iteration,
+        result: Tuple[str, str, Optional[InstallReport]],
+    ) -> bool:
+        """Logs and classifies the result of an iteration.
+
+        :return: True, if the iterations of the iteration's entry of
+            --tests-to-be-run so far failed deterministically and its remaining
+            ones shall be skipped; only for the iteration deciding this
+        """
+        out, err, install_report = result
+        self._log_output(out, err, install_report)
+        self._collect_result_file(iteration)
+        if os.path.exists(iteration.xml_output_file):
+            try:
+                self._coverage_overhead.record(
+                    iteration.xml_output_file, iteration.coverage
                 )
-                out, err = runner.run()
-                # TODO Analyse logs, if the run was aborted, why did it abort?
-                self._logger.debug("OUT: %s", out)
-                self._logger.debug("ERR: %s", err)
-
-                if os.path.exists(xml_output_file):
-                    self._generated_files.add(xml_output_file)
-                else:
-                    self._logger.warning(
-                        "Did not create file %s while running the tests.",
-                        xml_output_file,
+                if self._durations is not None:
+                    self._durations.record_file(
+                        self._project_hash, iteration.xml_output_file
                     )
+                if self._config.adaptive_timeouts and self._timeouts_file is None:
+                    self._derive_timeouts(iteration)
+            except ET.ParseError:
+                pass
 
-                FileUtils.delete_copy(copy)
+        if install_report is None and self._env is not None:
+            install_report = self._env.install_report
+        kind, detail = classify_run(out, err, install_report, iteration.xml_output_file)
+        if kind is not None:
+            self._logger.warning(
+                "Iteration %d failed: %s (%s)", iteration.number, kind, detail
+            )
+            self._last_failure = (kind, detail)
+        entry = iteration.test_to_be_run
+        tracker = self._failures.setdefault(
+            entry, FailureTracker(self._config.abort_after_failures)
+        )
+        if tracker.record(kind) and entry not in self._aborted:
+            self._aborted.add(entry)
+            return True
+        return False
+
+    def _timeout_options(self) -> str:
+        """Returns the pytest arguments applying the adaptive timeouts derived so
+        far, which require the plugin_dir.  The global timeout is set by the
+        runner, see PyTestRunner._timeout_argument."""
+        if not self._config.adaptive_timeouts or self._timeouts_file is None:
+            return ""
+        return f"-p flapy_timeouts --flapy-timeouts={shlex.quote(self._timeouts_file)}"
+
+    def _derive_timeouts(self, iteration: Iteration) -> None:
+        """Derives the timeout of each test from the durations observed so far
+        and writes them to `{project}_timeouts{offset}.json'."""
+        if self._durations is not None:
+            samples = self._durations.samples(self._project_hash)
+        else:
+            samples = {}
+            for testcase in iter_testcases(iteration.xml_output_file):
+                if testcase.result != "skipped":
+                    samples.setdefault(testcase.nodeid, []).append(testcase.time)
+        if not samples:
+            return
+        timeouts = derive_timeouts(
+            samples,
+            self._config.timeout_factor,
+            self._config.timeout_floor,
+            self._config.timeout_ceiling,
+        )
+        timeouts_file = os.path.join(
+            self._temp_path, f"{self._repo_name}_timeouts{self._naming_offset}.json"
+        )
+        with open(timeouts_file, "w") as file:
+            json.dump(timeouts, file, indent=2)
+        self._timeouts_file = timeouts_file
+        self._logger.info(
+            "Derived timeouts for %d tests, at most %gs",
+            len(timeouts),
+            max(timeouts.values()),
+        )
+
+    def _skip_iterations(self, iteration: Iteration, skipped: List[Iteration]) -> None:
+        """Records that the analysis of the iteration's entry of --tests-to-be-run
+        was aborted after the given iteration in
+        `{project}_infrastructure_failure{entry}.json'."""
+        kind, detail = self._last_failure
+        entry = iteration.test_to_be_run
+        self._logger.error(
+            "Skipping %d remaining iterations of %s %s after %s: %s",
+            len(skipped),
+            self._repo_name,
+            entry,
+            kind,
+            detail,
+        )
+        write_failure_report(
+            os.path.join(
+                self._temp_path,
+                "{}_infrastructure_failure{}.json".format(
+                    self._repo_name, entry.replace("/", ".")
+                ),
+            ),
+            {
+                "project": self._repo_name,
+                "tests_to_be_run": entry,
+                "kind": kind,
+                "detail": detail,
+                "iteration": iteration.number,
+                "failures": self._failures[entry].failures,
+                "skipped_iterations": len(skipped),
+            },
+        )
+
+    def _log_output(
+        self, out: str, err: str, install_report: Optional[InstallReport]
+    ) -> None:
+        # TODO Analyse logs, if the run was aborted, why did it abort?
+        self._logger.debug("OUT: %s", out)
+        self._logger.debug("ERR: %s", err)
+        self._log_install_report(install_report)
+        if self._wheelhouse is not None:
+            self._wheelhouse.mark_used(out)
+
+    def _collect_result_file(self, iteration: Iteration) -> None:
+        if os.path.exists(iteration.xml_output_file):
+            self._generated_files.add(iteration.xml_output_file)
+            for test_name in self._aggregator.fold(iteration.xml_output_file):
+                self._logger.info("Found flaky test %s", test_name)
+        else:
+            self._logger.warning(
+                "Did not create file %s while running the tests.",
+                iteration.xml_output_file,
+            )
+
+    def _effective_jobs(self) -> int:
+        """Limits the number of parallel jobs to the available CPUs and memory."""
+        jobs = self._config.jobs
+        if jobs <= 1:
+            return 1
+        limit = len(os.sched_getaffinity(0))
+        memory = available_memory()
+        if memory is not None:
+            limit = min(limit, int(memory // (self._config.job_memory * 1024**3)))
+        if max(limit, 1) < jobs:
+            self._logger.info(
+                "Reduce number of parallel jobs from %d to %d", jobs, max(limit, 1)
+            )
+        return max(min(jobs, limit), 1)
 
     def _analyse_test_results(self):
-        """Compares the test results in order to find flaky tests."""
-        roots = set()
-        self._logger.info("Read XML result files")
-        for file in self._generated_files:
+        """Compares the test results in order to find flaky tests.
+
+        The results of the iterations are aggregated as soon as they finish,
+        only files not aggregated yet are read here.
+        """
+        for file in sorted(self._generated_files):
+            if self._aggregator.has(file):
+                continue
             if os.path.exists(file):
                 self._logger.debug("Read file %s", file)
-                tree = ET.parse(file)
-                roots.add(tree.getroot())
+                self._aggregator.fold(file)
             else:
                 self._logger.warning(
-                    "Could not find file %s while analyzing the test results.", file,
+                    "Could not find file %s while analyzing the test results.",
+                    file,
                 )
-
-        for root in roots:
-            for test_suite in root.findall("testsuite"):
-                for test_case in test_suite.findall("testcase"):
-                    if "classname" in test_case.keys() and "name" in test_case.keys():
-                        test_name = (
-                            test_case.get("classname") + "." + test_case.get("name")
-                        )
-                        test_passed: bool = test_case.find("failure") is None
-                        if (
-                            test_name in self._test_cases
-                            and self._test_cases[test_name] != test_passed
-                        ):
-                            self._flaky_tests.add(test_name)
-                        self._test_cases[test_name] = test_passed
+        self._flaky_tests = self._aggregator.flaky_tests
+        self._test_cases = self._aggregator.tests
 
     def _print_summary(self):
         """Prints a short summary of the analysis."""
@@ -756,6 +1962,22 @@ class FlakyAnalyser:
             for i, flaky_test in enumerate(self._flaky_tests, 1):
                 file.write("flaky test {}: {}\n".format(i, flaky_test))
 
+            if self._adaptive_report is not None:
+                file.write(
+                    "\nflake-rate intervals ({:.0%} confidence):\n".format(
+                        self._adaptive_report["confidence"]
+                    )
+                )
+                for nodeid, test in self._adaptive_report["tests"].items():
+                    file.write(
+                        "{}: [{:.3f}, {:.3f}] after {} runs ({})\n".format(
+                            nodeid,
+                            *test["flake_rate_interval"],
+                            test["passed"] + test["failed"],
+                            test["settled"] or "unsettled",
+                        )
+                    )
+
     def _cleanup(self):
         """Removes all files generated during the analysis."""
         for file in self._generated_files:
@@ -862,6 +2084,318 @@ class FlakyAnalyser:
             "will be executed each individually in a new pytest run. "
             'Example: "tests/test_file.py::test_func1 tests/test_file.py::TestClass::test_func2',
         )
+        parser.add_argument(
+            "--venv-lifecycle",
+            dest="venv_lifecycle",
+            choices=["iteration", "project"],
+            default="iteration",
+            required=False,
+            help="When to create the virtual environment the tests are run in.  "
+            "`iteration' creates and populates a new environment for every run, "
+            "`project' creates it once and reuses it for all iterations and all "
+            "entries of --tests-to-be-run.  The shared environment is rebuilt "
+            "only if a test run modified its installed packages.",
+        )
+        parser.add_argument(
+            "--venv-cache",
+            dest="venv_cache",
+            required=False,
+            help="Optional path to a directory caching populated virtual "
+            "environments.  Environments are keyed by the project's requirements, "
+            "the tool packages and the Python version and cloned on a cache hit.",
+        )
+        parser.add_argument(
+            "--venv-cache-size",
+            dest="venv_cache_size",
+            type=float,
+            default=20.0,
+            required=False,
+            help="Maximum size of the virtual environment cache in GB.  The least "
+            "recently used environments are evicted first.  Default: 20",
+        )
+        parser.add_argument(
+            "--wheelhouse",
+            dest="wheelhouse",
+            required=False,
+            help="Optional path to a directory of wheels built by `flapy wheelhouse'.  "
+            "If given, packages are installed from there only "
+            "(pip install --no-index --find-links).",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            dest="jobs",
+            type=int,
+            default=1,
+            required=False,
+            help="Number of iterations that are run in parallel.  Each one uses its "
+            "own copy of the repository and its own temporary directory.  The "
+            "number is reduced to the available CPUs and memory.  Default: 1",
+        )
+        parser.add_argument(
+            "--job-memory",
+            dest="job_memory",
+            type=float,
+            default=2.0,
+            required=False,
+            help="Memory in GB that is reserved for each parallel job.  Default: 2",
+        )
+        parser.add_argument(
+            "--pin-cores",
+            dest="pin_cores",
+            action="store_true",
+            default=False,
+            required=False,
+            help="Pin each parallel job to its own CPU core to keep timing noise "
+            "comparable between runs.",
+        )
+        parser.add_argument(
+            "--workspace-strategy",
+            dest="workspace_strategy",
+            choices=["auto", "reflink", "hardlink", "copy"],
+            default="auto",
+            required=False,
+            help="How the copies of the repository are created for each iteration.  "
+            "`auto' selects reflink (copy-on-write clones) if supported, copy "
+            "otherwise.  `hardlink' (hard links, not for root) makes the files of "
+            "the repository read-only while the tests run, which fails tests "
+            "writing into them.  Default: auto",
+        )
+        parser.add_argument(
+            "--copy-exclude",
+            dest="copy_exclude",
+            action="append",
+            default=[],
+            required=False,
+            metavar="PATTERN",
+            help="Glob pattern of files or directories that are not copied into the "
+            "workspaces.  Patterns containing a slash are matched against the path "
+            "relative to the repository.  Can be given multiple times.  By default, "
+            f"{', '.join(DEFAULT_EXCLUDES)} are excluded.",
+        )
+        parser.add_argument(
+            "--no-default-excludes",
+            dest="no_default_excludes",
+            action="store_true",
+            default=False,
+            required=False,
+            help="Do not exclude the default patterns, only the --copy-exclude ones.",
+        )
+        parser.add_argument(
+            "--honor-gitignore",
+            dest="honor_gitignore",
+            action="store_true",
+            default=False,
+            required=False,
+            help="Do not copy files ignored by the repository's .gitignore files.",
+        )
+        parser.add_argument(
+            "--coverage",
+            dest="coverage",
+            choices=POLICIES,
+            default="always",
+            required=False,
+            help="In which iterations coverage is measured: `off', only in the "
+            "`first' iteration, in every --coverage-every-th iteration "
+            "(`sampled'), or `always'.  Measuring branch coverage slows the tests "
+            "down and changes their timing.  Default: always",
+        )
+        parser.add_argument(
+            "--coverage-every",
+            dest="coverage_every",
+            type=int,
+            default=5,
+            required=False,
+            metavar="K",
+            help="With --coverage sampled, measure coverage in every K-th "
+            "iteration, starting with the first.  Default: 5",
+        )
+        parser.add_argument(
+            "--adaptive-timeouts",
+            dest="adaptive_timeouts",
+            action="store_true",
+            default=False,
+            required=False,
+            help="Give every test its own timeout instead of 10 seconds.  The first "
+            "iteration runs with --timeout-ceiling, then each test gets the 99th "
+            "percentile of its durations times --timeout-factor, within floor and "
+            "ceiling.  The durations come from the --duration-store, if given, "
+            "otherwise from the first iteration.  The timeouts are written to "
+            "{project}_timeouts{offset}.json; tests stopped by a timeout are "
+            "marked in the results.",
+        )
+        parser.add_argument(
+            "--timeout-factor",
+            dest="timeout_factor",
+            type=float,
+            default=5.0,
+            required=False,
+            help="See --adaptive-timeouts.  Default: 5",
+        )
+        parser.add_argument(
+            "--timeout-floor",
+            dest="timeout_floor",
+            type=float,
+            default=2.0,
+            required=False,
+            help="The smallest timeout in seconds, see --adaptive-timeouts.  "
+            "Default: 2",
+        )
+        parser.add_argument(
+            "--timeout-ceiling",
+            dest="timeout_ceiling",
+            type=float,
+            default=120.0,
+            required=False,
+            help="The largest timeout in seconds, see --adaptive-timeouts.  "
+            "Default: 120",
+        )
+        parser.add_argument(
+            "--resume",
+            dest="resume",
+            action="store_true",
+            default=False,
+            required=False,
+            help="Continue an interrupted analysis in the same temp directory.  "
+            "The results of the iterations are aggregated into "
+            "{project}_summary{offset}.json as they finish; iterations found there "
+            "are not run again.",
+        )
+        parser.add_argument(
+            "--zygote",
+            dest="zygote",
+            action="store_true",
+            default=False,
+            required=False,
+            help="Run all iterations of a project as forks of one process that has "
+            "imported pytest and the test modules once, which saves their startup "
+            "time.  The iterations run one after another in a single copy of the "
+            "repository, whose changes are undone after each iteration, thus "
+            "--workspace-reset does not apply.  Statements executed on import are "
+            "not covered in the iterations' coverage.  Not available with --trace.",
+        )
+        parser.add_argument(
+            "--workspace-reset",
+            dest="workspace_reset",
+            choices=["recopy", "delta"],
+            default="recopy",
+            required=False,
+            help="How the copy of the repository is reset between iterations.  "
+            "`recopy' deletes it and copies the repository again, `delta' restores "
+            "only the files the tests created, modified or deleted and falls back "
+            "to a new copy if the result cannot be verified.  Applies to "
+            "iterations run one after another, not to --jobs.  Default: recopy",
+        )
+        parser.add_argument(
+            "--abort-after-failures",
+            dest="abort_after_failures",
+            type=int,
+            default=2,
+            required=False,
+            help="Skip the remaining iterations of an entry of --tests-to-be-run "
+            "(of the project without entries), if this many of its iterations at "
+            "the start failed the same way outside of the tests (installation, "
+            "collection, runexec, no XML).  The other entries are run "
+            "nevertheless.  The reason is written to "
+            "{project}_infrastructure_failure{entry}.json in the temp directory.  "
+            "0 disables this.  Default: 2",
+        )
+        modes = parser.add_mutually_exclusive_group()
+        modes.add_argument(
+            "--adaptive",
+            dest="adaptive",
+            action="store_true",
+            default=False,
+            required=False,
+            help="Treat --number-test-runs as a maximum budget.  After "
+            "--adaptive-min-runs iterations, only tests whose verdict is not yet "
+            "settled are rerun: tests that have not shown both outcomes, but have "
+            "failed or vary strongly in duration, until the upper bound of their "
+            "flake rate is below --flake-rate.  Iterations run one after another.",
+        )
+        modes.add_argument(
+            "--two-phase",
+            dest="two_phase",
+            action="store_true",
+            default=False,
+            required=False,
+            help="Run all tests once, then rerun only suspected tests for the "
+            "remaining iterations: tests that failed or timed out, that use time, "
+            "randomness or the network (judged by a static check), and tests "
+            "defined next to a failed one.  Iterations run one after another.",
+        )
+        modes.add_argument(
+            "--order-schedule",
+            dest="order_schedule",
+            choices=["none", "pairs", "adjacent"],
+            default="none",
+            required=False,
+            help="Run the tests in planned orders instead of random ones, applied "
+            "to the buckets of --random-order-bucket and to the tests within each "
+            "bucket.  `pairs' runs every test before every other test at least "
+            "once, which takes two orders after the first iteration; `adjacent' "
+            "runs every test immediately before every other test of its bucket, "
+            "which takes as many orders as the largest bucket has tests (twice as "
+            "many, if odd).  Remaining iterations repeat the plan.  The plan and "
+            "the covered pairs are written to {project}_order_plan{offset}.json "
+            "in the temp directory.  Ignored with --deterministic.  "
+            "Default: none",
+        )
+        parser.add_argument(
+            "--duration-store",
+            dest="duration_store",
+            default=None,
+            required=False,
+            help="SQLite database keeping the durations of the tests across runs, "
+            "by project hash.  Parallel iterations are started longest first.  "
+            "Can be shared between analyses.",
+        )
+        parser.add_argument(
+            "--project-hash",
+            dest="project_hash",
+            default=None,
+            required=False,
+            help="The revision of the project durations and polluters are stored "
+            "for.  Default: the commit checked out in --repository",
+        )
+        parser.add_argument(
+            "--spot-check-every",
+            dest="spot_check_every",
+            type=int,
+            default=5,
+            required=False,
+            metavar="K",
+            help="In two-phase mode, run all tests in every K-th iteration, such "
+            "that order-dependent effects are not lost.  0 disables this.  "
+            "Default: 5",
+        )
+        parser.add_argument(
+            "--adaptive-min-runs",
+            dest="adaptive_min_runs",
+            type=int,
+            default=3,
+            required=False,
+            help="Number of iterations running all tests in adaptive mode.  "
+            "Default: 3",
+        )
+        parser.add_argument(
+            "--confidence",
+            dest="confidence",
+            type=float,
+            default=0.95,
+            required=False,
+            help="Confidence level of the flake-rate intervals in adaptive mode.  "
+            "Default: 0.95",
+        )
+        parser.add_argument(
+            "--flake-rate",
+            dest="flake_rate",
+            type=float,
+            default=0.1,
+            required=False,
+            help="Suspicious tests are rerun in adaptive mode until their flake rate "
+            "is below this rate with the given confidence.  Default: 0.1",
+        )
 
         return parser
 
@@ -0,0 +1,653 @@
+#!/usr/bin/env python3
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Runs the projects of a FlaPy input CSV, several at a time, and keeps track of
+which ones are done, such that an interrupted campaign can be resumed.
+
+This replaces the loop of run_csv.sh: every project is still analysed by
+run_execution.sh, but up to `--jobs' of them run concurrently, each under its own
+timeout.  The state of every project (queued, running, done, failed) is kept in a
+JSON file.  Projects found running there when the campaign starts were
+interrupted, e.g., by a reboot of the node, and are run again; done and failed
+ones are not.  The start and end of every project are written as JSON lines.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import IO, TYPE_CHECKING, Any, Dict, List, Optional
+
+from flapy.prefetch import Preparation, Prefetcher
+
+if TYPE_CHECKING:
+    from flapy.work_queue import WorkQueue  # pylint: disable=cyclic-import
+
+LOGGER = logging.getLogger("RepositoryAnalyser.Campaign")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Seconds between two checks of the running projects
+POLL_INTERVAL = 1.0
+
+
+# pylint: disable=too-few-public-methods, too-many-instance-attributes
+@dataclass
+class Project:
+    """A row of a FlaPy input CSV."""
+
+    name: str
+    url: str
+    git_hash: str
+    funcs_to_trace: str = ""
+    tests_to_be_run: str = ""
+    num_runs: str = ""
+    # The line of the row in the CSV file, starting at 1
+    line: int = 0
+
+    @property
+    def key(self) -> str:
+        """Identifies the row, the same project may occur in several rows."""
+        return f"{self.line}:{self.name}"
+
+    def arguments(self) -> List[str]:
+        """Returns the columns in the order run_execution.sh expects them."""
+        return [
+            self.name,
+            self.url,
+            self.git_hash,
+            self.funcs_to_trace,
+            self.tests_to_be_run,
+            self.num_runs,
+        ]
+
+
+def read_csv(csv_file: str) -> List[Project]:
+    """Reads the projects of a CSV file in the format of run_csv.sh.
+
+    Windows line endings, a header line and rows with fewer than three columns
+    are ignored.
+    """
+    projects = []
+    with open(csv_file, newline="") as file:
+        for line, row in enumerate(csv.reader(file), start=1):
+            row = [column.strip("\r") for column in row]
+            if len(row) < 3 or row[0] == "PROJECT_NAME":
+                continue
+            columns = (row + [""] * 6)[:6]
+            projects.append(Project(*columns, line=line))  # type: ignore
+    return projects
+
+
+def local_project_dir(local_dir: str, project: Project) -> str:
+    """Creates the directory a project is checked out and analysed in.
+
+    Like in run_csv.sh, the directory gets a random name, unless functions are
+    traced, whose traces contain the path; then, the name is derived from the
+    traced functions, such that it is the same in every campaign.
+    """
+    parent = os.path.join(local_dir, project.name)
+    os.makedirs(parent, exist_ok=True)
+    if project.funcs_to_trace == "":
+        return tempfile.mkdtemp(dir=parent, prefix="")
+    postfix = hashlib.md5(project.funcs_to_trace.encode("utf-8")).hexdigest()[:8]
+    directory = os.path.join(parent, postfix)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+class CampaignState:
+    """The state of every project of a campaign in a JSON file, which is
+    replaced atomically on every change."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self.projects: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.projects = json.load(file)
+
+    def add(self, projects: List[Project]) -> None:
+        """Adds the projects not known yet as queued."""
+        for project in projects:
+            self.projects.setdefault(
+                project.key, {"project": project.name, "status": QUEUED, "runs": 0}
+            )
+        self.save()
+
+    def recover(self, retry_failed: bool = False) -> List[str]:
+        """Queues the projects that were interrupted while running.
+
+        :param retry_failed: Queue the failed projects as well
+        :return: The keys of the queued projects
+        """
+        recovered = [
+            key
+            for key, entry in self.projects.items()
+            if entry["status"] == RUNNING
+            or (retry_failed and entry["status"] == FAILED)
+        ]
+        for key in recovered:
+            self.projects[key]["status"] = QUEUED
+        self.save()
+        return recovered
+
+    def status(self, key: str) -> str:
+        """Returns the status of a project."""
+        return self.projects[key]["status"]
+
+    def update(self, key: str, **fields: Any) -> None:
+        """Changes the entry of a project and saves the state."""
+        self.projects[key].update(fields)
+        self.save()
+
+    def counts(self) -> Dict[str, int]:
+        """Returns the number of projects in every status."""
+        counts = dict.fromkeys([QUEUED, RUNNING, DONE, FAILED], 0)
+        for entry in self.projects.values():
+            counts[entry["status"]] += 1
+        return counts
+
+    def save(self) -> None:
+        """Atomically replaces the state file."""
+        with open(self._path + ".tmp", "w") as file:
+            json.dump(self.projects, file, indent=2)
+        os.replace(self._path + ".tmp", self._path)
+
+
+class EventLog:
+    """Writes events as JSON lines, e.g., for monitoring a campaign."""
+
+    def __init__(self, stream: IO[str]) -> None:
+        self._stream = stream
+        self._host = socket.gethostname()
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """Writes an event with the current time and host."""
+        record = {"event": event, "time": time.time(), "host": self._host, **fields}
+        self._stream.write(json.dumps(record) + "\n")
+        self._stream.flush()
+
+
+@dataclass
+class _Running:
+    project: Project
+    process: subprocess.Popen
+    log: IO
+    start: float
+
+
+class Campaign:
+    """Runs the projects of a CSV with run_execution.sh, `jobs' at a time."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        projects: List[Project],
+        state: CampaignState,
+        events: EventLog,
+        script: str = "./run_execution.sh",
+        local_dir: str = "local",
+        log_dir: str = "campaign-logs",
+        jobs: int = 1,
+        timeout: float = 24 * 60 * 60,
+        git_cache: Optional[str] = None,
+        prefetch: int = 0,
+        prefetch_max_size: int = 0,
+        wheelhouse: Optional[str] = None,
+        queue: Optional["WorkQueue"] = None,
+    ) -> None:
+        """
+        :param projects: The projects, run in the given order
+        :param state: The state, projects done or failed in it are not run
+        :param events: Receives the start and end of every project
+        :param script: The script analysing a project, called with the CSV
+            columns and the local project directory like run_execution.sh
+        :param local_dir: The directory the projects are analysed in
+        :param log_dir: The output of every project is written to
+            `{log_dir}/{line}_{name}.log'
+        :param jobs: The number of projects run concurrently
+        :param timeout: Seconds after which a project is killed
+        :param git_cache: Directory of a git mirror cache the projects are
+            checked out from, see flapy.git_cache
+        :param prefetch: The number of queued projects prepared ahead, see
+            flapy.prefetch
+        :param prefetch_max_size: Maximum size of the prepared projects in bytes,
+            0 for unlimited
+        :param wheelhouse: Directory the prepared projects build the wheels of
+            their requirements in, which they are then installed from
+        :param queue: A queue in a shared directory the projects are taken from in
+            addition to the given ones, see flapy.work_queue
+        """
+        self._projects = projects
+        self._state = state
+        self._events = events
+        self._script = script
+        self._local_dir = local_dir
+        self._log_dir = log_dir
+        self._jobs = max(1, jobs)
+        self._timeout = timeout
+        self._running: Dict[str, _Running] = {}
+        self._env = dict(os.environ)
+        if git_cache is not None:
+            self._env["FLAPY_GIT_CACHE"] = os.path.abspath(git_cache)
+        self._wheelhouse = os.path.abspath(wheelhouse) if wheelhouse else None
+        self._prefetcher: Optional[Prefetcher] = None
+        if prefetch > 0:
+            self._prefetcher = Prefetcher(
+                lambda project: local_project_dir(self._local_dir, project),
+                prefetch,
+                prefetch_max_size,
+                git_cache,
+                self._wheelhouse,
+            )
+        self._prefetch_depth = prefetch
+        self._queue = queue
+        self._last_heartbeat = 0.0
+        if queue is not None:
+            self._env["FLAPY_RESULTS_DIR"] = queue.path("results")
+
+    def run(self) -> Dict[str, int]:
+        """Runs all queued projects.
+
+        If the campaign is interrupted, e.g., by SIGTERM, the running projects are
+        killed and queued again.
+
+        :return: The number of projects in every status
+        """
+        self._state.add(self._projects)
+        pending = [
+            project
+            for project in self._projects
+            if self._state.status(project.key) == QUEUED
+        ]
+        os.makedirs(self._log_dir, exist_ok=True)
+        previous = signal.signal(signal.SIGTERM, _raise_interrupt)
+        try:
+            while pending or self._running or not self._is_drained():
+                self._pull(pending)
+                self._prefetch(pending)
+                while (
+                    pending
+                    and len(self._running) < self._jobs
+                    and self._is_ready(pending[0])
+                ):
+                    self._start(pending.pop(0))
+                time.sleep(
+                    POLL_INTERVAL
+                    if self._running or pending or self._queue is not None
+                    else 0
+                )
+                self._poll()
+        finally:
+            for key in list(self._running):
+                self._stop(key, QUEUED)
+            if self._queue is not None:
+                for project in pending:
+                    self._queue.release(project.key)
+            signal.signal(signal.SIGTERM, previous)
+            if self._prefetcher is not None:
+                self._prefetcher.shutdown()
+                self._events.emit(
+                    "prefetch",
+                    setup_seconds=self._prefetcher.setup_seconds,
+                    hidden_seconds=self._prefetcher.hidden_seconds,
+                )
+                LOGGER.info(
+                    "Prefetching hid %.0fs of %.0fs setup time",
+                    self._prefetcher.hidden_seconds,
+                    self._prefetcher.setup_seconds,
+                )
+        return self._state.counts()
+
+    def _is_drained(self) -> bool:
+        # Leases of other workers may still become stale and be queued again
+        return self._queue is None or self._queue.is_drained()
+
+    def _pull(self, pending: List[Project]) -> None:
+        """Renews the leases of this worker and leases projects from the queue for
+        the free slots and the projects prepared ahead."""
+        if self._queue is None:
+            return
+        if time.time() - self._last_heartbeat > self._queue.lease_timeout / 10:
+            self._last_heartbeat = time.time()
+            for key in self._queue.heartbeat():
+                # Another worker may run the project by now
+                if key in self._running:
+                    self._stop(key, QUEUED)
+                pending[:] = [project for project in pending if project.key != key]
+            self._queue.requeue_stale()
+        while len(pending) + len(self._running) < self._jobs + self._prefetch_depth:
+            project = self._queue.claim()
+            if project is None:
+                break
+            self._state.add([project])
+            self._state.update(project.key, status=QUEUED)
+            self._events.emit("leased", project=project.name, key=project.key)
+            pending.append(project)
+
+    def _prefetch(self, pending: List[Project]) -> None:
+        if self._prefetcher is None:
+            return
+        for preparation in self._prefetcher.prefetch(pending):
+            self._report(preparation)
+
+    def _report(self, preparation: Preparation) -> None:
+        preparation.reported = True
+        self._events.emit(
+            "prepared",
+            key=preparation.key,
+            succeeded=preparation.succeeded,
+            wheels_built=preparation.wheels_built,
+            seconds=preparation.seconds,
+            size=preparation.size,
+        )
+
+    def _is_ready(self, project: Project) -> bool:
+        return self._prefetcher is None or self._prefetcher.is_ready(project.key)
+
+    def _start(self, project: Project) -> None:
+        preparation: Optional[Preparation] = None
+        if self._prefetcher is not None:
+            preparation = self._prefetcher.take(project.key)
+        env = self._env
+        if preparation is None:
+            directory = local_project_dir(self._local_dir, project)
+        else:
+            if not preparation.reported:
+                self._report(preparation)
+            directory = preparation.directory
+            if preparation.wheels_built and self._wheelhouse is not None:
+                env = dict(self._env, FLAPY_WHEELHOUSE=self._wheelhouse)
+        log = open(  # pylint: disable=consider-using-with
+            os.path.join(self._log_dir, f"{project.line}_{project.name}.log"), "ab"
+        )
+        process = subprocess.Popen(  # pylint: disable=consider-using-with
+            [self._script] + project.arguments() + [directory],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            # Own process group, such that the whole analysis can be killed
+            start_new_session=True,
+            env=env,
+        )
+        self._running[project.key] = _Running(project, process, log, time.time())
+        runs = self._state.projects[project.key]["runs"] + 1
+        self._state.update(
+            project.key,
+            status=RUNNING,
+            runs=runs,
+            host=socket.gethostname(),
+            start=time.time(),
+            local_project_dir=directory,
+            setup_seconds=preparation.seconds if preparation else 0.0,
+            setup_hidden_seconds=preparation.hidden if preparation else 0.0,
+        )
+        self._events.emit(
+            "start",
+            project=project.name,
+            key=project.key,
+            hash=project.git_hash,
+            prepared=preparation is not None and preparation.succeeded,
+            setup_hidden_seconds=preparation.hidden if preparation else 0.0,
+        )
+
+    def _poll(self) -> None:
+        for key, running in list(self._running.items()):
+            returncode = running.process.poll()
+            if returncode is not None:
+                self._finish(key, DONE if returncode == 0 else FAILED, returncode)
+            elif time.time() - running.start > self._timeout:
+                LOGGER.warning(
+                    "Killing %s after %ds", running.project.name, self._timeout
+                )
+                self._stop(key, FAILED, timed_out=True)
+
+    def _stop(self, key: str, status: str, timed_out: bool = False) -> None:
+        process = self._running[key].process
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self._finish(key, status, process.wait(), timed_out)
+
+    def _finish(
+        self, key: str, status: str, returncode: int, timed_out: bool = False
+    ) -> None:
+        running = self._running.pop(key)
+        running.log.close()
+        seconds = time.time() - running.start
+        self._state.update(
+            key,
+            status=status,
+            end=time.time(),
+            returncode=returncode,
+            timed_out=timed_out,
+        )
+        self._events.emit(
+            "end",
+            project=running.project.name,
+            key=key,
+            status=status,
+            returncode=returncode,
+            timed_out=timed_out,
+            seconds=seconds,
+        )
+        if self._queue is None:
+            return
+        if status == QUEUED:
+            self._queue.release(key)
+        else:
+            self._queue.complete(
+                key,
+                status,
+                worker=self._queue.worker,
+                returncode=returncode,
+                timed_out=timed_out,
+                seconds=seconds,
+            )
+
+
+def _raise_interrupt(signum, frame):  # pylint: disable=unused-argument
+    raise KeyboardInterrupt()
+
+
+def main(argv: List[str] = None) -> None:
+    """The main entry location of the program."""
+    if not argv:
+        argv = sys.argv
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description="Analyses the projects of a FlaPy input CSV with "
+        "run_execution.sh, several at a time.  Run it again with the same state "
+        "file to resume an interrupted campaign.",
+    )
+    parser.add_argument(
+        "csv_file",
+        nargs="?",
+        help="Input CSV in the format of run_csv.sh, optional with --queue",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="Number of projects analysed concurrently.  Default: 1",
+    )
+    parser.add_argument(
+        "--timeout",
+        dest="timeout",
+        type=float,
+        default=24 * 60 * 60,
+        help="Seconds after which the analysis of a project is killed.  "
+        "Default: 86400 (24h)",
+    )
+    parser.add_argument(
+        "--state",
+        dest="state",
+        default=None,
+        help="JSON file keeping the state of every project.  "
+        "Default: {csv_file}.state.json",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        dest="retry_failed",
+        action="store_true",
+        default=False,
+        help="Run the projects that failed or timed out in a previous run again.",
+    )
+    parser.add_argument(
+        "--events",
+        dest="events",
+        default=None,
+        help="File the start and end events are appended to.  Default: stdout",
+    )
+    parser.add_argument(
+        "--script",
+        dest="script",
+        default="./run_execution.sh",
+        help="Script analysing a single project.  Default: ./run_execution.sh",
+    )
+    parser.add_argument(
+        "--local",
+        dest="local",
+        default=os.path.join(os.getcwd(), "local", "hdd", os.environ.get("USER", "")),
+        help="Directory the projects are analysed in.  Default: ./local/hdd/$USER",
+    )
+    parser.add_argument(
+        "--logs",
+        dest="logs",
+        default=None,
+        help="Directory the output of every project is written to.  "
+        "Default: ./campaign-logs, or {queue}/logs",
+    )
+    parser.add_argument(
+        "--git-cache",
+        dest="git_cache",
+        default=None,
+        help="Check out the projects from a cache of git mirrors in this "
+        "directory, which several campaigns may share",
+    )
+    parser.add_argument(
+        "--prefetch",
+        dest="prefetch",
+        type=int,
+        default=0,
+        help="Check out this many queued projects ahead while others run.  "
+        "Default: 0",
+    )
+    parser.add_argument(
+        "--prefetch-max-gb",
+        dest="prefetch_max_gb",
+        type=float,
+        default=20.0,
+        help="Stop preparing projects ahead while the prepared ones exceed this "
+        "size.  Default: 20",
+    )
+    parser.add_argument(
+        "--wheelhouse",
+        dest="wheelhouse",
+        default=None,
+        help="Also build wheels for the requirements of the prepared projects in "
+        "this directory and install them from there.  The wheels are built with "
+        "the Python running the campaign.",
+    )
+    parser.add_argument(
+        "--queue",
+        dest="queue",
+        default=None,
+        help="Take the projects from a queue in this shared directory, see "
+        "`flapy queue'.  The state, events and logs of this worker, and the "
+        "results, are written to the directory as well.",
+    )
+    parser.add_argument(
+        "--lease-timeout",
+        dest="lease_timeout",
+        type=float,
+        default=None,
+        help="Seconds after which the projects of an unresponsive worker are "
+        "queued again.  Default: 600",
+    )
+    config = parser.parse_args(argv[1:])
+    logging.basicConfig(level=logging.INFO)
+
+    if os.getcwd().startswith("/home/"):
+        # The analysis hides /home from the tests with runexec
+        print("ERROR: DO NOT EXECUTE THIS IN /HOME", file=sys.stderr)
+        sys.exit(1)
+    if config.csv_file is None and config.queue is None:
+        parser.error("either csv_file or --queue is required")
+    queue: Optional["WorkQueue"] = None
+    state_file = config.state
+    if config.queue is not None:
+        # flapy.work_queue imports this module, thus import it lazily
+        from flapy.work_queue import (  # pylint: disable=import-outside-toplevel
+            DEFAULT_LEASE_TIMEOUT,
+            WorkQueue,
+        )
+
+        queue = WorkQueue(
+            config.queue, lease_timeout=config.lease_timeout or DEFAULT_LEASE_TIMEOUT
+        )
+        for directory in ["state", "events", "logs"]:
+            os.makedirs(queue.path(directory), exist_ok=True)
+        state_file = state_file or queue.path("state", f"{queue.worker}.json")
+        config.events = config.events or queue.path("events", f"{queue.worker}.jsonl")
+        config.logs = config.logs or queue.path("logs")
+    state = CampaignState(state_file or config.csv_file + ".state.json")
+    recovered = state.recover(config.retry_failed)
+    if recovered:
+        LOGGER.info("Queued %d interrupted or failed projects again", len(recovered))
+    events_file: Optional[IO[str]] = None
+    if config.events is not None:
+        events_file = open(config.events, "a")  # pylint: disable=R1732
+    try:
+        campaign = Campaign(
+            read_csv(config.csv_file) if config.csv_file else [],
+            state,
+            EventLog(events_file or sys.stdout),
+            script=config.script,
+            local_dir=config.local,
+            log_dir=config.logs or "campaign-logs",
+            jobs=config.jobs,
+            timeout=config.timeout,
+            git_cache=config.git_cache,
+            prefetch=config.prefetch,
+            prefetch_max_size=int(config.prefetch_max_gb * 1024**3),
+            wheelhouse=config.wheelhouse,
+            queue=queue,
+        )
+        counts = campaign.run()
+    except KeyboardInterrupt:
+        LOGGER.warning("Interrupted, the running projects are queued again")
+        sys.exit(130)
+    finally:
+        if events_file is not None:
+            events_file.close()
+    LOGGER.info("Campaign finished: %s", counts)
+    sys.exit(1 if counts[FAILED] else 0)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
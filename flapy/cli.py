@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Dispatches `flapy <stage> ...` to the main function of the stage's module."""
+import importlib
+import sys
+from typing import List
+
+STAGES = {
+    "analyse": "flapy.analysis",
+    "bisect": "flapy.polluters",
+    "campaign": "flapy.campaign",
+    "git-cache": "flapy.git_cache",
+    "plan": "flapy.cluster_plan",
+    "queue": "flapy.work_queue",
+    "wheelhouse": "flapy.wheelhouse",
+    "workspace-benchmark": "flapy.workspace",
+}
+
+
+def main(argv: List[str] = None) -> None:
+    """The main entry location of the program."""
+    if not argv:
+        argv = sys.argv
+    if len(argv) < 2 or argv[1] not in STAGES:
+        print(f"Usage: flapy {{{','.join(STAGES)}}} [ARGS...]", file=sys.stderr)
+        sys.exit(1)
+    module = importlib.import_module(STAGES[argv[1]])
+    module.main([f"flapy {argv[1]}"] + argv[2:])  # type: ignore
+
+
+if __name__ == "__main__":
+    main(sys.argv)
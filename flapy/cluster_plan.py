@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Groups the projects of a FlaPy input CSV into SLURM array tasks.
+
+Instead of one array task per CSV line, every task gets a group of projects whose
+estimated runtimes add up to at most a target runtime (first-fit decreasing).
+The runtime of a project is estimated from the state files of earlier campaigns,
+from the test durations recorded by `flakyanalysis --duration-store', or,
+without either, by a fallback estimate.
+
+    flapy plan pack input.csv --out plan
+    flapy plan requeue plan --out requeue.csv
+
+`pack' writes the group of task i to `{out}/task_{i}.csv', which
+array_plan_job.sh runs with `flapy campaign'.  `requeue' collects the rows of
+all tasks that did not finish, e.g., because the task was killed, into a new CSV.
+"""
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import re
+import shlex
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from flapy.campaign import DONE, FAILED, CampaignState, Project, read_csv
+from flapy.durations import DurationStore
+
+LOGGER = logging.getLogger("RepositoryAnalyser.ClusterPlan")
+
+TASK_PATTERN = "task_*.csv"
+
+
+# pylint: disable=too-few-public-methods
+@dataclass
+class Estimate:
+    """The estimated runtime of a project and where it comes from."""
+
+    project: Project
+    seconds: float
+    # "campaign", "durations" or "fallback"
+    source: str
+
+
+def campaign_history(state_files: Iterable[str]) -> Dict[str, float]:
+    """Reads the longest runtime of every project from campaign state files.
+
+    Only finished projects are considered, projects that timed out count with
+    the time they ran until they were killed.
+
+    :return: Seconds by project name
+    """
+    history: Dict[str, float] = {}
+    for state_file in state_files:
+        for entry in CampaignState(state_file).projects.values():
+            if entry["status"] not in (DONE, FAILED) or "end" not in entry:
+                continue
+            seconds = entry["end"] - entry["start"]
+            history[entry["project"]] = max(history.get(entry["project"], 0), seconds)
+    return history
+
+
+class Estimator:
+    """Estimates the runtime of projects."""
+
+    def __init__(
+        self,
+        history: Dict[str, float],
+        durations: Optional[DurationStore],
+        setup: float,
+        fallback: float,
+    ) -> None:
+        """
+        :param history: Earlier runtimes by project name, see campaign_history
+        :param durations: Test durations recorded by earlier analyses
+        :param setup: Seconds added to the test durations for cloning and
+            installing a project
+        :param fallback: Seconds assumed for projects without any history
+        """
+        self._history = history
+        self._durations = durations
+        self._setup = setup
+        self._fallback = fallback
+
+    def estimate(self, project: Project) -> Estimate:
+        """Estimates the runtime of a project, preferring earlier campaigns."""
+        if project.name in self._history:
+            return Estimate(project, self._history[project.name], "campaign")
+        if self._durations is not None:
+            selection = shlex.split(project.tests_to_be_run)
+            per_run = self._durations.estimate(project.git_hash, selection)
+            if per_run > 0:
+                runs = int(project.num_runs) if project.num_runs.isdigit() else 1
+                return Estimate(project, self._setup + per_run * runs, "durations")
+        return Estimate(project, self._fallback, "fallback")
+
+
+def first_fit_decreasing(
+    estimates: List[Estimate], capacity: float
+) -> List[List[Estimate]]:
+    """Packs the projects into as few groups as possible whose estimates add up to
+    at most the capacity.  A project exceeding the capacity gets a group of its
+    own.
+
+    :return: The groups, the longest project first in every group
+    """
+    groups: List[List[Estimate]] = []
+    loads: List[float] = []
+    for estimate in sorted(estimates, key=lambda e: e.seconds, reverse=True):
+        for i, load in enumerate(loads):
+            if load + estimate.seconds <= capacity:
+                groups[i].append(estimate)
+                loads[i] += estimate.seconds
+                break
+        else:
+            groups.append([estimate])
+            loads.append(estimate.seconds)
+    return groups
+
+
+def _write_csv(path: str, projects: Iterable[Project]) -> None:
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        for project in projects:
+            writer.writerow(project.arguments())
+
+
+def pack(
+    csv_file: str, out_dir: str, estimator: Estimator, capacity: float
+) -> List[List[Estimate]]:
+    """Writes the groups of the projects of a CSV to `{out_dir}/task_{i}.csv',
+    starting at 1 like SLURM array task ids, and their estimates to
+    `{out_dir}/plan.json'.
+
+    :param capacity: The target runtime of a task in seconds
+    :return: The groups
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for old_task in glob.glob(os.path.join(out_dir, TASK_PATTERN)):
+        os.remove(old_task)
+    estimates = [estimator.estimate(project) for project in read_csv(csv_file)]
+    groups = first_fit_decreasing(estimates, capacity)
+    plan = []
+    for task_id, group in enumerate(groups, start=1):
+        _write_csv(
+            os.path.join(out_dir, f"task_{task_id}.csv"),
+            (estimate.project for estimate in group),
+        )
+        plan.append(
+            {
+                "task": task_id,
+                "seconds": sum(estimate.seconds for estimate in group),
+                "projects": [
+                    {
+                        "name": estimate.project.name,
+                        "seconds": estimate.seconds,
+                        "source": estimate.source,
+                    }
+                    for estimate in group
+                ],
+            }
+        )
+    with open(os.path.join(out_dir, "plan.json"), "w") as file:
+        json.dump(plan, file, indent=2)
+    return groups
+
+
+def unfinished(plan_dir: str) -> List[Project]:
+    """Returns the projects of all tasks of a plan that are neither done nor
+    failed, i.e., whose task was killed or never started.
+
+    The campaign of a task keeps its state in `task_{i}.csv.state.json'.
+    """
+    projects = []
+    task_files = glob.glob(os.path.join(plan_dir, TASK_PATTERN))
+    for task_file in sorted(task_files, key=_task_id):
+        state = CampaignState(task_file + ".state.json")
+        for project in read_csv(task_file):
+            entry = state.projects.get(project.key)
+            if entry is None or entry["status"] not in (DONE, FAILED):
+                projects.append(project)
+    return projects
+
+
+def _task_id(task_file: str) -> int:
+    match = re.search(r"task_([0-9]+)\.csv$", task_file)
+    return int(match.group(1)) if match else 0
+
+
+def main(argv: List[str] = None) -> None:
+    """The main entry location of the program."""
+    if not argv:
+        argv = sys.argv
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description="Groups the projects of a FlaPy input CSV into SLURM array "
+        "tasks with a target runtime, and collects the projects of killed tasks.",
+    )
+    commands = parser.add_subparsers(dest="command")
+    pack_parser = commands.add_parser("pack", help="Group the projects of a CSV")
+    pack_parser.add_argument("csv_file", help="Input CSV in the format of run_csv.sh")
+    pack_parser.add_argument(
+        "--out", dest="out", required=True, help="Directory the tasks are written to"
+    )
+    pack_parser.add_argument(
+        "--target-minutes",
+        dest="target_minutes",
+        type=float,
+        default=120.0,
+        help="Target runtime of a task.  Default: 120",
+    )
+    pack_parser.add_argument(
+        "--fallback-minutes",
+        dest="fallback_minutes",
+        type=float,
+        default=20.0,
+        help="Runtime assumed for projects without recorded durations.  Default: 20",
+    )
+    pack_parser.add_argument(
+        "--setup-minutes",
+        dest="setup_minutes",
+        type=float,
+        default=5.0,
+        help="Time added to the recorded test durations of a project for cloning "
+        "and installing it.  Default: 5",
+    )
+    pack_parser.add_argument(
+        "--state",
+        dest="state",
+        action="append",
+        default=[],
+        help="State file of an earlier campaign to take runtimes from, "
+        "may be given several times",
+    )
+    pack_parser.add_argument(
+        "--duration-store",
+        dest="duration_store",
+        default=None,
+        help="SQLite file of test durations written by flakyanalysis",
+    )
+    requeue_parser = commands.add_parser(
+        "requeue", help="Collect the projects of tasks that did not finish"
+    )
+    requeue_parser.add_argument("plan_dir", help="Directory written by `pack'")
+    requeue_parser.add_argument(
+        "--out", dest="out", required=True, help="CSV the projects are written to"
+    )
+    config = parser.parse_args(argv[1:])
+    logging.basicConfig(level=logging.INFO)
+
+    if config.command == "pack":
+        durations = None
+        if config.duration_store is not None:
+            durations = DurationStore(config.duration_store)
+        estimator = Estimator(
+            campaign_history(config.state),
+            durations,
+            config.setup_minutes * 60,
+            config.fallback_minutes * 60,
+        )
+        groups = pack(
+            config.csv_file, config.out, estimator, config.target_minutes * 60
+        )
+        if durations is not None:
+            durations.close()
+        # The number of array tasks, read by run_cluster_job.sh
+        print(len(groups))
+    elif config.command == "requeue":
+        projects = unfinished(config.plan_dir)
+        _write_csv(config.out, projects)
+        LOGGER.info("%d projects did not finish", len(projects))
+        print(len(projects))
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
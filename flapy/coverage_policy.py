@@ -0,0 +1,69 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Decides in which iterations coverage is measured and estimates its cost."""
+from typing import Dict, List, Optional, Tuple
+
+from flapy.junit import iter_testcases
+
+POLICIES = ["off", "first", "sampled", "always"]
+
+
+def wants_coverage(policy: str, index: int, every: int) -> bool:
+    """Checks whether coverage shall be measured in an iteration.
+
+    :param policy: One of POLICIES
+    :param index: The index of the iteration, starting at 0
+    :param every: With policy `sampled', coverage is measured in every k-th
+        iteration, starting with the first
+    """
+    if policy == "always":
+        return True
+    if policy == "first":
+        return index == 0
+    if policy == "sampled":
+        return every > 0 and index % every == 0
+    return False
+
+
+class CoverageOverhead:
+    """Estimates how much time measuring coverage added to the iterations by
+    comparing the durations of the tests run with and without coverage."""
+
+    def __init__(self) -> None:
+        # Durations of each test with and without coverage
+        self._durations: Dict[bool, Dict[str, List[float]]] = {True: {}, False: {}}
+
+    def record(self, xml_file: str, covered: bool) -> None:
+        """Adds the durations of the tests in a JUnit XML file."""
+        for testcase in iter_testcases(xml_file):
+            self._durations[covered].setdefault(testcase.nodeid, []).append(
+                testcase.time
+            )
+
+    def estimate(self) -> Optional[Tuple[float, float]]:
+        """Returns the factor by which coverage slowed the tests down and the
+        seconds it added to the iterations with coverage, or None, if no test was
+        run both with and without coverage."""
+        with_coverage, without_coverage = self._durations[True], self._durations[False]
+        common = set(with_coverage) & set(without_coverage)
+        mean_with = sum(_mean(with_coverage[nodeid]) for nodeid in common)
+        mean_without = sum(_mean(without_coverage[nodeid]) for nodeid in common)
+        if not common or mean_without <= 0:
+            return None
+        factor = mean_with / mean_without
+        total_with = sum(sum(durations) for durations in with_coverage.values())
+        return factor, total_with * (1 - 1 / factor)
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values)
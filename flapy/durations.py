@@ -0,0 +1,205 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Keeps the durations of the tests across runs and campaigns.
+
+The durations are stored in an SQLite database, one row per project revision and
+test holding the most recent samples.  Several analyses may share the database
+concurrently, SQLite serialises their writes.
+"""
+import json
+import math
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flapy.junit import iter_testcases, strip_repeat_suffix
+
+# The number of samples kept per test, older ones are dropped
+MAX_SAMPLES = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS durations (
+    project TEXT NOT NULL,
+    nodeid TEXT NOT NULL,
+    samples TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (project, nodeid)
+)
+"""
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Returns the q-th percentile of the values, interpolating linearly between
+    the closest ranks like numpy.percentile.
+
+    :param q: The percentile between 0 and 100
+    """
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def derive_timeouts(
+    samples: Dict[str, List[float]],
+    factor: float,
+    floor: float,
+    ceiling: float,
+    q: float = 99,
+) -> Dict[str, float]:
+    """Derives the timeout of each test from its observed durations.
+
+    :param samples: The durations of each test
+    :param factor: The q-th percentile of the durations is multiplied by it
+    :param floor: The smallest timeout in seconds
+    :param ceiling: The largest timeout in seconds
+    :return: The timeout of each test in seconds, rounded up to whole seconds
+    """
+    return {
+        nodeid: float(
+            min(max(math.ceil(percentile(values, q) * factor), floor), ceiling)
+        )
+        for nodeid, values in samples.items()
+        if values
+    }
+
+
+class DurationStore:
+    """Durations of tests by project hash and node id.
+
+    The node ids are stored without the parameter pytest-repeat adds, such that
+    all repetitions of a test contribute samples to the same entry.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: The database file, created if it does not exist
+        """
+        self._path = path
+        self._connection = sqlite3.connect(path, timeout=60)
+        with self._connection:
+            self._connection.execute(_SCHEMA)
+
+    def close(self) -> None:
+        """Closes the database."""
+        self._connection.close()
+
+    def __enter__(self) -> "DurationStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def record(self, project: str, durations: Iterable[Tuple[str, float]]) -> None:
+        """Adds samples of durations in a single transaction.
+
+        :param project: The project hash
+        :param durations: Pairs of node id and seconds
+        """
+        new: Dict[str, List[float]] = {}
+        for nodeid, seconds in durations:
+            new.setdefault(strip_repeat_suffix(nodeid), []).append(seconds)
+        if not new:
+            return
+        now = time.time()
+        with self._connection:
+            # Take the write lock before reading, concurrent updates would be lost
+            self._connection.execute("BEGIN IMMEDIATE")
+            for nodeid, added in new.items():
+                row = self._connection.execute(
+                    "SELECT samples, runs FROM durations "
+                    "WHERE project = ? AND nodeid = ?",
+                    (project, nodeid),
+                ).fetchone()
+                stored, runs = (json.loads(row[0]), row[1]) if row else ([], 0)
+                samples = (stored + added)[-MAX_SAMPLES:]
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO durations VALUES (?, ?, ?, ?, ?)",
+                    (project, nodeid, json.dumps(samples), runs + len(added), now),
+                )
+
+    def record_file(self, project: str, xml_file: str) -> None:
+        """Adds the durations of the tests in a JUnit XML file."""
+        self.record(
+            project,
+            (
+                (testcase.nodeid, testcase.time)
+                for testcase in iter_testcases(xml_file)
+                if testcase.result != "skipped"
+            ),
+        )
+
+    def samples(self, project: str) -> Dict[str, List[float]]:
+        """Returns the samples of all tests of a project."""
+        return {
+            nodeid: json.loads(samples)
+            for nodeid, samples in self._connection.execute(
+                "SELECT nodeid, samples FROM durations WHERE project = ?", (project,)
+            )
+        }
+
+    def percentile(self, project: str, nodeid: str, q: float) -> Optional[float]:
+        """Returns the q-th percentile of the durations of a test, or None, if it
+        has never been run."""
+        row = self._connection.execute(
+            "SELECT samples FROM durations WHERE project = ? AND nodeid = ?",
+            (project, strip_repeat_suffix(nodeid)),
+        ).fetchone()
+        return percentile(json.loads(row[0]), q) if row else None
+
+    def percentiles(self, project: str, q: float) -> Dict[str, float]:
+        """Returns the q-th percentile of the durations of every test of a
+        project."""
+        return {
+            nodeid: percentile(samples, q)
+            for nodeid, samples in self.samples(project).items()
+        }
+
+    def estimate(
+        self, project: str, selection: Iterable[str] = (), q: float = 50
+    ) -> float:
+        """Estimates the seconds a run of the tests takes.
+
+        :param selection: The tests to be run as given to pytest, e.g.,
+            directories, files or node ids; all tests, if empty
+        :param q: The percentile of the durations of each test that is summed
+        :return: The estimate, 0 if no test of the selection has been run before
+        """
+        prefixes = tuple(selection)
+        return sum(
+            seconds
+            for nodeid, seconds in self.percentiles(project, q).items()
+            if not prefixes or nodeid.startswith(prefixes)
+        )
+
+    def export(self) -> List[Dict[str, object]]:
+        """Returns the runs and the common percentiles of every test as rows."""
+        return [
+            {
+                "project": project,
+                "nodeid": nodeid,
+                "runs": runs,
+                "samples": len(values),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "p99": percentile(values, 99),
+                "max": max(values),
+                "updated": updated,
+            }
+            for project, nodeid, samples, runs, updated in self._connection.execute(
+                "SELECT project, nodeid, samples, runs, updated FROM durations "
+                "ORDER BY project, nodeid"
+            )
+            for values in [json.loads(samples)]
+        ]
@@ -0,0 +1,148 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Classifies test runs that failed for reasons outside of the tests."""
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Optional, Tuple
+
+from flapy.install_planner import InstallReport
+from flapy.junit import iter_testcases
+
+_MISSING_PYTEST = re.compile(
+    r"(Cannot execute '?(?:pytest|pytest_trace)'?.*|"
+    r"(?:pytest|pytest_trace): command not found|"
+    r"No module named '?pytest'?)"
+)
+_RUNEXEC_ERROR = re.compile(
+    r"(runexec: command not found|.* - (?:ERROR|CRITICAL) - .*)", re.MULTILINE
+)
+_COLLECTION_ERROR = re.compile(
+    r"(Interrupted: \d+ errors? during collection|ERROR collecting .*)"
+)
+
+
+class InfrastructureFailure:
+    """
+    Kinds of failed runs.
+      Like Verdict, these are plain strings,
+      such that they can be written to and read from files as they are
+    """
+
+    INSTALL = "InstallFailure"
+    COLLECTION = "CollectionError"
+    RUNEXEC = "RunexecFailure"
+    NO_XML = "NoXml"
+
+
+def classify_run(
+    out: str, err: str, install_report: Optional[InstallReport], xml_file: str
+) -> Tuple[Optional[str], str]:
+    """Checks whether a test run failed for reasons outside of the tests.
+
+    :param out: Output of the run
+    :param err: Error output of the run
+    :param install_report: Report of the installation of the requirements
+    :param xml_file: The JUnit XML file the run should have written
+    :return: The kind of failure (an InfrastructureFailure) or None, if the
+        tests were run, and a short description of the failure
+    """
+    if os.path.exists(xml_file):
+        return _classify_xml(xml_file)
+    output = f"{out}\n{err}"
+
+    match = _MISSING_PYTEST.search(output)
+    if match:
+        return InfrastructureFailure.INSTALL, match.group(1)
+    if install_report is not None and not install_report.succeeded:
+        return (
+            InfrastructureFailure.INSTALL,
+            "Could not install " + ", ".join(install_report.failed),
+        )
+    match = _RUNEXEC_ERROR.search(output)
+    if match:
+        return InfrastructureFailure.RUNEXEC, match.group(1).strip()
+    match = _COLLECTION_ERROR.search(output)
+    if match:
+        return InfrastructureFailure.COLLECTION, match.group(1)
+    return InfrastructureFailure.NO_XML, f"{xml_file} was not created"
+
+
+def _classify_xml(xml_file: str) -> Tuple[Optional[str], str]:
+    collected = 0
+    collection_errors = []
+    try:
+        for testcase in iter_testcases(xml_file):
+            collected += 1
+            if testcase.result == "error" and testcase.message == "collection failure":
+                collection_errors.append(testcase.name)
+    except ET.ParseError as error:
+        return InfrastructureFailure.NO_XML, f"{xml_file} is not valid: {error}"
+    if collected == 0:
+        return InfrastructureFailure.COLLECTION, "No tests were collected"
+    if len(collection_errors) == collected:
+        return (
+            InfrastructureFailure.COLLECTION,
+            "Could not collect " + ", ".join(collection_errors),
+        )
+    return None, ""
+
+
+class FailureTracker:
+    """Decides when the remaining iterations of a project are pointless.
+
+    A failure is considered deterministic, if the first iterations of a project
+    all fail in the same way.  Once any iteration ran the tests, failures are only
+    counted, as they might be caused by the tests themselves.
+    """
+
+    def __init__(self, threshold: int) -> None:
+        """
+        :param threshold: Number of identical failures at the start after which
+            the remaining iterations are skipped, 0 to never skip
+        """
+        self._threshold = threshold
+        self._succeeded = False
+        self._kind: Optional[str] = None
+        self._count = 0
+        self.failures: Dict[str, int] = {}
+
+    def record(self, kind: Optional[str]) -> bool:
+        """Records the result of an iteration.
+
+        :param kind: The kind of failure of the iteration or None
+        :return: True, if the remaining iterations shall be skipped
+        """
+        if kind is None:
+            self._succeeded = True
+            return False
+        self.failures[kind] = self.failures.get(kind, 0) + 1
+        if self._succeeded:
+            return False
+        self._count = self._count + 1 if kind == self._kind else 1
+        self._kind = kind
+        return 0 < self._threshold <= self._count
+
+
+def write_failure_report(path: str, report: Dict[str, Any]) -> None:
+    """Writes the reason for aborting the analysis of a project as JSON.
+
+    :param path: The file to write, usually `{project}_infrastructure_failure.json'
+    :param report: The fields of the report; a timestamp is added
+    """
+    report = dict(report, time=time.time())
+    with open(path + ".tmp", "w") as file:
+        json.dump(report, file, indent=2)
+    os.replace(path + ".tmp", path)
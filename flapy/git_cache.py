@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Provides a cache of bare mirrors of git repositories, such that checking out a
+repository that has been cloned before needs neither the network nor copying its
+history.
+
+    flapy git-cache --cache DIR checkout URL HASH DIRECTORY
+    flapy git-cache --cache DIR evict --max-size-gb 50
+"""
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Generator, List, Optional
+
+from flapy.venv_cache import directory_size
+
+LOGGER = logging.getLogger("RepositoryAnalyser.GitCache")
+
+# Checkouts made with --shared read the objects of the mirror, thus a mirror is
+# not evicted while it may still be in use by a running analysis
+DEFAULT_GRACE_PERIOD = 2 * 24 * 60 * 60
+
+
+def _git(*args: str) -> bool:
+    process = subprocess.run(
+        ["git"] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=False,
+    )
+    if process.returncode != 0:
+        LOGGER.debug("git %s failed: %s", " ".join(args), process.stderr.strip())
+    return process.returncode == 0
+
+
+class GitMirrorCache:
+    """A cache of bare mirrors of git repositories keyed by their URL.
+
+    Checkouts are local clones that share the objects of the mirror
+    (`git clone --shared`), they only write the files of the working tree.
+    Processes sharing the cache coordinate with locks: creating and updating a
+    mirror takes its lock exclusively, cloning from it shares the lock.
+
+    Layout of the cache directory::
+
+        mirrors/<key>.git   the bare mirror of a repository
+        .<key>.lock         the lock of the mirror, its mtime is the last use
+    """
+
+    def __init__(
+        self, root: str, max_size: int = 0, grace_period: float = DEFAULT_GRACE_PERIOD
+    ) -> None:
+        """
+        :param root: Directory of the cache, created if it does not exist
+        :param max_size: Maximum size of all mirrors in bytes, 0 for unlimited
+        :param grace_period: Seconds after its last use before a mirror may be
+            evicted
+        """
+        self._root = os.path.abspath(root)
+        self._max_size = max_size
+        self._grace_period = grace_period
+        self._mirrors_dir = os.path.join(self._root, "mirrors")
+        os.makedirs(self._mirrors_dir, exist_ok=True)
+
+    @staticmethod
+    def compute_key(url: str) -> str:
+        """Computes the cache key of a repository URL."""
+        return hashlib.sha256(url.rstrip("/").encode("utf-8")).hexdigest()[:24]
+
+    def mirror_path(self, url: str) -> str:
+        """Returns the path the mirror of a repository is stored at."""
+        return os.path.join(self._mirrors_dir, self.compute_key(url) + ".git")
+
+    def checkout(
+        self, url: str, git_hash: str, directory: str, dissociate: bool = False
+    ) -> bool:
+        """Checks out a repository at the given hash, like `git clone` followed by
+        `git reset --hard' in run_execution.sh.
+
+        :param url: The URL of the repository, set as origin of the checkout
+        :param git_hash: The commit to check out
+        :param directory: The directory the repository is cloned to
+        :param dissociate: Copy the objects into the checkout, such that it keeps
+            working after the mirror has been evicted
+        :return: True, if the checkout succeeded
+        """
+        key = self.compute_key(url)
+        mirror = self.mirror_path(url)
+        with self._lock(key, exclusive=True):
+            if not self._has_commit(mirror, git_hash) and not self._update(url, mirror):
+                return False
+        with self._lock(key, exclusive=False):
+            if dissociate:
+                clone_options = ["--reference", mirror, "--dissociate"]
+            else:
+                clone_options = ["--shared"]
+            succeeded = (
+                _git(
+                    "clone",
+                    "--quiet",
+                    "--no-checkout",
+                    *clone_options,
+                    mirror,
+                    directory,
+                )
+                and _git("-C", directory, "remote", "set-url", "origin", url)
+                and _git("-C", directory, "reset", "--quiet", "--hard", git_hash)
+            )
+        self.evict(keep=key)
+        return succeeded
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """Removes the least recently used mirrors until the cache fits its size
+        limit.  Mirrors used within the grace period are kept; nothing is removed
+        if the size is unlimited.
+
+        :param keep: Key of a mirror that must not be evicted
+        :return: The keys of the removed mirrors
+        """
+        if self._max_size <= 0:
+            return []
+        mirrors = []
+        for name in os.listdir(self._mirrors_dir):
+            if not name.endswith(".git"):
+                continue
+            key = name[: -len(".git")]
+            path = os.path.join(self._mirrors_dir, name)
+            mirrors.append((self._last_used(key), key, directory_size(path)))
+        total = sum(size for _, _, size in mirrors)
+        deadline = time.time() - self._grace_period
+        evicted = []
+        for last_used, key, size in sorted(mirrors):
+            if total <= self._max_size or last_used > deadline:
+                break
+            if key == keep:
+                continue
+            with self._lock(key, exclusive=True):
+                shutil.rmtree(
+                    os.path.join(self._mirrors_dir, key + ".git"), ignore_errors=True
+                )
+            total -= size
+            evicted.append(key)
+            LOGGER.info("Evicted git mirror %s from cache", key)
+        return evicted
+
+    @staticmethod
+    def _has_commit(mirror: str, git_hash: str) -> bool:
+        return os.path.isdir(mirror) and _git(
+            "--git-dir", mirror, "cat-file", "-e", f"{git_hash}^{{commit}}"
+        )
+
+    def _update(self, url: str, mirror: str) -> bool:
+        """Creates the mirror or fetches the new commits into it; requires the
+        exclusive lock."""
+        if os.path.isdir(mirror):
+            LOGGER.info("Updating git mirror of %s", url)
+            return _git("--git-dir", mirror, "fetch", "--quiet", "--prune", "origin")
+        LOGGER.info("Creating git mirror of %s", url)
+        partial = mirror + ".partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        # Garbage collection would remove objects that checkouts still refer to
+        if not (
+            _git("clone", "--quiet", "--mirror", url, partial)
+            and _git("--git-dir", partial, "config", "gc.auto", "0")
+        ):
+            shutil.rmtree(partial, ignore_errors=True)
+            return False
+        os.rename(partial, mirror)
+        return True
+
+    def _last_used(self, key: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(self._root, f".{key}.lock"))
+        except FileNotFoundError:
+            return 0.0
+
+    @contextlib.contextmanager
+    def _lock(self, key: str, exclusive: bool) -> Generator[None, None, None]:
+        """Serializes access to a mirror between processes sharing the cache and
+        marks the mirror as used."""
+        lock_path = os.path.join(self._root, f".{key}.lock")
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                os.utime(lock_path)
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def main(argv: List[str] = None) -> None:
+    """The main entry location of the program."""
+    if not argv:
+        argv = sys.argv
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description="Checks out git repositories from a cache of bare mirrors.",
+    )
+    parser.add_argument("--cache", dest="cache", required=True, help="Cache directory")
+    parser.add_argument(
+        "--max-size-gb",
+        dest="max_size_gb",
+        type=float,
+        default=0.0,
+        help="Evict the least recently used mirrors beyond this size.  "
+        "Default: 0 (unlimited)",
+    )
+    parser.add_argument(
+        "--grace-hours",
+        dest="grace_hours",
+        type=float,
+        default=DEFAULT_GRACE_PERIOD / 3600,
+        help="Mirrors used within this many hours are not evicted, as checkouts "
+        "may still use their objects.  Default: 48",
+    )
+    commands = parser.add_subparsers(dest="command")
+    checkout = commands.add_parser("checkout", help="Check out a repository")
+    checkout.add_argument("url", help="URL of the repository")
+    checkout.add_argument("git_hash", help="Commit to check out")
+    checkout.add_argument("directory", help="Directory to clone into")
+    checkout.add_argument(
+        "--dissociate",
+        action="store_true",
+        default=False,
+        help="Copy the objects, such that the checkout does not depend on the cache",
+    )
+    commands.add_parser("evict", help="Evict mirrors beyond --max-size-gb")
+    config = parser.parse_args(argv[1:])
+    logging.basicConfig(level=logging.INFO)
+
+    cache = GitMirrorCache(
+        config.cache, int(config.max_size_gb * 1024**3), config.grace_hours * 3600
+    )
+    if config.command == "checkout":
+        if not cache.checkout(
+            config.url, config.git_hash, config.directory, config.dissociate
+        ):
+            print(f"Could not check out {config.url} at {config.git_hash}")
+            sys.exit(1)
+    elif config.command == "evict":
+        for key in cache.evict():
+            print(key)
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,142 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Plans the installation of requirements into a virtual environment."""
+import re
+import shlex
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+# Installs the given pip arguments, returns success, output and error output
+PipInstall = Callable[[List[str]], Tuple[bool, str, str]]
+
+# Like pip, only treat `#` as a comment at the start of a line or after whitespace,
+# such that URL fragments (`...#egg=name`) are kept
+_COMMENT = re.compile(r"(^|\s)#.*$")
+
+
+# pylint: disable=too-few-public-methods
+@dataclass
+class InstallReport:
+    """The result of an installation planned by the InstallPlanner."""
+
+    installed: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    phases: Dict[str, float] = field(default_factory=dict)
+    pip_invocations: int = 0
+    out: str = ""
+    err: str = ""
+
+    @property
+    def succeeded(self) -> bool:
+        """Returns whether all requirements could be installed."""
+        return len(self.failed) == 0
+
+
+class InstallPlanner:
+    """Installs a list of requirement lines with as few resolver runs as possible.
+
+    First, all requirements are installed with a single pip invocation, such that
+    pip resolves them together.  If this fails, the list is bisected to find the
+    requirements that cannot be installed; all others are installed anyway.
+    """
+
+    def __init__(self, pip_install: PipInstall) -> None:
+        """
+        :param pip_install: Runs `pip install` with the given arguments in the
+            target environment
+        """
+        self._pip_install = pip_install
+
+    @staticmethod
+    def parse(lines: List[str]) -> Tuple[List[List[str]], List[str]]:
+        """Splits requirement lines into requirements and global pip options.
+
+        A requirement line is kept as a single argument, such that environment
+        markers (`foo; python_version < "3.8"`) survive; only option lines are
+        split into their arguments.
+
+        :param lines: Lines of requirements files
+        :return: The arguments for each requirement (e.g., `['-e', '.']`) and the
+            options that apply to all of them (e.g., `--index-url`)
+        """
+        requirements: List[List[str]] = []
+        options: List[str] = []
+        for line in lines:
+            line = _COMMENT.sub("", line).strip()
+            if line == "":
+                continue
+            if not line.startswith("-"):
+                args = [line]
+            else:
+                try:
+                    args = shlex.split(line)
+                except ValueError:
+                    args = line.split()
+            if args[0].startswith("-") and args[0] not in ("-e", "--editable"):
+                options.extend(args)
+            elif args not in requirements:
+                requirements.append(args)
+        return requirements, options
+
+    def install(self, lines: List[str]) -> InstallReport:
+        """Installs the given requirement lines.
+
+        :param lines: Lines of requirements files
+        :return: A report of installed and failed requirements and the time each
+            phase took
+        """
+        report = InstallReport()
+        requirements, options = self.parse(lines)
+        if len(requirements) == 0:
+            return report
+
+        start = time.time()
+        success = self._run(requirements, options, report)
+        report.phases["single-pass"] = time.time() - start
+        if success:
+            report.installed = [" ".join(args) for args in requirements]
+            return report
+
+        start = time.time()
+        middle = len(requirements) // 2
+        for half in (requirements[:middle], requirements[middle:]):
+            self._bisect(half, options, report)
+        report.phases["bisection"] = time.time() - start
+        return report
+
+    def _bisect(
+        self, requirements: List[List[str]], options: List[str], report: InstallReport
+    ) -> None:
+        if len(requirements) == 0:
+            return
+        if self._run(requirements, options, report):
+            report.installed.extend(" ".join(args) for args in requirements)
+        elif len(requirements) == 1:
+            report.failed.append(" ".join(requirements[0]))
+        else:
+            middle = len(requirements) // 2
+            self._bisect(requirements[:middle], options, report)
+            self._bisect(requirements[middle:], options, report)
+
+    def _run(
+        self, requirements: List[List[str]], options: List[str], report: InstallReport
+    ) -> bool:
+        args = list(options)
+        for requirement in requirements:
+            args.extend(requirement)
+        success, out, err = self._pip_install(args)
+        report.pip_invocations += 1
+        report.out += out
+        report.err += err
+        return success
@@ -0,0 +1,143 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Reads JUnit XML files test case by test case.
+
+JUnit XML files can grow to hundreds of megabytes, mostly captured output of
+the tests.  Instead of building the whole tree, the files are parsed
+incrementally and every element is dropped as soon as it has been read, such
+that the memory needed does not depend on the size of the file.
+"""
+import os
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import IO, Iterator, Optional, Union
+
+# The suffix pytest-repeat appends to the names of the repeated tests
+_REPEAT_SUFFIX = re.compile(r"(\[|-)\d+-\d+\]$")
+
+# The elements of a test case describing a result other than passed
+RESULTS = ("failure", "error", "skipped")
+# The elements of a test case containing captured output
+OUTPUT = ("system-out", "system-err")
+
+
+def strip_repeat_suffix(name: str) -> str:
+    """Removes the parameter pytest-repeat adds to a test name or node id."""
+    match = _REPEAT_SUFFIX.search(name)
+    if match:
+        return name[: match.start()] + ("" if match.group(1) == "[" else "]")
+    return name
+
+
+def junit_nodeid(classname: str, name: str) -> str:
+    """Reconstructs the pytest node id of a test from its JUnit XML entry, without
+    the parameters added by pytest-repeat.  Like `results_parser.to_nodeid', test
+    classes are assumed to start with an upper-case letter."""
+    name = strip_repeat_suffix(name)
+    parts = classname.split(".") if classname else []
+    if len(parts) > 1 and parts[-1][:1].isupper():
+        return f"{os.path.join(*parts[:-1])}.py::{parts[-1]}::{name}"
+    if parts:
+        return f"{os.path.join(*parts)}.py::{name}"
+    return name
+
+
+# pylint: disable=too-few-public-methods, too-many-instance-attributes
+@dataclass
+class JunitTestcase:
+    """A compact record of a test case of a JUnit XML file."""
+
+    classname: str
+    name: str
+    file: Optional[str] = None
+    time: float = 0.0
+    # The first of the RESULTS elements of the test case, None if it passed
+    result: Optional[str] = None
+    message: Optional[str] = None
+    # Text of the result element and captured error output, only read on request
+    result_text: Optional[str] = None
+    system_err: Optional[str] = None
+    # The timeout in seconds, if pytest-timeout stopped the test (flapy_timeouts)
+    timeout: Optional[float] = None
+
+    @property
+    def nodeid(self) -> str:
+        """Returns the pytest node id of the test, see junit_nodeid."""
+        return junit_nodeid(self.classname, self.name)
+
+    @property
+    def failed(self) -> bool:
+        """Checks whether the test case failed or had an error."""
+        return self.result in ("failure", "error")
+
+
+def iter_testcases(
+    source: Union[str, IO[bytes]], with_output: bool = False
+) -> Iterator[JunitTestcase]:
+    """Yields the test cases of a JUnit XML file in the order they were written.
+
+    :param source: Path to the file or a binary file object
+    :param with_output: Whether the text of the result elements and the captured
+        error output shall be read; the output is skipped otherwise
+    :raises xml.etree.ElementTree.ParseError: if the file is not valid XML; the
+        test cases before the error have been yielded already
+    """
+    stack = []
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(element)
+            continue
+        stack.pop()
+        if element.tag == "testcase":
+            yield _record(element, with_output)
+        elif stack and stack[-1].tag in ("testcase", "properties"):
+            # Read by the enclosing test case, if it is one
+            if element.tag in OUTPUT and not with_output:
+                element.text = None
+            continue
+        if stack:
+            stack[-1].remove(element)
+        element.clear()
+
+
+def read_hostname(source: Union[str, IO[bytes]]) -> Optional[str]:
+    """Returns the hostname attribute of the first test suite of a JUnit XML
+    file without reading the rest of the file."""
+    for _, element in ET.iterparse(source, events=("start",)):
+        if element.tag == "testsuite":
+            return element.get("hostname")
+    return None
+
+
+def _record(testcase: ET.Element, with_output: bool) -> JunitTestcase:
+    record = JunitTestcase(
+        classname=testcase.get("classname", ""),
+        name=testcase.get("name", ""),
+        file=testcase.get("file"),
+        time=float(testcase.get("time") or 0.0),
+    )
+    for child in testcase:
+        if child.tag in RESULTS and record.result is None:
+            record.result = child.tag
+            record.message = child.get("message")
+            if with_output:
+                record.result_text = child.text
+        elif child.tag == "system-err" and with_output:
+            record.system_err = child.text
+        elif child.tag == "properties":
+            for prop in child:
+                value = prop.get("value")
+                if prop.get("name") == "flapy_timeout" and value is not None:
+                    record.timeout = float(value)
+    return record
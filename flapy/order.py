@@ -0,0 +1,150 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Plans test orders that cover the pairs of tests with as few runs as possible.
+
+An order-dependent test (victim) fails if another test (polluter) ran before it.
+Two kinds of coverage are distinguished:
+
+* `pairs': every test runs before every other test in at least one order.  The
+  forward and the reverse order achieve this with two runs.
+* `adjacent': every test runs immediately before every other test of its bucket
+  in at least one order, for polluters whose effect is undone by the tests in
+  between.  A Williams design achieves this with n runs for n tests (2n, if n is
+  odd).
+
+Tests are grouped into buckets like pytest-random-order does, and a bucket's
+tests are never interleaved with other tests.  The design is applied to the
+order of the buckets and to the order of the tests within each bucket.
+"""
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+STRATEGIES = ["pairs", "adjacent"]
+
+# Computing the covered pairs is quadratic in the number of tests
+MAX_TESTS_FOR_PAIR_COVERAGE = 1000
+
+
+def bucket_key(nodeid: str, bucket: str) -> str:
+    """Returns the bucket of a test at the granularity of pytest-random-order.
+
+    :param nodeid: The pytest node id of the test
+    :param bucket: One of class, module, package, parent, grandparent, global
+    """
+    module = nodeid.split("::")[0]
+    parent = nodeid.rsplit("::", 1)[0]
+    if bucket == "global":
+        return ""
+    if bucket == "module":
+        return module
+    if bucket == "package":
+        return os.path.dirname(module)
+    if bucket == "grandparent":
+        return parent.rsplit("::", 1)[0] if "::" in parent else os.path.dirname(module)
+    # class and parent: the class of a method, the module of a function
+    return parent
+
+
+def forward_reverse_rows(n: int) -> List[List[int]]:
+    """Returns the forward and the reverse order of n elements."""
+    if n <= 1:
+        return [list(range(n))]
+    return [list(range(n)), list(reversed(range(n)))]
+
+
+def williams_rows(n: int) -> List[List[int]]:
+    """Returns a Williams design for n elements: orders in which every element
+    immediately precedes every other element exactly once (twice if n is odd)."""
+    if n <= 1:
+        return [list(range(n))]
+    first = [0]
+    low, high = 1, n - 1
+    while len(first) < n:
+        if len(first) % 2 == 1:
+            first.append(low)
+            low += 1
+        else:
+            first.append(high)
+            high -= 1
+    rows = [[(element + shift) % n for element in first] for shift in range(n)]
+    if n % 2 == 1:
+        rows += [list(reversed(row)) for row in rows]
+    return rows
+
+
+def plan_orders(
+    nodeids: List[str], bucket: str, strategy: str, runs: int
+) -> Tuple[List[List[str]], int]:
+    """Plans the orders of the given tests.
+
+    :param nodeids: The tests in the order they were collected
+    :param bucket: The bucket granularity, see bucket_key
+    :param strategy: One of STRATEGIES
+    :param runs: The number of orders to plan; if it exceeds the number the
+        design needs, the design is repeated
+    :return: The orders and the number of runs the design needs for full
+        coverage
+    """
+    design = williams_rows if strategy == "adjacent" else forward_reverse_rows
+    buckets: Dict[str, List[str]] = OrderedDict()
+    for nodeid in nodeids:
+        buckets.setdefault(bucket_key(nodeid, bucket), []).append(nodeid)
+    keys = list(buckets)
+    bucket_rows = design(len(keys))
+    test_rows = {key: design(len(tests)) for key, tests in buckets.items()}
+    needed = max([len(bucket_rows)] + [len(rows) for rows in test_rows.values()])
+
+    orders = []
+    for run in range(runs):
+        order: List[str] = []
+        for index in bucket_rows[run % len(bucket_rows)]:
+            tests = buckets[keys[index]]
+            rows = test_rows[keys[index]]
+            order.extend(tests[position] for position in rows[run % len(rows)])
+        orders.append(order)
+    return orders, needed
+
+
+def coverage(orders: List[List[str]]) -> Dict[str, Any]:
+    """Computes which pairs of tests the given orders cover.
+
+    :param orders: The orders the tests were run in
+    :return: The adjacent pairs covered, and the number of ordered pairs
+        covered and in total (None for very large suites)
+    """
+    tests = sorted({nodeid for order in orders for nodeid in order})
+    adjacent = sorted(
+        {(order[i], order[i + 1]) for order in orders for i in range(len(order) - 1)}
+    )
+    covered: Optional[int] = None
+    if len(tests) <= MAX_TESTS_FOR_PAIR_COVERAGE:
+        positions = [
+            {nodeid: index for index, nodeid in enumerate(order)} for order in orders
+        ]
+        covered = 0
+        for i, first in enumerate(tests):
+            for second in tests[i + 1 :]:
+                differences = [
+                    position[first] - position[second]
+                    for position in positions
+                    if first in position and second in position
+                ]
+                covered += any(d < 0 for d in differences)
+                covered += any(d > 0 for d in differences)
+    return {
+        "tests": len(tests),
+        "ordered_pairs_total": len(tests) * (len(tests) - 1),
+        "ordered_pairs_covered": covered,
+        "adjacent_pairs": [list(pair) for pair in adjacent],
+    }
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Finds the tests (polluters) that make an order-dependent test (victim) fail.
+
+Starting from the order of a run in which the victim failed, the tests that ran
+before it are reduced by delta debugging to a minimal set that still makes the
+victim fail.  Every candidate set is run in a fresh copy of the repository, but
+all runs share one virtual environment.  Found pairs are cached per project hash,
+such that repeated campaigns skip the search::
+
+    flapy bisect -r REPO -t TEMP --victim NODEID --failing-xml FILE \\
+        --polluter-cache polluters.json
+"""
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import shlex
+import sys
+import time
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+
+from flapy.analysis import FileUtils, FlakyAnalyser, Iteration, PyTestRunner
+from flapy.junit import iter_testcases, strip_repeat_suffix
+from flapy.utils import git_revision
+from flapy.workspace import select_strategy
+
+
+class Status:
+    """
+    Outcomes of the search for the polluters of a victim.
+      Like Verdict, these are plain strings,
+      such that they can be written to and read from files as they are
+    """
+
+    FOUND = "Found"
+    CACHED = "Cached"
+    FAILS_ALONE = "FailsAlone"
+    NOT_REPRODUCED = "NotReproduced"
+    NO_FAILING_ORDER = "NoFailingOrder"
+    ERROR = "Error"
+
+
+def ddmin(candidates: List[str], fails: Callable[[List[str]], bool]) -> List[str]:
+    """Reduces the candidates to a 1-minimal subset for which `fails' holds.
+
+    The relative order of the candidates is preserved in all subsets tried.
+
+    :param candidates: The tests run before the victim in a failing order
+    :param fails: Checks whether the victim fails after the given tests; it must
+        hold for all candidates
+    :return: A subset of the candidates, from which no test can be removed
+        without the victim passing
+    """
+    granularity = 2
+    while len(candidates) >= 2:
+        size = -(-len(candidates) // granularity)
+        chunks = [
+            candidates[start : start + size]
+            for start in range(0, len(candidates), size)
+        ]
+        for chunk in chunks:
+            if fails(chunk):
+                candidates, granularity = chunk, 2
+                break
+        else:
+            for chunk in chunks:
+                complement = [test for test in candidates if test not in chunk]
+                if len(chunks) > 2 and fails(complement):
+                    candidates = complement
+                    granularity = max(granularity - 1, 2)
+                    break
+            else:
+                if granularity >= len(candidates):
+                    break
+                granularity = min(2 * granularity, len(candidates))
+    return candidates
+
+
+def _testcases(xml_file: str) -> List[Tuple[str, bool]]:
+    """Returns the node ids of the executions in a JUnit XML file in the order
+    they were run, and whether they failed."""
+    return [(testcase.nodeid, testcase.failed) for testcase in iter_testcases(xml_file)]
+
+
+def order_record_file(xml_file: str) -> str:
+    """Returns the order record written with --order-schedule next to the given
+    JUnit XML file of an iteration."""
+    directory, name = os.path.split(xml_file)
+    head, _, tail = name.rpartition("_output")
+    return os.path.join(directory, f"{head}_order_record{tail[: -len('.xml')]}.json")
+
+
+def failing_order(xml_file: str, victim: str) -> Optional[List[str]]:
+    """Returns the tests that ran before the first failure of the victim.
+
+    The order is read from the order record of the iteration, if it was run with
+    --order-schedule, and from the order of the test cases in the JUnit XML file
+    otherwise, which pytest writes in the order the tests finished.
+
+    :param xml_file: The JUnit XML file of the iteration the victim failed in
+    :param victim: The node id of the victim, including its parametrization
+    :return: The node ids in the order they ran, or None, if the victim did not
+        fail in this iteration
+    """
+    executions = _testcases(xml_file)
+    if (victim, True) not in executions:
+        return None
+    order = [nodeid for nodeid, _ in executions]
+    record = order_record_file(xml_file)
+    if os.path.exists(record):
+        with open(record) as file:
+            recorded = [strip_repeat_suffix(nodeid) for nodeid in json.load(file)]
+        if victim in recorded:
+            order = recorded
+    before = order[: order.index(victim)]
+    return list(dict.fromkeys(test for test in before if test != victim))
+
+
+class PolluterCache:
+    """A JSON file of the known polluters of each victim, by project hash, that can
+    be shared between processes."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def get(self, project_hash: str, victim: str) -> Optional[List[str]]:
+        """Returns the cached polluters of a victim or None, if none are known."""
+        entry = self._read().get(project_hash, {}).get(victim)
+        return None if entry is None else entry["polluters"]
+
+    def put(self, project_hash: str, victim: str, polluters: List[str]) -> None:
+        """Adds the polluters of a victim to the cache."""
+        with self._lock():
+            cache = self._read()
+            cache.setdefault(project_hash, {})[victim] = {
+                "polluters": polluters,
+                "time": time.time(),
+            }
+            with open(self._path + ".tmp", "w") as file:
+                json.dump(cache, file, indent=2)
+            os.replace(self._path + ".tmp", self._path)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self._path):
+            return {}
+        with open(self._path) as file:
+            return json.load(file)
+
+    @contextlib.contextmanager
+    def _lock(self) -> Generator[None, None, None]:
+        with open(self._path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class PolluterBisector(FlakyAnalyser):
+    """Searches the polluters of order-dependent tests of a repository."""
+
+    def __init__(self, argv: List[str]) -> None:
+        super().__init__(argv)
+        # All reruns share one environment
+        self._config.venv_lifecycle = "project"
+        self._bisect_path = os.path.join(self._temp_path, "bisect")
+        self._reruns = 0
+        self._project_hash = self._config.project_hash or git_revision(self._repo_path)
+        self._cache: Optional[PolluterCache] = None
+        if self._config.polluter_cache is not None:
+            if self._project_hash:
+                self._cache = PolluterCache(self._config.polluter_cache)
+            else:
+                self._logger.warning(
+                    "Cannot cache polluters without a project hash, use "
+                    "--project-hash"
+                )
+
+    def run(self) -> None:
+        """Searches the polluters of all victims and writes them to
+        `{project}_polluters.json' in the temp directory."""
+        results = []
+        os.makedirs(self._bisect_path, exist_ok=True)
+        tmp_dir_path = FileUtils.get_available_tempdir_path(self._temp_path)
+        self._workspace_strategy = select_strategy(
+            self._config.workspace_strategy, self._repo_path, self._temp_path
+        )
+        try:
+            for victim in self._victims():
+                results.append(self._search(victim, tmp_dir_path))
+        finally:
+            self._release_workspace()
+            self._workspace_strategy.release(self._repo_path)
+            self._release_environment()
+        with open(
+            os.path.join(self._temp_path, f"{self._repo_name}_polluters.json"), "w"
+        ) as file:
+            json.dump(results, file, indent=2)
+
+    def _victims(self) -> List[str]:
+        victims = list(self._config.victims)
+        if self._config.tests_overview is not None:
+            # pylint: disable=import-outside-toplevel
+            from flapy.results_parser import TestsOverview
+
+            od_tests = TestsOverview(self._config.tests_overview).get_od_flaky_tests()
+            victims += list(
+                od_tests[od_tests["Project_Name"] == self._repo_name][
+                    "Test_nodeid_inclPara"
+                ]
+            )
+        return list(dict.fromkeys(victims))
+
+    def _search(self, victim: str, tmp_dir_path: str) -> Dict[str, Any]:
+        """Searches the polluters of a single victim."""
+        reruns = self._reruns
+        result: Dict[str, Any] = {
+            "victim": victim,
+            "project_hash": self._project_hash,
+            "polluters": [],
+        }
+        cached = self._cache.get(self._project_hash, victim) if self._cache else None
+        if cached is not None:
+            self._logger.info("Polluters of %s are cached: %s", victim, cached)
+            return dict(result, status=Status.CACHED, polluters=cached, reruns=0)
+
+        order = None
+        for xml_file in self._config.failing_xml:
+            order = failing_order(xml_file, victim)
+            if order is not None:
+                result["failing_xml"] = xml_file
+                break
+        if order is None:
+            self._logger.warning("%s did not fail in any of the given runs", victim)
+            return dict(result, status=Status.NO_FAILING_ORDER, reruns=0)
+
+        outcomes: Dict[Tuple[str, ...], Optional[bool]] = {}
+
+        def fails(tests: List[str]) -> bool:
+            if tuple(tests) not in outcomes:
+                outcomes[tuple(tests)] = self._victim_fails(tests, victim, tmp_dir_path)
+            if outcomes[tuple(tests)] is None:
+                raise RuntimeError(f"Could not run {victim}")
+            return bool(outcomes[tuple(tests)])
+
+        self._logger.info(
+            "Search the polluters of %s among %d tests", victim, len(order)
+        )
+        polluters: List[str]
+        try:
+            if fails([]):
+                status, polluters = Status.FAILS_ALONE, []
+            elif not fails(order):
+                status, polluters = Status.NOT_REPRODUCED, []
+            else:
+                status, polluters = Status.FOUND, ddmin(order, fails)
+        except RuntimeError as error:
+            self._logger.error("%s", error)
+            status, polluters = Status.ERROR, []
+        self._logger.info(
+            "%s: %s after %d reruns %s",
+            victim,
+            status,
+            self._reruns - reruns,
+            polluters,
+        )
+        if status == Status.FOUND and self._cache is not None:
+            self._cache.put(self._project_hash, victim, polluters)
+        return dict(
+            result, status=status, polluters=polluters, reruns=self._reruns - reruns
+        )
+
+    def _victim_fails(
+        self, tests: List[str], victim: str, tmp_dir_path: str
+    ) -> Optional[bool]:
+        """Runs the given tests and the victim in this order in a fresh copy of the
+        repository.
+
+        :return: Whether the victim failed, None, if it was not run
+        """
+        if self._env is None:
+            self._provide_environment(PyTestRunner)
+        iteration = Iteration(self._repo_name, self._bisect_path, self._reruns)
+        iteration.coverage = False
+        self._reruns += 1
+        order_file = iteration.file("order", ".json")
+        with open(order_file, "w") as file:
+            json.dump(tests + [victim], file, indent=2)
+        iteration.selection = " ".join(shlex.quote(test) for test in tests + [victim])
+        iteration.pytest_options = (
+            f"-p flapy_order --flapy-order={shlex.quote(order_file)}"
+        )
+        self._provide_plugin_dir()
+        out, err, install_report = self._run_iteration(
+            PyTestRunner, iteration, tmp_dir_path
+        )
+        self._log_output(out, err, install_report)
+        if not os.path.exists(iteration.xml_output_file):
+            return None
+        executions = [
+            failed
+            for nodeid, failed in _testcases(iteration.xml_output_file)
+            if nodeid == victim
+        ]
+        if not executions:
+            return None
+        return any(executions)
+
+    @staticmethod
+    def _create_parser() -> argparse.ArgumentParser:
+        parser = FlakyAnalyser._create_parser()
+        parser.description = "Finds the polluters of order-dependent tests."
+        parser.add_argument(
+            "--victim",
+            dest="victims",
+            action="append",
+            default=[],
+            required=False,
+            help="Node id of an order-dependent test, including its "
+            "parametrization.  Can be given several times.",
+        )
+        parser.add_argument(
+            "--tests-overview",
+            dest="tests_overview",
+            default=None,
+            required=False,
+            help="A tests overview CSV created by the results parser; its "
+            "order-dependent tests of this project are searched in addition to "
+            "the ones given by --victim.",
+        )
+        parser.add_argument(
+            "--failing-xml",
+            dest="failing_xml",
+            action="append",
+            default=[],
+            required=False,
+            help="JUnit XML file of an iteration with random order.  The tests run "
+            "before a victim in the first of these files it failed in are "
+            "searched.  Can be given several times.",
+        )
+        parser.add_argument(
+            "--polluter-cache",
+            dest="polluter_cache",
+            default=None,
+            required=False,
+            help="JSON file caching the found polluters by project hash, which "
+            "can be shared between campaigns.",
+        )
+        return parser
+
+
+def main(argv: List[str] = None) -> None:
+    """The main entry location of the program."""
+    if not argv:
+        argv = sys.argv
+    PolluterBisector(argv).run()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
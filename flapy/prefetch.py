@@ -0,0 +1,197 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Prepares the next projects of a campaign while the current ones run.
+
+Preparing a project checks out its repository into the directory
+run_execution.sh analyses it in, which then skips the clone, and builds wheels
+for its requirements into a wheelhouse.  Every prepared project records how long
+its preparation took and how much of that time the campaign still had to wait
+for; the difference is the setup latency hidden behind the running projects.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from flapy.git_cache import GitMirrorCache
+from flapy.venv_cache import directory_size
+from flapy.wheelhouse import Wheelhouse, checkout, project_requirements
+
+if TYPE_CHECKING:
+    from flapy.campaign import Project  # pylint: disable=cyclic-import
+
+LOGGER = logging.getLogger("RepositoryAnalyser.Prefetch")
+
+
+# pylint: disable=too-many-instance-attributes
+@dataclass
+class Preparation:
+    """A project prepared, or being prepared, in the background."""
+
+    key: str
+    directory: str
+    future: Future
+    # Whether all requirements of the project are in the wheelhouse
+    wheels_built: bool = False
+    # Seconds the checkout and the wheel build took
+    seconds: float = 0.0
+    # Seconds of the preparation the campaign did not have to wait for
+    hidden: float = 0.0
+    size: int = 0
+    # When the project could have been started if it had been prepared
+    waiting_since: Optional[float] = None
+    # Whether the campaign has reported the finished preparation
+    reported: bool = False
+
+    @property
+    def done(self) -> bool:
+        """Whether the preparation has finished, successfully or not."""
+        return self.future.done()
+
+    @property
+    def succeeded(self) -> bool:
+        """Whether the repository was checked out."""
+        return self.done and self.future.exception() is None and self.future.result()
+
+
+class Prefetcher:
+    """Prepares up to `depth' projects ahead in background threads.
+
+    Prepared projects that have not been started yet may occupy at most
+    `max_size' bytes; no further preparation is started while they exceed it.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        project_dir: Callable[["Project"], str],
+        depth: int,
+        max_size: int = 0,
+        git_cache: Optional[str] = None,
+        wheelhouse: Optional[str] = None,
+    ) -> None:
+        """
+        :param project_dir: Creates the directory a project is analysed in
+        :param depth: The number of projects prepared ahead
+        :param max_size: Maximum size of the prepared projects in bytes,
+            0 for unlimited
+        :param git_cache: Directory of a git mirror cache to check out from
+        :param wheelhouse: Directory the wheels of the requirements are built in
+        """
+        self._project_dir = project_dir
+        self._depth = depth
+        self._max_size = max_size
+        self._git_cache = GitMirrorCache(git_cache) if git_cache is not None else None
+        self._wheelhouse = Wheelhouse(wheelhouse) if wheelhouse is not None else None
+        # Several pip processes writing to the same wheelhouse may clash
+        self._wheel_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, depth), thread_name_prefix="prefetch"
+        )
+        self._preparations: Dict[str, Preparation] = {}
+        self.setup_seconds = 0.0
+        self.hidden_seconds = 0.0
+
+    def prefetch(self, pending: List["Project"]) -> List[Preparation]:
+        """Starts preparing the next projects, unless they are prepared already or
+        the prepared projects exceed the size limit.
+
+        :param pending: The queued projects in the order they are run
+        :return: The finished preparations that have not been reported yet
+        """
+        finished = []
+        for preparation in self._preparations.values():
+            if preparation.done and not preparation.reported:
+                finished.append(preparation)
+        for project in pending[: self._depth]:
+            if project.key in self._preparations:
+                continue
+            if self._max_size > 0 and self.prepared_size() >= self._max_size:
+                break
+            preparation = Preparation(project.key, self._project_dir(project), Future())
+            preparation.future = self._executor.submit(
+                self._prepare, preparation, project
+            )
+            self._preparations[project.key] = preparation
+        return finished
+
+    def prepared_size(self) -> int:
+        """Returns the size of the prepared projects that have not been started."""
+        return sum(
+            preparation.size
+            for preparation in self._preparations.values()
+            if preparation.done
+        )
+
+    def is_ready(self, key: str) -> bool:
+        """Whether a project can be started, i.e., it is not being prepared."""
+        preparation = self._preparations.get(key)
+        if preparation is None or preparation.done:
+            return True
+        if preparation.waiting_since is None:
+            preparation.waiting_since = time.time()
+        return False
+
+    def take(self, key: str) -> Optional[Preparation]:
+        """Hands a project over to be run and accounts for the hidden setup time.
+
+        :return: The finished preparation of the project, or None if it was not
+            prepared.  The directory of a failed preparation is used as well.
+        """
+        preparation = self._preparations.pop(key, None)
+        if preparation is None or not preparation.succeeded:
+            return preparation
+        waited = 0.0
+        if preparation.waiting_since is not None:
+            waited = time.time() - preparation.waiting_since
+        preparation.hidden = max(0.0, preparation.seconds - waited)
+        self.setup_seconds += preparation.seconds
+        self.hidden_seconds += preparation.hidden
+        return preparation
+
+    def shutdown(self) -> None:
+        """Waits for the running preparations and removes all prepared projects
+        that have not been started."""
+        for preparation in self._preparations.values():
+            preparation.future.cancel()
+        self._executor.shutdown(wait=True)
+        for preparation in self._preparations.values():
+            shutil.rmtree(preparation.directory, ignore_errors=True)
+        self._preparations.clear()
+
+    def _prepare(self, preparation: Preparation, project: "Project") -> bool:
+        start = time.time()
+        repository = os.path.join(preparation.directory, project.name)
+        if self._git_cache is not None:
+            checked_out = self._git_cache.checkout(
+                project.url, project.git_hash, repository
+            )
+        else:
+            checked_out = checkout(project.url, project.git_hash, repository)
+        if not checked_out:
+            LOGGER.warning("Could not prepare %s, it is cloned when run", project.name)
+            shutil.rmtree(repository, ignore_errors=True)
+            return False
+        if self._wheelhouse is not None:
+            requirements = project_requirements(project.name, repository)
+            with self._wheel_lock:
+                preparation.wheels_built = (
+                    self._wheelhouse.build(requirements, cwd=repository) == []
+                )
+        preparation.seconds = time.time() - start
+        preparation.size = directory_size(preparation.directory)
+        return True
@@ -0,0 +1,7 @@
+"""pytest plugins loaded into the test runs.
+
+The runs happen in the virtual environment of the analysed project, where flapy is
+not installed.  This directory is therefore put on the PYTHONPATH of the runs and
+the plugins are loaded by their module name, e.g., `-p flapy_order'.  Plugins must
+only depend on the standard library and pytest.
+"""
@@ -0,0 +1,65 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""A pytest plugin running the tests in an explicit order and recording the order
+they were run in."""
+import json
+import re
+
+import pytest
+
+# The suffix pytest-repeat appends to the node ids of the repeated tests
+_REPEAT_SUFFIX = re.compile(r"(\[|-)\d+-\d+\]$")
+
+
+def _position(nodeid, positions):
+    """Returns the position of a test in the order, repetitions of a test take the
+    position of the test."""
+    if nodeid in positions:
+        return positions[nodeid]
+    match = _REPEAT_SUFFIX.search(nodeid)
+    if match:
+        nodeid = nodeid[: match.start()] + ("" if match.group(1) == "[" else "]")
+    return positions.get(nodeid, len(positions))
+
+
+def pytest_addoption(parser):
+    """Adds the options of the plugin."""
+    group = parser.getgroup("flapy_order")
+    group.addoption(
+        "--flapy-order",
+        dest="flapy_order",
+        default=None,
+        help="JSON file containing the list of node ids in the order they shall "
+        "be run.  Tests missing from the list are run afterwards.",
+    )
+    group.addoption(
+        "--flapy-order-record",
+        dest="flapy_order_record",
+        default=None,
+        help="JSON file the node ids are written to in the order they are run.",
+    )
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):  # pylint: disable=W0613
+    """Reorders the items after all other plugins, e.g., pytest-random-order."""
+    order_file = config.getoption("flapy_order")
+    if order_file:
+        with open(order_file) as file:
+            positions = {nodeid: index for index, nodeid in enumerate(json.load(file))}
+        # sorted is stable, tests missing from the order keep their relative order
+        items[:] = sorted(items, key=lambda item: _position(item.nodeid, positions))
+    record_file = config.getoption("flapy_order_record")
+    if record_file:
+        with open(record_file, "w") as file:
+            json.dump([item.nodeid for item in items], file, indent=2)
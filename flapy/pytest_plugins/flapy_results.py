@@ -0,0 +1,160 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""A pytest plugin streaming the results of the tests into a JSON lines file.
+
+Every test yields one line as soon as its teardown has finished::
+
+    {"event": "test", "nodeid": "tests/test_a.py::test_x[1-2]", "outcome": "failed",
+     "phase": "call", "duration": 0.12, "rerun": 1, "message": "...", ...}
+
+`outcome' is one of passed, failed, error, skipped, xfailed and xpassed, `phase'
+is the phase of the test that determined it, `rerun' the index pytest-repeat
+gave the repetition.  The failure text, the captured error output and the
+timeout of tests stopped by pytest-timeout are only written for tests that have
+them.  At the end of the session, a summary line
+with the counts, the duration and the coverage follows.
+"""
+import json
+import re
+import time
+
+import pytest
+
+# The index pytest-repeat appends to the node ids of the repeated tests
+_REPEAT_SUFFIX = re.compile(r"(?:\[|-)(\d+)-\d+\]$")
+
+# The outcomes counted in the summary
+OUTCOMES = ("passed", "failed", "error", "skipped", "xfailed", "xpassed")
+
+
+def pytest_addoption(parser):
+    """Adds the options of the plugin."""
+    group = parser.getgroup("flapy_results")
+    group.addoption(
+        "--flapy-results",
+        dest="flapy_results",
+        default=None,
+        help="JSON lines file the results of the tests are written to.",
+    )
+
+
+def pytest_configure(config):
+    """Registers the writer, if a results file is given."""
+    path = config.getoption("flapy_results")
+    if path:
+        config.pluginmanager.register(ResultsWriter(path), "flapy_results_writer")
+
+
+def _outcome(report):
+    """Maps a report to the outcome pytest's terminal summary counts it as."""
+    if hasattr(report, "wasxfail"):
+        if report.skipped:
+            return "xfailed"
+        if report.passed:
+            return "xpassed"
+    if report.when != "call" and report.failed:
+        return "error"
+    return report.outcome
+
+
+def _message(report):
+    """Returns the short message of a failed or skipped test, like JUnit XML."""
+    if report.skipped and isinstance(report.longrepr, tuple):
+        return str(report.longrepr[2])
+    crash = getattr(report.longrepr, "reprcrash", None)
+    if crash is not None:
+        return crash.message
+    return None
+
+
+class ResultsWriter:
+    """Writes a line per test and the summary of the session."""
+
+    def __init__(self, path):
+        self._file = open(path, "w")  # pylint: disable=consider-using-with
+        self._start = time.time()
+        self._tests = {}
+        self._counts = dict.fromkeys(OUTCOMES, 0)
+
+    def pytest_runtest_logreport(self, report):
+        """Collects the reports of the phases of a test."""
+        if report.outcome == "rerun":
+            # pytest-rerunfailures runs the test again from setup
+            self._tests.pop(report.nodeid, None)
+            return
+        record = self._tests.setdefault(
+            report.nodeid,
+            {
+                "event": "test",
+                "nodeid": report.nodeid,
+                "outcome": "passed",
+                "phase": "call",
+                "duration": 0.0,
+            },
+        )
+        record["duration"] += report.duration
+        outcome = _outcome(report)
+        if record["outcome"] == "passed" and outcome != "passed":
+            record["outcome"] = outcome
+            record["phase"] = report.when
+            message = _message(report)
+            if message is not None:
+                record["message"] = message
+            if report.failed:
+                record["longrepr"] = str(report.longrepr)
+        if report.capstderr:
+            record["stderr"] = report.capstderr
+        for name, value in report.user_properties:
+            if name == "flapy_timeout":
+                # The test was stopped by pytest-timeout, see flapy_timeouts
+                record["timeout"] = float(value)
+        if report.when == "teardown":
+            self._write(self._tests.pop(report.nodeid))
+
+    def pytest_collectreport(self, report):
+        """Records the modules that could not be collected as errors."""
+        if report.failed:
+            self._write(
+                {
+                    "event": "test",
+                    "nodeid": report.nodeid,
+                    "outcome": "error",
+                    "phase": "collect",
+                    "duration": 0.0,
+                    "longrepr": str(report.longrepr),
+                }
+            )
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_sessionfinish(self, session):
+        """Writes the tests without teardown and the summary."""
+        for record in list(self._tests.values()):
+            self._write(record)
+        cov = session.config.pluginmanager.getplugin("_cov")
+        terminal = session.config.pluginmanager.getplugin("terminalreporter")
+        summary = {
+            "event": "summary",
+            **self._counts,
+            "warnings": len(terminal.stats.get("warnings", [])) if terminal else None,
+            "duration": time.time() - self._start,
+            "coverage": getattr(cov, "cov_total", None),
+        }
+        self._file.write(json.dumps(summary) + "\n")
+        self._file.close()
+
+    def _write(self, record):
+        match = _REPEAT_SUFFIX.search(record["nodeid"])
+        record["rerun"] = int(match.group(1)) if match else 1
+        self._counts[record["outcome"]] += 1
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
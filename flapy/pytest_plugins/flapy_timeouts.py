@@ -0,0 +1,74 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""A pytest plugin giving every test its own timeout and marking the tests that
+were stopped by pytest-timeout.
+
+The timeouts are read from a JSON object mapping node ids without the
+pytest-repeat parameter to seconds.  They are applied as `timeout' marks, which
+take precedence over the `--timeout' option; marks the tests set themselves take
+precedence over these.  A test stopped by pytest-timeout gets the user property
+`flapy_timeout' holding the timeout, which pytest writes to the JUnit XML file.
+"""
+import json
+import re
+
+import pytest
+
+# The suffix pytest-repeat appends to the node ids of the repeated tests
+_REPEAT_SUFFIX = re.compile(r"(\[|-)\d+-\d+\]$")
+
+# The message of pytest-timeout, `Timeout >1.0s' or `Timeout (>1.0s) from ...'
+_TIMEOUT_MESSAGE = re.compile(r"^Timeout \(?>([0-9.]+)s")
+
+
+def _strip_repeat_suffix(nodeid):
+    match = _REPEAT_SUFFIX.search(nodeid)
+    if match:
+        return nodeid[: match.start()] + ("" if match.group(1) == "[" else "]")
+    return nodeid
+
+
+def pytest_addoption(parser):
+    """Adds the options of the plugin."""
+    group = parser.getgroup("flapy_timeouts")
+    group.addoption(
+        "--flapy-timeouts",
+        dest="flapy_timeouts",
+        default=None,
+        help="JSON file containing the timeout of each test in seconds.",
+    )
+
+
+def pytest_collection_modifyitems(session, config, items):  # pylint: disable=W0613
+    """Marks the tests with their timeouts."""
+    timeouts_file = config.getoption("flapy_timeouts")
+    if not timeouts_file:
+        return
+    with open(timeouts_file) as file:
+        timeouts = json.load(file)
+    for item in items:
+        seconds = timeouts.get(_strip_repeat_suffix(item.nodeid))
+        if seconds is not None:
+            item.add_marker(pytest.mark.timeout(seconds))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """Records that pytest-timeout stopped the test."""
+    outcome = yield
+    report = outcome.get_result()
+    if report.failed and call.excinfo is not None:
+        match = _TIMEOUT_MESSAGE.match(str(call.excinfo.value))
+        if match:
+            item.user_properties.append(("flapy_timeout", match.group(1)))
+            report.user_properties = list(item.user_properties)
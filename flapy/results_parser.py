@@ -32,15 +32,10 @@ from ast import literal_eval
 from pathlib import Path
 from abc import abstractmethod
 from functools import lru_cache, reduce
-from junitparser import (  # type: ignore
-    Failure,
-    Skipped,
-    Error,
-    JUnitXml,
-    TestCase,
-    JUnitXmlError,
-)
-from flapy.utils import try_default, eprint
+from flapy.durations import DurationStore
+from flapy.junit import JunitTestcase, iter_testcases, read_hostname
+from flapy.sidecar import iter_sidecar_testcases, sidecar_file
+from flapy.utils import eprint
 
 FuncDescriptor = Tuple[str, ...]
 
@@ -78,23 +73,20 @@ default_flaky_keywords = [
 logging.getLogger().setLevel(logging.DEBUG)
 
 
-def read_junit_testcase(test_case: TestCase, include_errors) -> Dict[str, Union[str, int]]:
+def read_junit_testcase(test_case: JunitTestcase, include_errors) -> Dict[str, Union[str, int]]:
     row = {
-        "file": test_case._elem.get("file"),
+        "file": test_case.file,
         "class": test_case.classname,
         "name": test_case.name,
-        "verdict": try_default(
-            lambda: Verdict.from_junitparser(test_case.result),
-            JUnitXmlError,
-            Verdict.PARSE_ERROR,
-        ),
+        "verdict": Verdict.from_junit_result(test_case.result),
+        # Timeouts are failures, but told apart if the flapy_timeouts plugin ran
+        "timeout": test_case.timeout is not None,
     }
     if include_errors:
         row.update({
-            "message": test_case.result.message
-                if test_case.result and test_case.result.message else "NO MESSAGE",
-            "result-text": re.findall(r"(\w*Error.*)\n", test_case.result._elem.text)
-                if test_case.result and test_case.result._elem else [],
+            "message": test_case.message if test_case.message else "NO MESSAGE",
+            "result-text": re.findall(r"(\w*Error.*)\n", test_case.result_text)
+                if test_case.result_text else [],
             "system-err": re.findall(r"(\w*Error.*)\n", test_case.system_err)
                 if test_case.system_err else [],
         })
@@ -359,6 +351,12 @@ class CoverageCsv:
                 "number_of_entries": sum,
                 "BranchCoverage_weighted": sum,
                 "LineCoverage_weighted": sum,
+                # Written by versions supporting partial coverage only
+                **(
+                    {"number_of_runs": sum, "partial_coverage": any}
+                    if "number_of_runs" in self._df
+                    else {}
+                ),
             }
         )
         self._df["BranchCoverage"] = (
@@ -489,19 +487,30 @@ class JunitXmlFile(MyFileWrapper):
             return "non-deter"
         return "COULD_NOT_GET_ORDER"
 
-    def parse(self) -> JUnitXml:
+    def get_testcases(self, with_output: bool = False) -> List[JunitTestcase]:
+        """Reads the test cases incrementally, see flapy.junit.
+        A file that is not valid XML is treated as containing no test cases.
+        If the run wrote a sidecar file (see flapy.sidecar), it is read instead."""
+        sidecar = self.open_sidecar()
+        if sidecar is not None:
+            with sidecar as f:
+                return list(iter_sidecar_testcases(f, with_output))
         with self.open() as f:
             try:
-                return JUnitXml.fromfile(f, ET.parse)
+                return list(iter_testcases(f, with_output))
             except xml.etree.ElementTree.ParseError:
-                return JUnitXml()
+                return []
 
     def get_hostname(self) -> str:
-        return list(self.parse())[0].hostname
+        with self.open() as f:
+            return read_hostname(f)
 
-    def get_testcases(self) -> List[TestCase]:
-        junit_xml = self.parse()
-        return [case for suite in junit_xml for case in suite]
+    def open_sidecar(self) -> Optional[IO]:
+        """Opens the sidecar file written next to this file, if it exists."""
+        try:
+            return self.openvia(sidecar_file(str(self.p)))
+        except (OSError, KeyError):
+            return None
 
     def to_table(self, include_errors) -> List[Dict[str, Union[str, int]]]:
         """
@@ -521,8 +530,7 @@ class JunitXmlFile(MyFileWrapper):
             ]
         """
         try:
-            junit_xml = self.parse()
-            test_cases = [case for suite in junit_xml for case in suite]
+            test_cases = self.get_testcases(with_output=include_errors)
             # if len(test_cases) == 0:
             #     logging.warning(f"{self.p} contains no testcases")
             result: List[Dict[str, Union[str, int]]] = [
@@ -679,7 +687,7 @@ class ProjectResultsDir:
             junit_data: pd.DataFrame = pd.read_csv(self._junit_cache_file)
             did_read_cache = True
         else:
-            columns = list(read_junit_testcase(TestCase(), include_errors).keys()) + ["num", "order"]
+            columns = list(read_junit_testcase(JunitTestcase("", ""), include_errors).keys()) + ["num", "order"]
             junitxml_files = self.get_files(JunitXmlFile)
             junit_data = pd.DataFrame(
                 [
@@ -916,7 +924,20 @@ class ProjectResultsDir:
         return coverage_data
 
     def get_coverage_overview(self) -> pd.DataFrame:
+        """
+        Averages the coverage over the test runs that measured it.  With
+        `--coverage first' or `sampled', only some runs measure coverage:
+        `number_of_runs' counts all runs with a JUnit XML file and
+        `partial_coverage' tells whether coverage is missing for some of them.
+        """
         coverage_data = pd.DataFrame(self.get_coverage_raw_data())
+        number_of_runs = len(
+            {
+                (junit_file.get_order(), junit_file.get_num())
+                for junit_file in self.get_junit_files()
+            }
+        )
+        self.close_archive()
 
         coverage_overview = pd.DataFrame(
             [
@@ -926,6 +947,8 @@ class ProjectResultsDir:
                     "Project_URL": self.get_project_url(),
                     "Project_Hash": self.get_project_git_hash(),
                     "number_of_entries": len(coverage_data),
+                    "number_of_runs": number_of_runs,
+                    "partial_coverage": len(coverage_data) < number_of_runs,
                 }
             ]
         )
@@ -1003,9 +1026,25 @@ class ProjectResultsDir:
             **search,
         }
 
+    def record_durations(self, store: DurationStore) -> None:
+        """Adds the durations of the tests in all JUnit XML files to the store,
+        under the project's git hash."""
+        project_hash = self.get_project_git_hash()
+        for junit_file in self.get_junit_files():
+            store.record(
+                project_hash,
+                (
+                    (test_case.nodeid, test_case.time)
+                    for test_case in junit_file.get_testcases()
+                    if test_case.result != "skipped"
+                ),
+            )
+        self.close_archive()
+
     def close_archive(self) -> None:
         if self._archive is not None:
             self._archive.close()
+            self._archive = None
 
     def __repr__(self) -> str:
         return f"ProjectResultsDir('{self.p}')"
@@ -1208,6 +1247,37 @@ class ResultsDir:
         # co["BranchCoverage_mean"] = co["BranchCoverage_weighted"] / co["number_of_entries"]
         return co
 
+    def get_durations(self, store: str, *, record: bool = False) -> pd.DataFrame:
+        """Exports the durations of the tests of this directory's projects from a
+        duration store (see flapy.durations), one row per test.
+
+        :param store: Path to the SQLite database of the store
+        :param record: Add the durations found in the JUnit XML files of this
+            directory to the store first; do this once per directory only
+        """
+        projects = self.get_project_dirs_overview()
+        with DurationStore(store) as duration_store:
+            if record:
+                for proj_dir in self.get_project_results_dirs():
+                    proj_dir.record_durations(duration_store)
+            durations = pd.DataFrame(
+                duration_store.export(),
+                columns=[
+                    "project",
+                    "nodeid",
+                    "runs",
+                    "samples",
+                    "p50",
+                    "p90",
+                    "p99",
+                    "max",
+                    "updated",
+                ],
+            )
+        durations = durations.rename(columns={"project": "Project_Hash"})
+        projects = projects[["Project_Name", "Project_URL", "Project_Hash"]]
+        return projects.drop_duplicates().merge(durations, on="Project_Hash")
+
     def __repr__(self) -> str:
         return f"ResultsDir('{self.p}')"
 
@@ -1235,12 +1305,14 @@ class Verdict:
     UNDECIDABLE = "Undecidable"
 
     @staticmethod
-    def from_junitparser(result: Union[Failure, Skipped, Error, None]) -> str:
-        if isinstance(result, Failure):
+    def from_junit_result(result: Optional[str]) -> str:
+        """Maps the result element of a JUnit test case (see flapy.junit) to a
+        verdict."""
+        if result == "failure":
             return Verdict.FAIL
-        if isinstance(result, Skipped):
+        if result == "skipped":
             return Verdict.SKIP
-        if isinstance(result, Error):
+        if result == "error":
             return Verdict.ERROR
         if result is None:
             return Verdict.PASS
@@ -0,0 +1,98 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Reads the JSON lines files written by the `flapy_results' pytest plugin.
+
+The plugin writes such a sidecar file next to the JUnit XML file of a run.  It
+contains the same test cases, but is cheaper to read and, unlike the log of the
+run, does not depend on the output format of pytest and its plugins.
+"""
+import json
+import re
+from typing import IO, Any, Dict, Iterator, Optional, Union
+
+from flapy.junit import JunitTestcase
+
+# The JUnit result element of the outcomes of the plugin, None means passed
+JUNIT_RESULTS = {
+    "passed": None,
+    "xpassed": None,
+    "failed": "failure",
+    "error": "error",
+    "skipped": "skipped",
+    "xfailed": "skipped",
+}
+
+
+def sidecar_file(xml_output_file: str) -> str:
+    """Returns the path of the sidecar file belonging to a JUnit XML file."""
+    return re.sub(r"\.xml$", "", xml_output_file) + ".jsonl"
+
+
+def iter_records(source: Union[str, IO]) -> Iterator[Dict[str, Any]]:
+    """Yields the records of a sidecar file, a truncated last line is ignored.
+
+    :param source: Path to the file or a file object
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as file:
+            yield from iter_records(file)
+        return
+    for line in source:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # The run was killed while writing the line
+            return
+
+
+def iter_sidecar_testcases(
+    source: Union[str, IO], with_output: bool = False
+) -> Iterator[JunitTestcase]:
+    """Yields the tests of a sidecar file as JUnit test cases, see flapy.junit.
+
+    :param with_output: Whether the failure text and the captured error output
+        shall be read
+    """
+    for record in iter_records(source):
+        if record.get("event") == "test":
+            yield to_testcase(record, with_output)
+
+
+def read_summary(source: Union[str, IO]) -> Optional[Dict[str, Any]]:
+    """Returns the summary record of a sidecar file, or None, if the run did not
+    finish."""
+    for record in iter_records(source):
+        if record.get("event") == "summary":
+            return record
+    return None
+
+
+def to_testcase(record: Dict[str, Any], with_output: bool = False) -> JunitTestcase:
+    """Converts a test record to the test case pytest writes to JUnit XML files,
+    whose class name is the node id without the test name, `::' replaced by a
+    dot."""
+    names = record["nodeid"].split("::")
+    names[0] = re.sub(r"\.py$", "", names[0].replace("/", "."))
+    names = [name for name in names if name != "()"]
+    result = JUNIT_RESULTS.get(record["outcome"], "error")
+    return JunitTestcase(
+        classname=".".join(names[:-1]),
+        name=names[-1],
+        file=record["nodeid"].split("::")[0],
+        time=record.get("duration", 0.0),
+        result=result,
+        message=record.get("message") if result is not None else None,
+        result_text=record.get("longrepr") if with_output else None,
+        system_err=record.get("stderr") if with_output else None,
+        timeout=record.get("timeout"),
+    )
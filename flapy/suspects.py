@@ -0,0 +1,177 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Ranks the tests of a baseline run by how likely they are flaky."""
+import ast
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set
+
+from flapy.junit import iter_testcases
+
+LOGGER = logging.getLogger("RepositoryAnalyser.Suspects")
+
+# Modules whose use makes a test depend on time, randomness or the network
+SIGNAL_MODULES = {
+    "time": "time",
+    "datetime": "time",
+    "random": "random",
+    "secrets": "random",
+    "uuid": "random",
+    "numpy.random": "random",
+    "socket": "network",
+    "http": "network",
+    "urllib": "network",
+    "urllib3": "network",
+    "requests": "network",
+    "aiohttp": "network",
+    "httpx": "network",
+}
+
+# Weights of the reasons a test is suspected for
+FAILED = 3
+TIMEOUT = 2
+SIGNAL = 1
+NEIGHBOUR = 1
+
+
+# pylint: disable=too-few-public-methods
+@dataclass
+class Suspect:
+    """A test that shall be rerun, with the reasons it is suspected for."""
+
+    nodeid: str
+    score: int = 0
+    reasons: List[str] = field(default_factory=list)
+
+    def add(self, reason: str, weight: int) -> None:
+        """Adds a reason to suspect the test."""
+        self.reasons.append(reason)
+        self.score += weight
+
+
+def _signal_module(module: str) -> str:
+    """Returns the signal category of a (dotted) module name or an empty string."""
+    parts = module.split(".")
+    for end in range(len(parts), 0, -1):
+        category = SIGNAL_MODULES.get(".".join(parts[:end]))
+        if category:
+            return category
+    return ""
+
+
+def _dotted_name(node: ast.AST) -> str:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        prefix = _dotted_name(node.value)
+        return f"{prefix}.{node.attr}" if prefix else ""
+    return ""
+
+
+def static_signals(path: str, relative_path: str) -> Dict[str, Set[str]]:
+    """Finds the test functions of a module that use time, randomness or the
+    network, judged by the names they reference.
+
+    :param path: Path to the test module
+    :param relative_path: The path of the module in the node ids
+    :return: The node ids of all test functions in definition order, mapped to
+        their signal categories (possibly empty)
+    """
+    try:
+        with open(path, "rb") as file:
+            tree = ast.parse(file.read(), filename=path)
+    except (OSError, SyntaxError, ValueError) as error:
+        LOGGER.debug("Cannot analyse %s: %s", path, error)
+        return {}
+
+    imports: Dict[str, str] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports[alias.asname or alias.name.split(".")[0]] = (
+                    alias.name if alias.asname else alias.name.split(".")[0]
+                )
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            for alias in node.names:
+                imports[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+
+    def signals(function: ast.AST) -> Set[str]:
+        categories = set()
+        for node in ast.walk(function):
+            root, _, rest = _dotted_name(node).partition(".")
+            if root in imports:
+                module = imports[root] + (f".{rest}" if rest else "")
+                category = _signal_module(module)
+                if category:
+                    categories.add(category)
+        return categories
+
+    tests: Dict[str, Set[str]] = {}
+    functions = (ast.FunctionDef, ast.AsyncFunctionDef)
+    for node in tree.body:
+        if isinstance(node, functions) and node.name.startswith("test"):
+            tests[f"{relative_path}::{node.name}"] = signals(node)
+        elif isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            for method in node.body:
+                if isinstance(method, functions) and method.name.startswith("test"):
+                    nodeid = f"{relative_path}::{node.name}::{method.name}"
+                    tests[nodeid] = signals(method)
+    return tests
+
+
+def rank_suspects(xml_files: Iterable[str], repository: str) -> List[Suspect]:
+    """Ranks the tests of a baseline run by how likely they are flaky.
+
+    Tests are suspected, if they failed or timed out, if they use time,
+    randomness or the network, or if they are defined next to a failed test in
+    the same module.  Suspects are test functions; their node ids do not contain
+    parameters, such that a rerun covers all parametrizations.
+
+    :param xml_files: The JUnit XML files of the baseline run
+    :param repository: Path to the repository the tests are read from
+    :return: The suspected tests, highest score first
+    """
+    suspects: Dict[str, Suspect] = {}
+    executed: Set[str] = set()
+    failed: Set[str] = set()
+    for xml_file in xml_files:
+        for testcase in iter_testcases(xml_file):
+            function = testcase.nodeid.split("[")[0]
+            executed.add(function)
+            if not testcase.failed or function in failed:
+                continue
+            failed.add(function)
+            suspect = suspects.setdefault(function, Suspect(function))
+            suspect.add("failed", FAILED)
+            if "Timeout" in (testcase.message or ""):
+                suspect.add("timeout", TIMEOUT)
+
+    for module in sorted({function.split("::")[0] for function in executed}):
+        tests = static_signals(os.path.join(repository, module), module)
+        order = list(tests)
+        for index, function in enumerate(order):
+            if function not in executed:
+                continue
+            for category in sorted(tests[function]):
+                suspects.setdefault(function, Suspect(function)).add(
+                    f"uses {category}", SIGNAL
+                )
+            neighbours = order[max(index - 1, 0) : index] + order[index + 1 : index + 2]
+            if function not in failed and failed.intersection(neighbours):
+                suspects.setdefault(function, Suspect(function)).add(
+                    "next to a failed test", NEIGHBOUR
+                )
+    return sorted(
+        suspects.values(), key=lambda suspect: (-suspect.score, suspect.nodeid)
+    )
@@ -1,4 +1,5 @@
 """ Provides helper functions """
+import subprocess
 import sys
 from typing import Callable, Type, TypeVar, Any, Union
 
@@ -28,3 +29,19 @@ def try_default(
 def eprint(*args, **kwargs):
     """Print on stderr"""
     print(*args, file=sys.stderr, **kwargs)
+
+
+def git_revision(path: str) -> str:
+    """Returns the commit hash checked out in the git repository at path, or an
+    empty string, if path is not a git repository."""
+    try:
+        process = subprocess.run(
+            ["git", "-C", path, "rev-parse", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            check=False,
+        )
+    except OSError:
+        return ""
+    return process.stdout.strip() if process.returncode == 0 else ""
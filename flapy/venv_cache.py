@@ -0,0 +1,334 @@
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Provides a persistent, content-addressed cache of populated virtual
+environments."""
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import time
+from typing import Any, Callable, Dict, Generator, List, Tuple
+
+from flapy.install_planner import InstallReport
+
+LOGGER = logging.getLogger("RepositoryAnalyser.VenvCache")
+
+# Requirement lines pointing to local paths depend on the checked-out project,
+# not only on the line itself, thus environments containing them are not cached.
+_LOCAL_REQUIREMENT_PREFIXES = ("-e", ".", "/", "file:")
+
+
+def python_version() -> str:
+    """Returns the implementation and version of the running interpreter, which is
+    the one virtual environments are created with."""
+    return f"{platform.python_implementation()}-{platform.python_version()}"
+
+
+def directory_size(path: str) -> int:
+    """Returns the number of bytes allocated by the files below path.
+
+    Files that are hard-linked several times inside path are counted once.
+    """
+    seen = set()
+    size = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                stat = os.lstat(os.path.join(root, file_name))
+            except FileNotFoundError:
+                continue
+            if (stat.st_dev, stat.st_ino) in seen:
+                continue
+            seen.add((stat.st_dev, stat.st_ino))
+            size += stat.st_blocks * 512
+    return size
+
+
+def _copy_or_link(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class VenvCache:
+    """A cache of populated virtual environments.
+
+    Environments are stored under a key derived from the requirements they were
+    populated with and the interpreter version.  A cache hit clones the stored
+    environment by hard-linking its files, only files containing the absolute path
+    of the environment (scripts in `bin/`) are rewritten.  The least recently used
+    entries are evicted once the cache exceeds its size limit.
+
+    Layout of the cache directory::
+
+        entries/<key>/env        the populated environment
+        entries/<key>/meta.json  packages, original location and fingerprint
+        entries/<key>/last_used  empty file, its mtime is the time of the last use
+        clones/                  environments handed out by `provide`
+        stats.json               hit and miss counters
+    """
+
+    def __init__(self, root: str, max_size: int) -> None:
+        """
+        :param root: Directory of the cache, created if it does not exist
+        :param max_size: Maximum size of all entries in bytes
+        """
+        self._root = os.path.abspath(root)
+        self._max_size = max_size
+        self._entries_dir = os.path.join(self._root, "entries")
+        self._clones_dir = os.path.join(self._root, "clones")
+        os.makedirs(self._entries_dir, exist_ok=True)
+        os.makedirs(self._clones_dir, exist_ok=True)
+
+    @staticmethod
+    def is_cacheable(packages: List[str]) -> bool:
+        """Checks, whether an environment populated with the given requirement lines
+        may be shared between projects."""
+        return not any(
+            package.strip().startswith(_LOCAL_REQUIREMENT_PREFIXES)
+            for package in packages
+        )
+
+    @staticmethod
+    def compute_key(packages: List[str], version: str = None) -> str:
+        """Computes the cache key for the given requirement lines.
+
+        :param packages: The requirement lines the environment is populated with,
+            including the tool packages of the runner
+        :param version: The Python version, defaults to the running interpreter
+        :return: A hex digest identifying the environment
+        """
+        key = {
+            "packages": [package.strip() for package in packages if package.strip()],
+            "python": version if version is not None else python_version(),
+        }
+        return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+    def provide(
+        self,
+        packages: List[str],
+        build: Callable[[str], InstallReport],
+        fingerprint: Callable[[str], str],
+    ) -> Tuple[str, bool]:
+        """Provides a populated environment for the given packages.
+
+        An environment whose installation failed is handed out, but not cached;
+        the next request for the same packages builds it again.
+
+        :param packages: The requirement lines the environment is populated with
+        :param build: Creates and populates an environment in the given directory
+            and returns the report of the installation
+        :param fingerprint: Computes the fingerprint of the environment in the
+            given directory
+        :return: The path to a private copy of the environment and whether it was
+            a cache hit
+        """
+        key = self.compute_key(packages)
+        entry = os.path.join(self._entries_dir, key)
+        with self._lock(key):
+            hit = self._is_valid(entry, fingerprint)
+            if hit or self._create_entry(entry, packages, build, fingerprint):
+                clone = self._clone(entry)
+                self._touch(entry)
+            else:
+                clone = self._detach(entry)
+        hits, misses = self._count(hit)
+        LOGGER.info(
+            "Virtual environment cache %s for key %s (hits: %d, misses: %d)",
+            "hit" if hit else "miss",
+            key[:12],
+            hits,
+            misses,
+        )
+        self.evict(keep=key)
+        return clone, hit
+
+    def evict(self, keep: str = None) -> List[str]:
+        """Removes the least recently used entries until the cache fits its size
+        limit.
+
+        :param keep: Key of an entry that must not be evicted
+        :return: The keys of the removed entries
+        """
+        entries = []
+        for key in os.listdir(self._entries_dir):
+            entry = os.path.join(self._entries_dir, key)
+            if not os.path.isfile(os.path.join(entry, "meta.json")):
+                continue
+            entries.append((self._last_used(entry), key, directory_size(entry)))
+        total = sum(size for _, _, size in entries)
+        evicted = []
+        for _, key, size in sorted(entries):
+            if total <= self._max_size:
+                break
+            if key == keep:
+                continue
+            with self._lock(key):
+                shutil.rmtree(os.path.join(self._entries_dir, key), ignore_errors=True)
+            total -= size
+            evicted.append(key)
+            LOGGER.info("Evicted virtual environment %s from cache", key[:12])
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit and miss counters of the cache."""
+        stats_file = os.path.join(self._root, "stats.json")
+        if not os.path.isfile(stats_file):
+            return {"hits": 0, "misses": 0}
+        with open(stats_file) as file:
+            return json.load(file)
+
+    def _is_valid(self, entry: str, fingerprint: Callable[[str], str]) -> bool:
+        meta_file = os.path.join(entry, "meta.json")
+        if not os.path.isfile(meta_file):
+            return False
+        with open(meta_file) as file:
+            meta = json.load(file)
+        if fingerprint(os.path.join(entry, "env")) != meta["fingerprint"]:
+            # A test has modified a hard-linked file of a clone in place
+            LOGGER.warning("Cached virtual environment %s was modified", entry)
+            shutil.rmtree(entry)
+            return False
+        return True
+
+    def _create_entry(
+        self,
+        entry: str,
+        packages: List[str],
+        build: Callable[[str], InstallReport],
+        fingerprint: Callable[[str], str],
+    ) -> bool:
+        """Builds the environment of an entry and records it as valid.
+
+        :return: False, if the installation failed and the entry was not recorded
+        """
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        os.makedirs(entry)
+        env_dir = os.path.join(entry, "env")
+        report = build(env_dir)
+        LOGGER.debug("INSTALL OUT: %s", report.out)
+        LOGGER.debug("INSTALL ERR: %s", report.err)
+        if not report.succeeded:
+            LOGGER.warning(
+                "Not caching virtual environment %s, could not install %s",
+                os.path.basename(entry)[:12],
+                ", ".join(report.failed),
+            )
+            return False
+        meta: Dict[str, Any] = {
+            "packages": packages,
+            "python": python_version(),
+            "env_dir": env_dir,
+            "created": time.time(),
+            "fingerprint": fingerprint(env_dir),
+        }
+        with open(os.path.join(entry, "meta.json.tmp"), "w") as file:
+            json.dump(meta, file, indent=2)
+        os.replace(
+            os.path.join(entry, "meta.json.tmp"), os.path.join(entry, "meta.json")
+        )
+        return True
+
+    def _clone_dir(self, entry: str) -> str:
+        """Returns an unused directory for a clone of an entry."""
+        clone = os.path.join(
+            self._clones_dir, f"{os.path.basename(entry)[:12]}_{os.getpid()}"
+        )
+        suffix = 0
+        while os.path.exists(f"{clone}_{suffix}"):
+            suffix += 1
+        return f"{clone}_{suffix}"
+
+    def _clone(self, entry: str) -> str:
+        with open(os.path.join(entry, "meta.json")) as file:
+            original_dir: str = json.load(file)["env_dir"]
+        clone = self._clone_dir(entry)
+        shutil.copytree(
+            os.path.join(entry, "env"),
+            clone,
+            symlinks=True,
+            copy_function=_copy_or_link,
+        )
+        self._relocate(clone, original_dir)
+        return clone
+
+    def _detach(self, entry: str) -> str:
+        """Moves the environment of an entry that was not recorded to the clones
+        and removes the entry."""
+        clone = self._clone_dir(entry)
+        os.rename(os.path.join(entry, "env"), clone)
+        self._relocate(clone, os.path.join(entry, "env"))
+        shutil.rmtree(entry)
+        return clone
+
+    @staticmethod
+    def _relocate(env_dir: str, original_dir: str) -> None:
+        """Replaces the original location of the environment in its scripts.
+
+        The affected files are written anew, such that the hard links to the cache
+        entry are broken and the entry stays untouched.
+        """
+        old, new = original_dir.encode("utf-8"), env_dir.encode("utf-8")
+        bin_dir = os.path.join(env_dir, "bin")
+        for file_name in os.listdir(bin_dir):
+            path = os.path.join(bin_dir, file_name)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            with open(path, "rb") as file:
+                content = file.read()
+            if old not in content:
+                continue
+            mode = os.stat(path).st_mode
+            os.unlink(path)
+            with open(path, "wb") as file:
+                file.write(content.replace(old, new))
+            os.chmod(path, mode)
+
+    @staticmethod
+    def _touch(entry: str) -> None:
+        with open(os.path.join(entry, "last_used"), "a"):
+            pass
+        os.utime(os.path.join(entry, "last_used"))
+
+    @staticmethod
+    def _last_used(entry: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(entry, "last_used"))
+        except FileNotFoundError:
+            return 0.0
+
+    def _count(self, hit: bool) -> Tuple[int, int]:
+        with self._lock("stats"):
+            stats = self.stats()
+            stats["hits" if hit else "misses"] += 1
+            stats_file = os.path.join(self._root, "stats.json")
+            with open(stats_file + ".tmp", "w") as file:
+                json.dump(stats, file)
+            os.replace(stats_file + ".tmp", stats_file)
+        return stats["hits"], stats["misses"]
+
+    @contextlib.contextmanager
+    def _lock(self, name: str) -> Generator[None, None, None]:
+        """Serializes access to an entry between processes sharing the cache."""
+        with open(os.path.join(self._root, f".{name}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Builds a local directory of wheels that virtual environments are populated
+from without contacting the package index."""
+import argparse
+import csv
+import logging
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Iterable, List, Set, Tuple
+
+LOGGER = logging.getLogger("RepositoryAnalyser.Wheelhouse")
+
+_WHEEL_PATTERN = re.compile(r"([^\s/'\"]+\.whl)")
+
+
+def normalize_requirement(line: str) -> str:
+    """Strips comments from a requirement line.
+
+    :param line: A line of a requirements file
+    :return: The requirement, or an empty string if the line does not contain one
+        that can be built on its own (blank lines, comments and pip options)
+    """
+    line = line.split(" #", 1)[0].strip()
+    if line.startswith(("#", "-")):
+        return ""
+    return line
+
+
+class Wheelhouse:
+    """A directory of built wheels acting as a local package index.
+
+    The modification time of a wheel is its last-use time: it is updated whenever
+    the wheel is built, found during a build, or installed from.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._dir = os.path.abspath(directory)
+        os.makedirs(self._dir, exist_ok=True)
+
+    @property
+    def directory(self) -> str:
+        """Returns the path to the directory containing the wheels."""
+        return self._dir
+
+    def install_options(self) -> str:
+        """Returns the options for `pip install` to install from this wheelhouse
+        only."""
+        return f"--no-index --find-links={shlex.quote(self._dir)}"
+
+    def build(self, requirements: Iterable[str], cwd: str = None) -> List[str]:
+        """Resolves the given requirements and builds wheels for them and all their
+        dependencies.  Wheels that already exist are reused, not rebuilt.
+
+        :param requirements: Requirement lines, e.g., as read by the runners
+        :param cwd: Directory relative requirements (`.`, `./lib`) are resolved
+            against, usually the checkout of the project
+        :return: The requirements that could not be built
+        """
+        failed = []
+        for requirement in sorted({normalize_requirement(r) for r in requirements}):
+            if requirement == "":
+                continue
+            process = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "pip",
+                    "wheel",
+                    "--wheel-dir",
+                    self._dir,
+                    "--find-links",
+                    self._dir,
+                    requirement,
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=cwd,
+                check=False,
+            )
+            output = process.stdout.decode("utf-8", errors="replace")
+            self.mark_used(output)
+            if process.returncode != 0:
+                LOGGER.warning("Could not build wheel for %s", requirement)
+                LOGGER.debug("%s", output)
+                failed.append(requirement)
+        return failed
+
+    def mark_used(self, pip_output: str) -> Set[str]:
+        """Updates the last-use time of all wheels mentioned in the output of pip.
+
+        :param pip_output: Output of `pip install` or `pip wheel`
+        :return: The file names of the wheels that were marked
+        """
+        used = {
+            name
+            for name in _WHEEL_PATTERN.findall(pip_output)
+            if os.path.isfile(os.path.join(self._dir, name))
+        }
+        for name in used:
+            os.utime(os.path.join(self._dir, name))
+        return used
+
+    def evict(self, max_age: float) -> List[str]:
+        """Removes all wheels that have not been used for max_age seconds.
+
+        :param max_age: Maximum time since the last use in seconds
+        :return: The file names of the removed wheels
+        """
+        deadline = time.time() - max_age
+        evicted = []
+        for name in sorted(os.listdir(self._dir)):
+            path = os.path.join(self._dir, name)
+            if name.endswith(".whl") and os.path.getmtime(path) < deadline:
+                os.remove(path)
+                evicted.append(name)
+        if evicted:
+            LOGGER.info("Evicted %d wheels from %s", len(evicted), self._dir)
+        return evicted
+
+
+def checkout(url: str, git_hash: str, directory: str) -> bool:
+    """Clones a repository and resets it to the given hash, like run_execution.sh.
+
+    :return: True, if the checkout succeeded
+    """
+    for command in (
+        ["git", "clone", "--quiet", url, directory],
+        ["git", "-C", directory, "reset", "--quiet", "--hard", git_hash],
+    ):
+        if subprocess.run(command, check=False).returncode != 0:
+            return False
+    return True
+
+
+def project_requirements(project_name: str, repository: str) -> List[str]:
+    """Returns all requirement lines the runners would install for a project."""
+    # flapy.analysis imports this module, thus import it lazily
+    from flapy.analysis import (  # pylint: disable=import-outside-toplevel
+        PyTestRunner,
+        RandomPyTestRunner,
+    )
+
+    runner = PyTestRunner(project_name, repository, argparse.Namespace())
+    return runner.required_packages() + [
+        package
+        for package in RandomPyTestRunner.TOOL_PACKAGES
+        if package not in PyTestRunner.TOOL_PACKAGES
+    ]
+
+
+def build_from_csv(
+    csv_file: str, wheelhouse: Wheelhouse, work_dir: str = None
+) -> List[Tuple[str, str]]:
+    """Builds wheels for all projects listed in a FlaPy input CSV.
+
+    :param csv_file: A CSV file in the format of run_csv.sh
+        (PROJECT_NAME,PROJECT_URL,PROJECT_HASH,...) with or without header
+    :param wheelhouse: The wheelhouse the wheels are stored in
+    :param work_dir: Directory for the temporary checkouts
+    :return: Pairs of project name and requirement that could not be built
+    """
+    failed: List[Tuple[str, str]] = []
+    with open(csv_file) as file:
+        rows = [row for row in csv.reader(file) if len(row) >= 3]
+    for project_name, url, git_hash, *_ in rows:
+        if project_name == "PROJECT_NAME":
+            continue
+        checkout_dir = tempfile.mkdtemp(prefix=f"{project_name}_", dir=work_dir)
+        try:
+            repository = os.path.join(checkout_dir, project_name)
+            if not checkout(url, git_hash, repository):
+                LOGGER.warning("Could not check out %s at %s", url, git_hash)
+                continue
+            LOGGER.info("Building wheels for %s", project_name)
+            requirements = project_requirements(project_name, repository)
+            failed.extend(
+                (project_name, requirement)
+                for requirement in wheelhouse.build(requirements, cwd=repository)
+            )
+        finally:
+            shutil.rmtree(checkout_dir, ignore_errors=True)
+    return failed
+
+
+def main(argv: List[str] = None) -> None:
+    """The main entry location of the program."""
+    if not argv:
+        argv = sys.argv
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description="Pre-builds wheels for all requirements of the projects in a "
+        "FlaPy input CSV.  Pass the wheelhouse to flakyanalysis via --wheelhouse to "
+        "install from it without contacting the package index.",
+    )
+    parser.add_argument("csv_file", help="Input CSV in the format of run_csv.sh")
+    parser.add_argument(
+        "-w", "--wheelhouse", dest="wheelhouse", required=True, help="Wheel directory"
+    )
+    parser.add_argument(
+        "--work-dir",
+        dest="work_dir",
+        required=False,
+        help="Directory for temporary checkouts of the projects",
+    )
+    parser.add_argument(
+        "--max-age-days",
+        dest="max_age_days",
+        type=float,
+        default=30.0,
+        help="Remove wheels that have not been used for this many days.  "
+        "Default: 30",
+    )
+    config = parser.parse_args(argv[1:])
+    logging.basicConfig(level=logging.INFO)
+
+    wheelhouse = Wheelhouse(config.wheelhouse)
+    failed = build_from_csv(config.csv_file, wheelhouse, config.work_dir)
+    wheelhouse.evict(config.max_age_days * 24 * 60 * 60)
+    for project_name, requirement in failed:
+        print(f"{project_name},{requirement}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
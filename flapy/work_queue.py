@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""A queue of projects in a shared directory, e.g., on NFS, that campaigns on
+several hosts take their projects from.
+
+    flapy queue add DIR input.csv
+    flapy campaign --queue DIR --jobs 4     # on every host
+    flapy queue status DIR
+
+Every project is a file that moves between the directories of its states.  A
+worker claims a project by renaming it from `pending' to `leased'; renaming is
+atomic, thus only one worker gets it.  While the project runs, the worker
+touches the lease regularly.  Leases not touched for longer than the lease
+timeout belong to workers that died, any worker moves them back to `pending'.
+A project leased more than `max_attempts' times is moved to `failed'.
+
+Layout of the queue directory::
+
+    pending/<item>           projects not claimed yet
+    leased/<item>@<worker>   claimed projects, the mtime is the last heartbeat
+    done/<item>, failed/<item>
+    results/                 the results of run_execution.sh
+    logs/, events/, state/   the output of the campaigns of the workers
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from flapy.campaign import DONE, FAILED, Project, read_csv
+
+LOGGER = logging.getLogger("RepositoryAnalyser.WorkQueue")
+
+PENDING = "pending"
+LEASED = "leased"
+
+# Seconds after the last heartbeat before a lease is considered stale.  The
+# mtimes are set by the file server, but compared with the clock of the host,
+# thus this must be much larger than the clock skew between the hosts.
+DEFAULT_LEASE_TIMEOUT = 10 * 60
+
+
+def default_worker() -> str:
+    """Returns an identifier of this process that is unique across hosts."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def item_name(project: Project) -> str:
+    """Returns the name of the file of a project in the queue."""
+    return f"{project.line:06d}_{project.name}"
+
+
+class WorkQueue:
+    """A queue of projects in a shared directory, see the module documentation."""
+
+    def __init__(
+        self,
+        root: str,
+        worker: Optional[str] = None,
+        lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+        max_attempts: int = 3,
+    ) -> None:
+        """
+        :param root: The queue directory, created if it does not exist
+        :param worker: Identifies the worker in lease names, must not contain `@'
+        :param lease_timeout: Seconds after the last heartbeat before a lease is
+            moved back to pending
+        :param max_attempts: The number of times a project is leased before it is
+            considered failed
+        """
+        self.root = os.path.abspath(root)
+        self.worker = worker or default_worker()
+        self.lease_timeout = lease_timeout
+        self._max_attempts = max_attempts
+        # The lease files of this worker by project key
+        self._leases: Dict[str, str] = {}
+        for directory in [PENDING, LEASED, DONE, FAILED]:
+            os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+
+    def path(self, *names: str) -> str:
+        """Returns a path in the queue directory."""
+        return os.path.join(self.root, *names)
+
+    def add(self, projects: List[Project]) -> int:
+        """Adds the projects that are not in the queue yet as pending.
+
+        :return: The number of projects added
+        """
+        known = {
+            _item(name)
+            for directory in [PENDING, LEASED, DONE, FAILED]
+            for name in self._list(directory)
+        }
+        added = 0
+        for project in projects:
+            item = item_name(project)
+            if item in known:
+                continue
+            # Not pending before it is complete
+            tmp = self.path(f".{item}")
+            _write(tmp, {"project": asdict(project), "attempts": 0})
+            os.rename(tmp, self.path(PENDING, item))
+            added += 1
+        return added
+
+    def claim(self) -> Optional[Project]:
+        """Leases the first pending project.
+
+        :return: The project, or None if no project is pending
+        """
+        for item in self._list(PENDING):
+            pending = self.path(PENDING, item)
+            lease = self.path(LEASED, f"{item}@{self.worker}")
+            try:
+                # Renaming keeps the mtime, which would make the lease stale
+                os.utime(pending)
+                os.rename(pending, lease)
+            except FileNotFoundError:
+                # Claimed by another worker
+                continue
+            content = _read(lease)
+            content["attempts"] += 1
+            content.setdefault("workers", []).append(self.worker)
+            project = Project(**content["project"])
+            if content["attempts"] > self._max_attempts:
+                LOGGER.warning("Giving up %s after %d leases", item, self._max_attempts)
+                _write(lease, dict(content, status=FAILED))
+                os.rename(lease, self.path(FAILED, item))
+                continue
+            _write(lease, content)
+            self._leases[project.key] = lease
+            return project
+        return None
+
+    def heartbeat(self) -> List[str]:
+        """Renews the leases of this worker.
+
+        :return: The keys of the projects whose lease was lost, because it was
+            considered stale and moved back to pending
+        """
+        lost = []
+        for key, lease in list(self._leases.items()):
+            try:
+                os.utime(lease)
+            except FileNotFoundError:
+                LOGGER.warning("Lost the lease of %s", key)
+                del self._leases[key]
+                lost.append(key)
+        return lost
+
+    def complete(self, key: str, status: str, **fields: Any) -> bool:
+        """Moves a leased project to `done' or `failed'.
+
+        :param fields: Added to the file of the project, e.g., the return code
+        :return: False, if the lease was lost
+        """
+        lease = self._leases.pop(key, None)
+        if lease is None:
+            return False
+        finished = self.path(
+            DONE if status == DONE else FAILED, _item(os.path.basename(lease))
+        )
+        try:
+            content = _read(lease)
+            os.rename(lease, finished)
+        except FileNotFoundError:
+            return False
+        _write(finished, dict(content, status=status, end=time.time(), **fields))
+        return True
+
+    def release(self, key: str) -> None:
+        """Moves a leased project back to pending, e.g., when the worker stops."""
+        lease = self._leases.pop(key, None)
+        if lease is None:
+            return
+        try:
+            # Renewing the lease makes sure it is not requeued while rewriting it
+            os.utime(lease)
+            content = _read(lease)
+            # Stopping the worker does not count as attempt
+            _write(lease, dict(content, attempts=content["attempts"] - 1))
+            os.rename(lease, self.path(PENDING, _item(os.path.basename(lease))))
+        except FileNotFoundError:
+            pass
+
+    def requeue_stale(self) -> List[str]:
+        """Moves the leases that were not renewed within the lease timeout back to
+        pending.
+
+        :return: The items moved
+        """
+        requeued = []
+        deadline = time.time() - self.lease_timeout
+        for name in self._list(LEASED):
+            lease = self.path(LEASED, name)
+            item, worker = name.rsplit("@", 1)
+            try:
+                if os.path.getmtime(lease) >= deadline:
+                    continue
+                os.rename(lease, self.path(PENDING, item))
+            except FileNotFoundError:
+                # Completed, renewed or requeued by another worker meanwhile
+                continue
+            LOGGER.warning("Requeued %s, whose worker %s is gone", item, worker)
+            requeued.append(item)
+        return requeued
+
+    def counts(self) -> Dict[str, int]:
+        """Returns the number of projects in every state."""
+        return {
+            directory: len(self._list(directory))
+            for directory in [PENDING, LEASED, DONE, FAILED]
+        }
+
+    def is_drained(self) -> bool:
+        """Whether no project is pending or leased by any worker."""
+        return not self._list(PENDING) and not self._list(LEASED)
+
+    def leases(self) -> List[Dict[str, Any]]:
+        """Returns the worker and the seconds since the last heartbeat of every
+        lease."""
+        leases = []
+        for name in self._list(LEASED):
+            item, worker = name.rsplit("@", 1)
+            try:
+                age = time.time() - os.path.getmtime(self.path(LEASED, name))
+            except FileNotFoundError:
+                continue
+            leases.append({"item": item, "worker": worker, "age": age})
+        return leases
+
+    def _list(self, directory: str) -> List[str]:
+        """Lists a state directory without the temporary files."""
+        return sorted(
+            name
+            for name in os.listdir(self.path(directory))
+            if not name.startswith(".")
+        )
+
+
+def _item(name: str) -> str:
+    """Returns the item of the file name of a project in any state."""
+    return name.rsplit("@", 1)[0] if "@" in name else name
+
+
+def _read(path: str) -> Dict[str, Any]:
+    with open(path) as file:
+        return json.load(file)
+
+
+def _write(path: str, content: Dict[str, Any]) -> None:
+    """Replaces the content of a file atomically; the file must be owned, i.e.,
+    pending and not visible yet, or leased by this worker."""
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(tmp, "w") as file:
+        json.dump(content, file, indent=2)
+    os.replace(tmp, path)
+
+
+def main(argv: List[str] = None) -> None:
+    """The main entry location of the program."""
+    if not argv:
+        argv = sys.argv
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description="Manages a queue of projects in a shared directory, which "
+        "`flapy campaign --queue' workers on several hosts take projects from.",
+    )
+    commands = parser.add_subparsers(dest="command")
+    add_parser = commands.add_parser("add", help="Add the projects of a CSV")
+    add_parser.add_argument("queue", help="Queue directory")
+    add_parser.add_argument("csv_file", help="Input CSV in the format of run_csv.sh")
+    status_parser = commands.add_parser("status", help="Show the progress")
+    status_parser.add_argument("queue", help="Queue directory")
+    requeue_parser = commands.add_parser(
+        "requeue-stale", help="Move stale leases back to pending"
+    )
+    requeue_parser.add_argument("queue", help="Queue directory")
+    requeue_parser.add_argument(
+        "--lease-timeout",
+        dest="lease_timeout",
+        type=float,
+        default=DEFAULT_LEASE_TIMEOUT,
+        help="Seconds after the last heartbeat before a lease is stale.  "
+        "Default: 600",
+    )
+    config = parser.parse_args(argv[1:])
+    logging.basicConfig(level=logging.INFO)
+
+    if config.command == "add":
+        queue = WorkQueue(config.queue)
+        print(queue.add(read_csv(config.csv_file)))
+    elif config.command == "status":
+        queue = WorkQueue(config.queue)
+        print(json.dumps(queue.counts()))
+        for lease in queue.leases():
+            print(
+                f"{lease['item']} leased by {lease['worker']} {lease['age']:.0f}s ago"
+            )
+    elif config.command == "requeue-stale":
+        queue = WorkQueue(config.queue, lease_timeout=config.lease_timeout)
+        for item in queue.requeue_stale():
+            print(item)
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
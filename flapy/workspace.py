@@ -0,0 +1,605 @@
+#!/usr/bin/env python3
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""Provides strategies to create the workspaces (copies of the repository) the
+tests are run in."""
+import fcntl
+import fnmatch
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from abc import ABCMeta, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Type, Union
+
+LOGGER = logging.getLogger("RepositoryAnalyser.Workspace")
+
+# From linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+IgnoreFunction = Callable[[str, List[str]], Iterable[str]]
+
+# Version control data, tool caches and environments that tests never need
+DEFAULT_EXCLUDES = [
+    ".git",
+    ".hg",
+    ".svn",
+    ".tox",
+    ".nox",
+    "node_modules",
+    "__pycache__",
+    "venv",
+    ".venv",
+    ".mypy_cache",
+    ".pytest_cache",
+]
+
+
+# pylint: disable=too-few-public-methods
+@dataclass
+class CopyStats:
+    """Accounting of a single workspace copy."""
+
+    strategy: str = ""
+    files_copied: int = 0
+    bytes_copied: int = 0
+    bytes_written: int = 0
+    files_skipped: int = 0
+    bytes_skipped: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.strategy}: copied {self.files_copied} files "
+            f"({self.bytes_copied} bytes, {self.bytes_written} bytes written), "
+            f"skipped {self.files_skipped} files ({self.bytes_skipped} bytes) "
+            f"in {self.seconds:.2f}s"
+        )
+
+
+class WorkspaceStrategy(metaclass=ABCMeta):
+    """Copies a directory tree file by file, subclasses define how a single file is
+    copied."""
+
+    name = ""
+
+    @classmethod
+    @abstractmethod
+    def is_supported(cls, src_dir: str, dst_parent: str) -> bool:
+        """Checks, whether files can be copied from src_dir to a new directory inside
+        dst_parent with this strategy."""
+
+    @abstractmethod
+    def copy_file(self, src: str, dst: str) -> int:
+        """Copies a single file including its metadata.
+
+        :return: The number of data bytes actually written
+        """
+
+    def prepare(self, src_dir: str, ignore: Optional[IgnoreFunction] = None) -> None:
+        """Is called before the first copy of src_dir is made."""
+
+    def release(self, src_dir: str) -> None:
+        """Is called after all copies of src_dir have been deleted, undoes the
+        changes of prepare."""
+
+    def copy_tree(
+        self,
+        src: Union[str, os.PathLike],
+        dst: Union[str, os.PathLike],
+        symlinks: bool = False,
+        ignore: Optional[IgnoreFunction] = None,
+    ) -> CopyStats:
+        """Copies the content of src into the existing directory dst.
+
+        :param src: Path to the source
+        :param dst: Path to the destination, which must exist
+        :param symlinks: A flag indicating whether symlinks should be copied
+        :param ignore: A function for ignoring several files/folders, see
+            shutil.copytree
+        :return: Accounting of the copy
+        """
+        stats = CopyStats(strategy=self.name)
+        start = time.time()
+        self._copy_dir(str(src), str(dst), symlinks, ignore, stats)
+        stats.seconds = time.time() - start
+        return stats
+
+    def _copy_dir(
+        self,
+        src: str,
+        dst: str,
+        symlinks: bool,
+        ignore: Optional[IgnoreFunction],
+        stats: CopyStats,
+    ) -> None:
+        names = os.listdir(src)
+        ignored = set(ignore(src, names)) if ignore is not None else set()
+        for name in names:
+            source_path = os.path.join(src, name)
+            dest_path = os.path.join(dst, name)
+            if name in ignored:
+                files, size = _tree_size(source_path)
+                stats.files_skipped += files
+                stats.bytes_skipped += size
+            elif symlinks and os.path.islink(source_path):
+                os.symlink(os.readlink(source_path), dest_path)
+            elif os.path.isdir(source_path):
+                os.mkdir(dest_path)
+                self._copy_dir(source_path, dest_path, symlinks, ignore, stats)
+                shutil.copystat(source_path, dest_path)
+            else:
+                stats.files_copied += 1
+                stats.bytes_copied += os.path.getsize(source_path)
+                stats.bytes_written += self.copy_file(source_path, dest_path)
+
+
+class CopyStrategy(WorkspaceStrategy):
+    """Copies the content of every file, works everywhere."""
+
+    name = "copy"
+
+    @classmethod
+    def is_supported(cls, src_dir: str, dst_parent: str) -> bool:
+        return True
+
+    def copy_file(self, src: str, dst: str) -> int:
+        shutil.copy2(src, dst)
+        return os.path.getsize(dst)
+
+
+class ReflinkStrategy(WorkspaceStrategy):
+    """Creates copy-on-write clones of the files (e.g., on btrfs or XFS), which share
+    their data blocks with the source until one of them is written."""
+
+    name = "reflink"
+
+    @classmethod
+    def is_supported(cls, src_dir: str, dst_parent: str) -> bool:
+        probe_src = _find_regular_file(src_dir)
+        if probe_src is None or not hasattr(fcntl, "ioctl"):
+            return False
+        fd, probe_dst = tempfile.mkstemp(prefix=".reflink-probe", dir=dst_parent)
+        os.close(fd)
+        try:
+            cls._clone(probe_src, probe_dst)
+            return True
+        except OSError:
+            return False
+        finally:
+            os.remove(probe_dst)
+
+    def copy_file(self, src: str, dst: str) -> int:
+        self._clone(src, dst)
+        shutil.copystat(src, dst)
+        return 0
+
+    @staticmethod
+    def _clone(src: str, dst: str) -> None:
+        with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+
+
+class HardlinkStrategy(WorkspaceStrategy):
+    """Creates a farm of hard links to the source files.
+
+    To protect the source against writes through a link, the write permissions of
+    the source files are removed before the first copy and restored by `release'.
+    Tests and tools that replace a file (write a new one and rename it) thereby get
+    a private copy on their first write, while writing into a linked file in place
+    fails, which breaks some test suites.  Therefore, this strategy is never
+    selected automatically.  As root ignores file permissions, it is not supported
+    for root.  The source is additionally checked for modifications before every
+    copy.
+    """
+
+    name = "hardlink"
+
+    def __init__(self) -> None:
+        self._snapshots: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        # The permissions of the source files before prepare
+        self._modes: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def is_supported(cls, src_dir: str, dst_parent: str) -> bool:
+        if os.geteuid() == 0:
+            return False
+        return os.stat(src_dir).st_dev == os.stat(dst_parent).st_dev
+
+    def prepare(self, src_dir: str, ignore: Optional[IgnoreFunction] = None) -> None:
+        snapshot = {}
+        modes = self._modes.setdefault(src_dir, {})
+        for root, dirs, files in os.walk(src_dir):
+            if ignore is not None:
+                ignored = set(ignore(root, dirs + files))
+                dirs[:] = [name for name in dirs if name not in ignored]
+                files = [name for name in files if name not in ignored]
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                if os.path.islink(path):
+                    continue
+                mode = stat.S_IMODE(os.stat(path).st_mode)
+                modes.setdefault(path, mode)
+                os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+                snapshot[path] = self._signature(path)
+        self._snapshots[src_dir] = snapshot
+
+    def release(self, src_dir: str) -> None:
+        for path, mode in self._modes.pop(src_dir, {}).items():
+            try:
+                os.chmod(path, mode)
+            except FileNotFoundError:
+                pass
+        self._snapshots.pop(src_dir, None)
+
+    def copy_tree(
+        self,
+        src: Union[str, os.PathLike],
+        dst: Union[str, os.PathLike],
+        symlinks: bool = False,
+        ignore: Optional[IgnoreFunction] = None,
+    ) -> CopyStats:
+        if str(src) not in self._snapshots:
+            self.prepare(str(src), ignore)
+        for path, signature in self._snapshots[str(src)].items():
+            if os.path.exists(path) and self._signature(path) != signature:
+                LOGGER.error("Source file %s was modified through a hard link", path)
+        return super().copy_tree(src, dst, symlinks, ignore)
+
+    def copy_file(self, src: str, dst: str) -> int:
+        os.link(src, dst)
+        return 0
+
+    @staticmethod
+    def _signature(path: str) -> Tuple[int, int]:
+        stat_result = os.stat(path)
+        return stat_result.st_size, stat_result.st_mtime_ns
+
+
+class _GitignoreRule:
+    """A single pattern of a .gitignore file."""
+
+    def __init__(self, line: str) -> None:
+        self.negated = line.startswith("!")
+        if self.negated:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        self.dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        # Patterns containing a slash are relative to the .gitignore file
+        self.anchored = "/" in line
+        self.pattern = line.lstrip("/")
+
+    def matches(self, relative_path: str, is_dir: bool) -> bool:
+        """Checks a path relative to the directory of the .gitignore file."""
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            return fnmatch.fnmatchcase(relative_path, self.pattern)
+        return fnmatch.fnmatchcase(os.path.basename(relative_path), self.pattern)
+
+
+class ExclusionSpec:
+    """Decides which files and directories are left out of the workspaces.
+
+    An instance can be passed as `ignore` to `WorkspaceStrategy.copy_tree`.
+    Patterns without a slash are matched against the names of files and
+    directories, patterns with a slash against their paths relative to the root.
+    If .gitignore files are honored, the common subset of their syntax is
+    supported: negation, directory-only and anchored patterns.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        patterns: Iterable[str] = tuple(DEFAULT_EXCLUDES),
+        honor_gitignore: bool = False,
+    ) -> None:
+        """
+        :param root: The directory that will be copied
+        :param patterns: Glob patterns of files and directories to exclude
+        :param honor_gitignore: Whether to exclude what the .gitignore files in
+            the tree ignore
+        """
+        self._root = os.path.abspath(root)
+        self._patterns = list(patterns)
+        self._honor_gitignore = honor_gitignore
+        self._gitignores: Dict[str, List[_GitignoreRule]] = {}
+
+    def __call__(self, directory: str, names: List[str]) -> Set[str]:
+        directory = os.path.abspath(directory)
+        relative_dir = os.path.relpath(directory, self._root)
+        ignored = set()
+        for name in names:
+            relative_path = os.path.normpath(os.path.join(relative_dir, name))
+            if any(
+                fnmatch.fnmatchcase(relative_path if "/" in pattern else name, pattern)
+                for pattern in self._patterns
+            ):
+                ignored.add(name)
+            elif self._honor_gitignore and self._is_gitignored(directory, name):
+                ignored.add(name)
+        return ignored
+
+    def _is_gitignored(self, directory: str, name: str) -> bool:
+        path = os.path.join(directory, name)
+        is_dir = os.path.isdir(path)
+        ignored = False
+        # Rules of deeper .gitignore files take precedence, as do later rules
+        for rules_dir in self._directories_up_to(directory):
+            relative_path = os.path.relpath(path, rules_dir)
+            for rule in self._rules(rules_dir):
+                if rule.matches(relative_path, is_dir):
+                    ignored = not rule.negated
+        return ignored
+
+    def _directories_up_to(self, directory: str) -> List[str]:
+        directories = [directory]
+        while directory != self._root and directory != os.path.dirname(directory):
+            directory = os.path.dirname(directory)
+            directories.append(directory)
+        return list(reversed(directories))
+
+    def _rules(self, directory: str) -> List[_GitignoreRule]:
+        if directory not in self._gitignores:
+            rules = []
+            gitignore = os.path.join(directory, ".gitignore")
+            if os.path.isfile(gitignore):
+                with open(gitignore, errors="replace") as file:
+                    for line in file:
+                        line = line.rstrip()
+                        if line and not line.startswith("#"):
+                            rules.append(_GitignoreRule(line))
+            self._gitignores[directory] = rules
+        return self._gitignores[directory]
+
+
+# pylint: disable=too-few-public-methods
+@dataclass
+class ResetStats:
+    """Accounting of a single workspace reset."""
+
+    created: int = 0
+    modified: int = 0
+    deleted: int = 0
+    bytes_restored: int = 0
+    verified: bool = False
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"removed {self.created} created, restored {self.modified} modified and "
+            f"{self.deleted} deleted paths ({self.bytes_restored} bytes) "
+            f"in {self.seconds:.2f}s, {'verified' if self.verified else 'NOT verified'}"
+        )
+
+
+class WorkspaceSnapshot:
+    """The pristine state of a workspace, used to undo the changes a test run made
+    to it instead of copying the whole repository again.
+
+    The snapshot records path, size, modification time and content hash of every
+    file once.  Files are considered unchanged if their size and modification
+    time are unchanged; restored files are checked against their hash.
+    """
+
+    def __init__(
+        self, workspace: str, source: str, strategy: WorkspaceStrategy = None
+    ) -> None:
+        """
+        :param workspace: A pristine copy of source
+        :param source: The directory the files are restored from
+        :param strategy: The strategy workspace was created with
+        """
+        self._workspace = workspace
+        self._source = source
+        self._strategy = strategy if strategy is not None else CopyStrategy()
+        files, self._links, self._dirs = self._scan()
+        self._files: Dict[str, Tuple[int, int, str]] = {
+            path: (size, mtime, _digest(os.path.join(workspace, path)))
+            for path, (size, mtime) in files.items()
+        }
+
+    @property
+    def workspace(self) -> str:
+        """Returns the path to the workspace."""
+        return self._workspace
+
+    def changes(self) -> Tuple[List[str], List[str], List[str]]:
+        """Compares the workspace to the snapshot.
+
+        :return: The relative paths that were created, modified and deleted
+        """
+        files, links, dirs = self._scan()
+        current = set(files) | set(links) | dirs
+        pristine = set(self._files) | set(self._links) | self._dirs
+        modified = [
+            path
+            for path in sorted(current & pristine)
+            if not (
+                (path in self._files and files.get(path) == self._files[path][:2])
+                or (path in self._links and links.get(path) == self._links[path])
+                or (path in self._dirs and path in dirs)
+            )
+        ]
+        return sorted(current - pristine), modified, sorted(pristine - current)
+
+    def reset(self) -> ResetStats:
+        """Restores the state of the snapshot and verifies it.
+
+        :return: Accounting of the reset; if it is not verified, the workspace
+            must be created anew
+        """
+        start = time.time()
+        created, modified, deleted = self.changes()
+        stats = ResetStats(
+            created=len(created), modified=len(modified), deleted=len(deleted)
+        )
+        try:
+            # Children are removed before their parents, and restored after them
+            for path in sorted(created + modified, reverse=True):
+                self._remove(path)
+            for path in sorted(modified + deleted):
+                stats.bytes_restored += self._restore(path)
+            stats.verified = self._verify(modified + deleted)
+        except OSError as error:
+            LOGGER.warning("Could not reset workspace %s: %s", self._workspace, error)
+        stats.seconds = time.time() - start
+        return stats
+
+    def _scan(self) -> Tuple[Dict[str, Tuple[int, int]], Dict[str, str], Set[str]]:
+        files: Dict[str, Tuple[int, int]] = {}
+        links: Dict[str, str] = {}
+        dirs: Set[str] = set()
+        for root, dir_names, file_names in os.walk(self._workspace):
+            relative_root = os.path.relpath(root, self._workspace)
+            for name in dir_names + file_names:
+                path = os.path.join(root, name)
+                relative_path = os.path.normpath(os.path.join(relative_root, name))
+                if os.path.islink(path):
+                    links[relative_path] = os.readlink(path)
+                elif os.path.isdir(path):
+                    dirs.add(relative_path)
+                else:
+                    stat_result = os.stat(path)
+                    files[relative_path] = (
+                        stat_result.st_size,
+                        stat_result.st_mtime_ns,
+                    )
+        return files, links, dirs
+
+    def _remove(self, relative_path: str) -> None:
+        path = os.path.join(self._workspace, relative_path)
+        if os.path.islink(path) or os.path.isfile(path):
+            os.remove(path)
+        elif os.path.isdir(path):
+            shutil.rmtree(path)
+
+    def _restore(self, relative_path: str) -> int:
+        """Restores a path from the source and returns the number of bytes."""
+        path = os.path.join(self._workspace, relative_path)
+        if relative_path in self._links:
+            os.symlink(self._links[relative_path], path)
+            return 0
+        if relative_path in self._dirs:
+            os.makedirs(path, exist_ok=True)
+            return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._strategy.copy_file(os.path.join(self._source, relative_path), path)
+        return self._files[relative_path][0]
+
+    def _verify(self, restored: List[str]) -> bool:
+        if any(self.changes()):
+            return False
+        return all(
+            _digest(os.path.join(self._workspace, path)) == self._files[path][2]
+            for path in restored
+            if path in self._files
+        )
+
+
+STRATEGIES: Dict[str, Type[WorkspaceStrategy]] = {
+    strategy.name: strategy
+    for strategy in (ReflinkStrategy, HardlinkStrategy, CopyStrategy)
+}
+
+# The strategies `auto' selects from; hard links alter the source, see
+# HardlinkStrategy, thus they must be requested explicitly
+AUTO_STRATEGIES: Tuple[Type[WorkspaceStrategy], ...] = (ReflinkStrategy, CopyStrategy)
+
+
+def select_strategy(name: str, src_dir: str, dst_parent: str) -> WorkspaceStrategy:
+    """Selects the strategy to create workspaces with.
+
+    :param name: Name of a strategy, or `auto' to select the first supported
+        strategy in the order of AUTO_STRATEGIES
+    :param src_dir: The directory that will be copied
+    :param dst_parent: The directory the copies will be created in
+    :return: An instance of the selected strategy
+    """
+    if name != "auto":
+        return STRATEGIES[name]()
+    for strategy in AUTO_STRATEGIES:
+        if strategy.is_supported(src_dir, dst_parent):
+            LOGGER.info("Using workspace strategy %s", strategy.name)
+            return strategy()
+    return CopyStrategy()
+
+
+def benchmark(src_dir: str, dst_parent: str) -> List[CopyStats]:
+    """Copies src_dir once with every strategy that is supported.
+
+    :param src_dir: The directory to copy, e.g., a checked-out repository
+    :param dst_parent: The directory the copies are created (and deleted) in
+    :return: Copy time and written bytes for each strategy
+    """
+    results = []
+    for strategy_class in STRATEGIES.values():
+        if not strategy_class.is_supported(src_dir, dst_parent):
+            continue
+        dst = tempfile.mkdtemp(prefix=f"{strategy_class.name}_", dir=dst_parent)
+        try:
+            results.append(strategy_class().copy_tree(src_dir, dst))
+        finally:
+            shutil.rmtree(dst)
+    return results
+
+
+def _find_regular_file(directory: str) -> Optional[str]:
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                return path
+    return None
+
+
+def _digest(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _tree_size(path: str) -> Tuple[int, int]:
+    """Returns the number of files below path and their total size."""
+    if not os.path.isdir(path) or os.path.islink(path):
+        return 1, os.lstat(path).st_size
+    files, size = 0, 0
+    for root, _, file_names in os.walk(path):
+        for file_name in file_names:
+            files += 1
+            size += os.lstat(os.path.join(root, file_name)).st_size
+    return files, size
+
+
+def main(argv: List[str] = None) -> None:
+    """Benchmarks the workspace strategies on a directory."""
+    if not argv:
+        argv = sys.argv
+    if len(argv) != 3:
+        print(f"Usage: {argv[0]} SOURCE_DIR TEMP_DIR", file=sys.stderr)
+        sys.exit(1)
+    for stats in benchmark(argv[1], argv[2]):
+        print(stats)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
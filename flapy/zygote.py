@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# This project is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This project is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this project.  If not, see <https://www.gnu.org/licenses>.
+"""A fork server running pytest several times without paying its startup costs
+each time.
+
+The script is run with the interpreter of the virtual environment the tests are
+run in and must therefore not depend on anything but the standard library and
+pytest::
+
+    python zygote.py PLAN_FILE
+
+The plan file is a JSON object of the form::
+
+    {
+        "collect": ["--rootdir=.", "tests/"],
+        "runs": [
+            {"args": ["-v", "--junitxml=out0.xml", "tests/"], "output": "out0.log"},
+            ...
+        ],
+        "backup": "workspace_backup",
+        "report": "zygote.json"
+    }
+
+The process first imports pytest and collects the tests with the `collect`
+arguments, which imports the project's test modules and conftest files.  Then it
+forks a child for every entry of `runs`, one after another, which calls pytest
+with the given `args` and writes its output to `output`.  The children find the
+modules already imported and thus skip most of the startup.  Finally, a report
+of the time spent on startup in the warm-up and in each child is written to
+`report`.
+
+All children run in the working directory of the fork server.  If `backup` is
+given, the working directory is copied there after the warm-up, and the changes
+of each child are undone before the next one is forked.
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import time
+
+START = time.time()
+
+
+class _CollectionTimer:
+    """A pytest plugin recording when the collection of the tests has finished."""
+
+    def __init__(self):
+        self.finished = None
+
+    def pytest_collection_finish(self, session):  # pylint: disable=unused-argument
+        """Is called by pytest after the collection has been performed."""
+        self.finished = time.time()
+
+
+def warm_up(args):
+    """Imports pytest and all test modules by collecting the tests.
+
+    :param args: The pytest arguments selecting the tests
+    :return: The seconds from the start of the process until the end of the
+        collection, i.e., the startup time a run without the fork server pays
+    """
+    import pytest  # pylint: disable=import-outside-toplevel
+
+    timer = _CollectionTimer()
+    pytest.main(
+        list(args) + ["--collect-only", "-q", "-p", "no:cacheprovider"],
+        plugins=[timer],
+    )
+    return (timer.finished or time.time()) - START
+
+
+def _entries(root, dirs, files):
+    """Returns the names of the files in root, including symlinks to
+    directories, which os.walk lists as directories, but does not follow."""
+    return files + [name for name in dirs if os.path.islink(os.path.join(root, name))]
+
+
+def scan(directory):
+    """Returns the size and modification time of every file below directory.
+
+    :return: A dict mapping relative paths to (size, mtime) pairs
+    """
+    state = {}
+    for root, dirs, files in os.walk(directory):
+        for name in _entries(root, dirs, files):
+            path = os.path.join(root, name)
+            stat = os.lstat(path)
+            state[os.path.relpath(path, directory)] = (stat.st_size, stat.st_mtime_ns)
+    return state
+
+
+def reset(directory, backup, state):
+    """Undoes the changes to directory since it was copied to backup.
+
+    :param state: The result of scan(directory) at the time of the copy
+    :return: The number of files removed or restored
+    """
+    changed = set()
+    for root, dirs, files in os.walk(directory):
+        for name in _entries(root, dirs, files):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory)
+            stat = os.lstat(path)
+            if state.get(relative) != (stat.st_size, stat.st_mtime_ns):
+                os.remove(path)
+                changed.add(relative)
+        for name in list(dirs):
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                dirs.remove(name)
+            elif not os.path.isdir(
+                os.path.join(backup, os.path.relpath(path, directory))
+            ):
+                shutil.rmtree(path, ignore_errors=True)
+                dirs.remove(name)
+                changed.add(os.path.relpath(path, directory))
+    for relative in state:
+        path = os.path.join(directory, relative)
+        if os.path.lexists(path):
+            continue
+        source = os.path.join(backup, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.islink(source):
+            os.symlink(os.readlink(source), path)
+        else:
+            shutil.copy2(source, path)
+        changed.add(relative)
+    return len(changed)
+
+
+def run_forked(args, output=None):
+    """Runs pytest with the given arguments in a forked child process.
+
+    :param args: The pytest arguments of the run
+    :param output: The file the child writes its output and error output to,
+        the output of the fork server by default
+    :return: A dict containing the exit code of the child, the seconds it spent
+        until its tests were collected and the seconds it ran in total
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    read_fd, write_fd = os.pipe()
+    start = time.time()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        if output is not None:
+            output_fd = os.open(output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.dup2(output_fd, sys.stdout.fileno())
+            os.dup2(output_fd, sys.stderr.fileno())
+            os.close(output_fd)
+        # Do not share the random state of the parent between the runs
+        random.seed()
+        timer = _CollectionTimer()
+        exit_code = 1
+        try:
+            import pytest  # pylint: disable=import-outside-toplevel
+
+            exit_code = int(pytest.main(list(args), plugins=[timer]))
+        finally:
+            startup = (timer.finished or time.time()) - start
+            os.write(write_fd, json.dumps({"startup": startup}).encode("utf-8"))
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)  # pylint: disable=protected-access
+    os.close(write_fd)
+    _, status = os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as pipe:
+        data = pipe.read()
+    result = json.loads(data) if data else {"startup": None}
+    result["exit_code"] = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    result["seconds"] = time.time() - start
+    return result
+
+
+def main(argv):
+    """Runs the plan given as the only argument."""
+    if len(argv) != 2:
+        print("Usage: {} PLAN_FILE".format(argv[0]), file=sys.stderr)
+        return 1
+    with open(argv[1]) as plan_file:
+        plan = json.load(plan_file)
+
+    warmup = warm_up(plan["collect"])
+    backup = plan.get("backup")
+    if backup:
+        shutil.copytree(".", backup, symlinks=True)
+        state = scan(".")
+    runs = []
+    for index, run in enumerate(plan["runs"]):
+        reset_files = reset(".", backup, state) if backup and index > 0 else 0
+        result = run_forked(run["args"], run.get("output"))
+        result["args"] = run["args"]
+        result["reset_files"] = reset_files
+        runs.append(result)
+    if backup:
+        shutil.rmtree(backup, ignore_errors=True)
+
+    # Without the fork server, every run would pay the full warm-up
+    saved = sum(
+        max(warmup - run["startup"], 0.0) for run in runs if run["startup"] is not None
+    )
+    report = {"warmup": warmup, "runs": runs, "saved": saved}
+    if plan.get("report"):
+        with open(plan["report"], "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    print(
+        "ZYGOTE: {} runs, warm-up {:.2f}s, saved {:.2f}s of startup time".format(
+            len(runs), warmup, saved
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
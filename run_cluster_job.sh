@@ -4,9 +4,13 @@ SLURM_JOB_ID=0
 PID=$$
 
 csv_file=$1
-
-# Adjust size of slurm array
-sed "s/--array=1-.*/--array=1-$(wc -l < "${csv_file}")/g" array_job.sh > tmpfile && mv tmpfile array_job.sh
+# Optional target runtime of an array task in minutes.  If given, the projects
+# are grouped into array tasks by `flapy plan', see flapy/cluster_plan.py;
+# further options of `flapy plan pack', e.g., --state, can be set in
+# FLAPY_PLAN_OPTIONS.
+target_minutes=$2
+# How often the projects of killed tasks are submitted again
+max_rounds=${FLAPY_PLAN_ROUNDS:-3}
 
 function sig_handler {
   echo "Canceling the SLURM job..."
@@ -24,29 +28,68 @@ trap sig_handler INT TERM HUP QUIT
 
 mkdir -p slurm-logs
 
-IFS=',' read SLURM_JOB_ID rest < <(sbatch \
-	-o slurm-logs/slurm-%j.out \
-	-e slurm-logs/slurm-%j.out \
-	--parsable array_job.sh "${csv_file}"\
-	)
-if [[ -z "${SLURM_JOB_ID}" ]]
+# Submits the array job $1 with argument $2 and waits until it is finished
+function submit_and_wait {
+  IFS=',' read SLURM_JOB_ID rest < <(sbatch \
+  	-o slurm-logs/slurm-%j.out \
+  	-e slurm-logs/slurm-%j.out \
+  	--parsable "$1" "$2"\
+  	)
+  if [[ -z "${SLURM_JOB_ID}" ]]
+  then
+    echo "Submitting the SLURM job failed!"
+    exit 1
+  fi
+
+  echo "SLURM job with ID ${SLURM_JOB_ID} submitted!"
+  total=1
+  # periodically look for jobs pending/running
+  while [[ "${total}" -gt 0 ]]
+  do
+    pending=$(squeue --noheader --array -j "${SLURM_JOB_ID}" -t PD | wc -l)
+    running=$(squeue --noheader --array -j "${SLURM_JOB_ID}" -t R | wc -l)
+    total=$(squeue --noheader --array -j "${SLURM_JOB_ID}" | wc -l)
+    current_time=$(date)
+    echo "${current_time}: Job ${SLURM_JOB_ID}: ${total} runs found (${pending} pending, ${running} running)"
+    if [[ "${total}" -gt 0 ]]
+    then
+      sleep 10
+    fi
+  done
+}
+
+if [[ -z "${target_minutes}" ]]
 then
-  echo "Submitting the SLURM job failed!"
-  exit 1
+  # Adjust size of slurm array
+  sed "s/--array=1-.*/--array=1-$(wc -l < "${csv_file}")/g" array_job.sh > tmpfile && mv tmpfile array_job.sh
+  submit_and_wait array_job.sh "${csv_file}"
+  exit 0
 fi
 
-echo "SLURM job with ID ${SLURM_JOB_ID} submitted!"
-total=1
-# periodically look for jobs pending/running
-while [[ "${total}" -gt 0 ]]
+round=1
+while true
 do
-  pending=$(squeue --noheader --array -j "${SLURM_JOB_ID}" -t PD | wc -l)
-  running=$(squeue --noheader --array -j "${SLURM_JOB_ID}" -t R | wc -l)
-  total=$(squeue --noheader --array -j "${SLURM_JOB_ID}" | wc -l)
-  current_time=$(date)
-  echo "${current_time}: Job ${SLURM_JOB_ID}: ${total} runs found (${pending} pending, ${running} running)"
-  if [[ "${total}" -gt 0 ]]
+  plan_dir="${csv_file%.csv}-plan${round}"
+  # shellcheck disable=SC2086
+  num_tasks=$(poetry run flapy plan pack "${csv_file}" --out "${plan_dir}" \
+    --target-minutes "${target_minutes}" ${FLAPY_PLAN_OPTIONS}) || exit 1
+  echo "Grouped the projects of ${csv_file} into ${num_tasks} tasks in ${plan_dir}"
+  sed "s/--array=1-.*/--array=1-${num_tasks}/g" array_plan_job.sh > tmpfile && mv tmpfile array_plan_job.sh
+  submit_and_wait array_plan_job.sh "${plan_dir}"
+
+  remaining=$(poetry run flapy plan requeue "${plan_dir}" --out "${plan_dir}/requeue.csv")
+  if [[ "${remaining}" -eq 0 ]]
+  then
+    break
+  fi
+  echo "${remaining} projects did not finish, see ${plan_dir}/requeue.csv"
+  if [[ "${round}" -ge "${max_rounds}" ]]
   then
-    sleep 10
+    exit 1
   fi
+  csv_file="${plan_dir}/requeue.csv"
+  # A project may have been killed with its task because it ran longer than
+  # estimated, thus run every project of the next round in a task of its own
+  target_minutes=0
+  round=$((round + 1))
 done
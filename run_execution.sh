@@ -41,7 +41,7 @@ START_TIME=$(date +%s)
 
 CWD=$(pwd)
 SCRATCH_ANALYSIS_DIR=$(pwd)
-SCRATCH_RESULTS_DIR="$(pwd)/flapy-results"
+SCRATCH_RESULTS_DIR="${FLAPY_RESULTS_DIR:-$(pwd)/flapy-results}"
 mkdir -p "${SCRATCH_RESULTS_DIR}"
 RESULT_DIR=$(mktemp -d "${SCRATCH_RESULTS_DIR}/${PROJECT_NAME}__XXXXX")
 
@@ -74,9 +74,18 @@ debug_echo "Using $(python --version) in $(which python)"
 
 REPOSITORY_DIR="${LOCAL_PROJECT_DIR}/${PROJECT_NAME}"
 debug_echo "Checkout Repository into ${REPOSITORY_DIR}"
-git clone "${PROJECT_URL}" "${REPOSITORY_DIR}"
-cd "${REPOSITORY_DIR}" || exit 1
-git reset --hard "${PROJECT_HASH}" || exit 1
+if [[ -d "${REPOSITORY_DIR}/.git" ]]; then
+  # Checked out ahead by the campaign, see flapy/prefetch.py
+  git -C "${REPOSITORY_DIR}" reset --hard "${PROJECT_HASH}" || exit 1
+elif [[ -n "${FLAPY_GIT_CACHE}" ]]; then
+  # Clone from a local mirror of the repository, see flapy/git_cache.py
+  flapy git-cache --cache "${FLAPY_GIT_CACHE}" \
+    checkout "${PROJECT_URL}" "${PROJECT_HASH}" "${REPOSITORY_DIR}" || exit 1
+else
+  git clone "${PROJECT_URL}" "${REPOSITORY_DIR}"
+  cd "${REPOSITORY_DIR}" || exit 1
+  git reset --hard "${PROJECT_HASH}" || exit 1
+fi
 cd "${LOCAL_PROJECT_DIR}" || exit 1
 
 # Log further information
@@ -111,7 +120,8 @@ flakyanalysis \
   --output "${LOCAL_PROJECT_DIR}/deterministic/output.txt" \
   --deterministic \
   --trace "${FUNC_TO_TRACE}" \
-  --tests-to-be-run "${TESTS_TO_BE_RUN}"
+  --tests-to-be-run "${TESTS_TO_BE_RUN}" \
+  ${FLAPY_WHEELHOUSE:+--wheelhouse "${FLAPY_WHEELHOUSE}"}
 
 debug_echo "Deactivate Virtual Environment"
 deactivate
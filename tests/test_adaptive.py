@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+
+from flapy.adaptive import AdaptiveBudget, flake_rate_interval
+
+
+def write_xml(path: Path, outcomes) -> str:
+    cases = "".join(
+        f'<testcase classname="tests.test_a" name="{name}[{i}-2]" time="{time}">'
+        f"{'<failure/>' if failed else ''}</testcase>"
+        for name, failed, time in outcomes
+        for i in (1, 2)
+    )
+    path.write_text(f"<testsuites><testsuite>{cases}</testsuite></testsuites>")
+    return str(path)
+
+
+def test_flake_rate_interval():
+    assert flake_rate_interval(0, 10, 0.95) == (0.0, pytest.approx(1 - 0.025**0.1))
+    lower, upper = flake_rate_interval(3, 10, 0.95)
+    assert lower == pytest.approx(0.0667, abs=1e-4)
+    assert upper == pytest.approx(0.6525, abs=1e-4)
+    assert flake_rate_interval(0, 0, 0.95) == (0.0, 1.0)
+
+
+def test_adaptive_budget(tmp_path: Path):
+    budget = AdaptiveBudget(min_runs=2, confidence=0.95, flake_rate=0.5)
+    for i in range(2):
+        budget.record(
+            write_xml(
+                tmp_path / f"out{i}.xml",
+                [("test_stable", False, 0.1), ("test_fail", True, 0.1)]
+                + [("test_flaky", i == 1, 0.1), ("test_slow", False, 0.1 + 3 * i)],
+            )
+        )
+    assert budget.settlement("tests/test_a.py::test_stable") == "stable"
+    assert budget.settlement("tests/test_a.py::test_flaky") == "flaky"
+    assert budget.unsettled() == [
+        "tests/test_a.py::test_fail",
+        "tests/test_a.py::test_slow",
+    ]
+
+    for i in range(2, 4):
+        budget.record(write_xml(tmp_path / f"out{i}.xml", [("test_fail", True, 0.1)]))
+    # Eight failures in a row: the pass rate is below 0.5 with 95% confidence
+    assert budget.settlement("tests/test_a.py::test_fail") == "confident"
+    assert budget.executions == 4 * 2 * 2 + 2 * 2
@@ -0,0 +1,37 @@
+import json
+from pathlib import Path
+
+from flapy.aggregation import ResultAggregator
+
+
+def _junit_xml(path: Path, failing: bool) -> str:
+    path.write_text(
+        "<testsuites><testsuite>"
+        '<testcase classname="tests.test_a" name="test_x">'
+        + ("<failure/>" if failing else "")
+        + "</testcase>"
+        '<testcase classname="tests.test_a" name="test_y"/>'
+        "</testsuite></testsuites>"
+    )
+    return str(path)
+
+
+def test_fold_and_resume(tmp_path: Path):
+    summary_file = str(tmp_path / "project_summary0.json")
+    aggregator = ResultAggregator("project", summary_file)
+    first = _junit_xml(tmp_path / "project_output0.xml", failing=False)
+    assert aggregator.fold(first) == []
+    assert aggregator.fold(first) == []
+    assert json.loads(Path(summary_file).read_text())["files"] == [first]
+
+    resumed = ResultAggregator("project", summary_file)
+    assert resumed.resume() == 1
+    assert resumed.has(first)
+    second = _junit_xml(tmp_path / "project_output1.xml", failing=True)
+    assert resumed.fold(second) == ["tests.test_a.test_x"]
+    assert resumed.tests["tests.test_a.test_x"] == {"passed": 1, "failed": 1}
+    assert resumed.tests["tests.test_a.test_y"] == {"passed": 2, "failed": 0}
+
+    summary = json.loads(Path(summary_file).read_text())
+    assert summary["flaky_tests"] == ["tests.test_a.test_x"]
+    assert summary["number_of_tests"] == 2
@@ -1,11 +1,20 @@
+import json
 import shutil
 import os
+import time
 from flapy import tempfile_seeded
 from flapy import __version__
-from flapy.analysis import FlakyAnalyser
+from flapy import analysis
+from flapy.analysis import (
+    FlakyAnalyser,
+    Iteration,
+    PyTestRunner,
+    VirtualEnvironment,
+)
 import test_resources
 import test_output
 from pathlib import Path
+import pytest
 
 
 def test_version():
@@ -117,3 +126,296 @@ def test_isolation():
     assert os.path.isfile(out_file)
 
     shutil.rmtree(tmp_dir)
+
+
+def test_parallel():
+    out_dir = Path(os.path.dirname(test_output.__file__)) / "analysis" / "test_parallel"
+
+    # Clean up out_dir
+    log_file = out_dir / "execution.log"
+    out_file = out_dir / "output.txt"
+    for path in out_dir.glob("*"):
+        if ".gitignore" not in path.name and "__pycache__" not in path.name:
+            rm_recursively(path)
+
+    tmp_dir = tempfile_seeded.mkdtemp()
+    print(f"Using temporary directory {tmp_dir}")
+
+    # fmt: off
+    args = [
+        "analysis.py",
+        "--logfile", str(log_file.absolute()),
+        "--repository", os.path.dirname(test_resources.__file__),
+        "--temp", tmp_dir,
+        "--number-test-runs", "3",
+        "--deterministic",
+        "--jobs", "2",
+        "--output", str(out_file.absolute()),
+        "--tests-to-be-run", "test_trace_me.py::test_quick_math"
+    ]
+    # fmt: on
+    analyser = FlakyAnalyser(args)
+    analyser.run()
+
+    # Every iteration wrote its results, none was lost to the parallel workers
+    for number in range(3, 6):
+        iteration = Iteration(
+            "test_resources", tmp_dir, number, "test_trace_me.py::test_quick_math"
+        )
+        assert os.path.isfile(iteration.xml_output_file)
+        assert os.path.isfile(iteration.results_file)
+    assert os.path.isdir(os.path.join(tmp_dir, "flapy_pytest_plugins"))
+    assert os.path.isfile(out_file)
+
+    shutil.rmtree(tmp_dir)
+
+
+def fake_create_environment(env_dir: str):
+    """Creates a minimal stand-in for a virtual environment"""
+    os.makedirs(os.path.join(env_dir, "bin"), exist_ok=True)
+    os.makedirs(os.path.join(env_dir, "lib", "site-packages"), exist_ok=True)
+    Path(env_dir, "bin", "activate").write_text("")
+
+
+def test_install_in_directory(tmp_path: Path):
+    fake_create_environment(str(tmp_path / "env"))
+    env = VirtualEnvironment("project", env_dir=str(tmp_path / "env"))
+    _, out, _ = env._run_shell(["pwd"], cwd=str(tmp_path))
+    assert out.strip() == str(tmp_path)
+
+
+def test_shared_environment_lifecycle(tmp_path: Path, monkeypatch):
+    repo = tmp_path / "project"
+    repo.mkdir()
+    (repo / "requirements.txt").write_text("./vendored/pkg\n")
+    pip_calls = []
+
+    def run_shell(self, commands, cwd=None):
+        pip_calls.append((commands, cwd))
+        return 0, "", ""
+
+    monkeypatch.setattr(analysis.virtenv, "create_environment", fake_create_environment)
+    monkeypatch.setattr(VirtualEnvironment, "_run_shell", run_shell)
+    # fmt: off
+    analyser = FlakyAnalyser([
+        "analysis.py",
+        "--logfile", str(tmp_path / "flapy.log"),
+        "--repository", str(repo),
+        "--temp", str(tmp_path),
+        "--number-test-runs", "1",
+        "--venv-lifecycle", "project",
+    ])
+    # fmt: on
+
+    analyser._provide_environment(PyTestRunner)
+    env_dir = analyser._env.env_dir
+    assert len(pip_calls) == 1
+    commands, cwd = pip_calls[0]
+    # The relative requirement is resolved against the repository
+    assert "./vendored/pkg" in commands[0]
+    assert cwd == str(repo)
+    assert not analyser._environment_modified()
+
+    # A test installing a package alters the fingerprint
+    Path(env_dir, "lib", "site-packages", "installed_by_test.py").write_text("")
+    assert analyser._environment_modified()
+    analyser._rebuild_environment(PyTestRunner)
+    assert not os.path.exists(env_dir)
+    assert len(pip_calls) == 2
+    assert not analyser._environment_modified()
+
+    rebuilt_dir = analyser._env.env_dir
+    analyser._release_environment()
+    assert analyser._env is None
+    assert not os.path.exists(rebuilt_dir)
+
+
+def test_abort_only_failing_entry(tmp_path: Path, monkeypatch):
+    repo = tmp_path / "project"
+    repo.mkdir()
+    # fmt: off
+    analyser = FlakyAnalyser([
+        "analysis.py",
+        "--logfile", str(tmp_path / "flapy.log"),
+        "--repository", str(repo),
+        "--temp", str(tmp_path),
+        "--number-test-runs", "3",
+        "--tests-to-be-run", "test_a.py test_b.py",
+    ])
+    # fmt: on
+    runs = []
+
+    def run_iteration(runner_class, iteration, tmp_dir_path, **kwargs):
+        runs.append((iteration.test_to_be_run, iteration.number))
+        if iteration.test_to_be_run == "test_a.py":
+            return "", "bash: runexec: command not found", None
+        Path(iteration.xml_output_file).write_text(
+            '<testsuite><testcase classname="test_b" name="test_b"/></testsuite>'
+        )
+        return "", "", None
+
+    monkeypatch.setattr(analyser, "_run_iteration", run_iteration)
+    iterations = analyser._iterations(0)
+
+    assert not analyser._run_sequentially(PyTestRunner, iterations, "unused")
+    # The failing entry is given up after two iterations, the other one is run
+    assert runs == [
+        ("test_a.py", 0),
+        ("test_a.py", 1),
+        ("test_b.py", 0),
+        ("test_b.py", 1),
+        ("test_b.py", 2),
+    ]
+    report = json.loads(
+        (tmp_path / "project_infrastructure_failuretest_a.py.json").read_text()
+    )
+    assert report["tests_to_be_run"] == "test_a.py"
+    assert report["skipped_iterations"] == 1
+    assert analyser._run_sequentially(PyTestRunner, iterations[:3], "unused")
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--adaptive", "--jobs", "2"],
+        ["--two-phase", "--zygote"],
+        ["--order-schedule", "pairs", "--jobs", "2"],
+        ["--zygote", "--jobs", "2"],
+        ["--zygote", "--workspace-reset", "delta"],
+    ],
+)
+def test_reject_unsupported_modes(tmp_path: Path, options):
+    args = ["analysis.py", "--repository", str(tmp_path), "--temp", str(tmp_path)]
+    with pytest.raises(SystemExit):
+        FlakyAnalyser(args + options)
+    # Planned orders only apply to random orders
+    FlakyAnalyser(
+        args
+        + ["--logfile", str(tmp_path / "flapy.log"), "--deterministic"]
+        + ["--order-schedule", "pairs", "--jobs", "2"]
+    )
+
+
+class FakeRunner(PyTestRunner):
+    """Writes a JUnit XML file instead of running the tests"""
+
+    def run(self):
+        Path(self._xml_output_file).write_text(
+            '<testsuite><testcase classname="test_a" name="test_a" time="0.5"/>'
+            "</testsuite>"
+        )
+        return "", ""
+
+
+def test_parallel_with_duration_store(tmp_path: Path):
+    repo = tmp_path / "project"
+    repo.mkdir()
+    (repo / "test_a.py").write_text("def test_a():\n    pass\n")
+    # fmt: off
+    analyser = FlakyAnalyser([
+        "analysis.py",
+        "--logfile", str(tmp_path / "flapy.log"),
+        "--repository", str(repo),
+        "--temp", str(tmp_path),
+        "--number-test-runs", "4",
+        "--jobs", "2",
+        "--duration-store", str(tmp_path / "durations.sqlite"),
+        "--project-hash", "abc",
+    ])
+    # fmt: on
+    iterations = analyser._iterations(0)
+    analyser._run_iterations_in_parallel(
+        FakeRunner,
+        iterations,
+        analysis.FileUtils.get_available_tempdir_path(str(tmp_path)),
+        2,
+    )
+
+    for iteration in iterations:
+        assert os.path.isfile(iteration.xml_output_file)
+    # The parent recorded the durations of all iterations
+    assert analyser._durations.samples("abc") == {"test_a.py::test_a": [0.5] * 4}
+
+
+def test_longest_first_with_several_tests_to_be_run(tmp_path: Path):
+    # fmt: off
+    analyser = FlakyAnalyser([
+        "analysis.py",
+        "--logfile", str(tmp_path / "flapy.log"),
+        "--repository", str(tmp_path),
+        "--temp", str(tmp_path),
+        "--number-test-runs", "2",
+        "--tests-to-be-run", "test_a.py test_b.py",
+        "--duration-store", str(tmp_path / "durations.sqlite"),
+        "--project-hash", "abc",
+    ])
+    # fmt: on
+    analyser._durations.record(
+        "abc", [("test_a.py::test_a", 1.0), ("test_b.py::test_b", 2.0)]
+    )
+    ordered = analyser._longest_first(analyser._iterations(0))
+    assert [(it.test_to_be_run, it.number) for it in ordered] == [
+        ("test_b.py", 0),
+        ("test_b.py", 1),
+        ("test_a.py", 0),
+        ("test_a.py", 1),
+    ]
+
+
+class SlowFakeRunner(FakeRunner):
+    """Keeps its workspace busy, such that the iterations overlap"""
+
+    def run(self):
+        time.sleep(0.5)
+        return super().run()
+
+
+def test_parallel_with_several_tests_to_be_run(tmp_path: Path):
+    repo = tmp_path / "project"
+    repo.mkdir()
+    (repo / "test_a.py").write_text("def test_a():\n    pass\n")
+    (repo / "test_b.py").write_text("def test_b():\n    pass\n")
+    # fmt: off
+    analyser = FlakyAnalyser([
+        "analysis.py",
+        "--logfile", str(tmp_path / "flapy.log"),
+        "--repository", str(repo),
+        "--temp", str(tmp_path),
+        "--number-test-runs", "1",
+        "--jobs", "2",
+        "--tests-to-be-run", "test_a.py test_b.py",
+    ])
+    # fmt: on
+    iterations = analyser._iterations(0)
+    # The iteration numbers repeat for each entry
+    assert [iteration.number for iteration in iterations] == [0, 0]
+    analyser._run_iterations_in_parallel(
+        SlowFakeRunner,
+        iterations,
+        analysis.FileUtils.get_available_tempdir_path(str(tmp_path)),
+        2,
+    )
+
+    for iteration in iterations:
+        assert os.path.isfile(iteration.xml_output_file)
+
+
+@pytest.mark.parametrize("runner_class", [PyTestRunner, analysis.RandomPyTestRunner])
+def test_single_timeout_argument(runner_class):
+    parser = FlakyAnalyser._create_parser()
+    args = ["--repository", "project", "--temp", "tmp"]
+    config = parser.parse_args(args)
+    command = runner_class("project", "project", config)._pytest_arguments(
+        "project", "tests", "out.xml", None
+    )
+    assert command.split().count("--timeout=10") == 1
+
+    config = parser.parse_args(
+        args + ["--adaptive-timeouts", "--timeout-ceiling", "60"]
+    )
+    command = runner_class("project", "project", config)._pytest_arguments(
+        "project", "tests", "out.xml", None
+    )
+    assert [arg for arg in command.split() if arg.startswith("--timeout")] == [
+        "--timeout=60"
+    ]
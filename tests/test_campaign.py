@@ -0,0 +1,143 @@
+import io
+import json
+import os
+import stat
+import subprocess
+from pathlib import Path
+
+from flapy import campaign
+from flapy.campaign import (
+    DONE,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    Campaign,
+    CampaignState,
+    EventLog,
+    read_csv,
+)
+
+SCRIPT = """#!/bin/sh
+echo "$1 $7" >> "$(dirname "$0")/calls.txt"
+case "$1" in
+    slow) sleep 30 ;;
+    bad) exit 3 ;;
+esac
+"""
+
+
+def _setup(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(campaign, "POLL_INTERVAL", 0.05)
+    script = tmp_path / "run_execution.sh"
+    script.write_text(SCRIPT)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    csv_file = tmp_path / "input.csv"
+    csv_file.write_text(
+        "PROJECT_NAME,PROJECT_URL,PROJECT_HASH,FUNCS,TESTS,NUM_RUNS\r\n"
+        "ok,file:///ok,abc,,,5\r\n"
+        "bad,file:///bad,abc,,,5\r\n"
+        "slow,file:///slow,abc,,,5\r\n"
+        "traced,file:///traced,abc,mod.func,,5\r\n"
+    )
+    return str(script), str(csv_file)
+
+
+def _run(tmp_path: Path, script: str, csv_file: str, events: io.StringIO):
+    state = CampaignState(str(tmp_path / "state.json"))
+    state.recover()
+    return Campaign(
+        read_csv(csv_file),
+        state,
+        EventLog(events),
+        script=script,
+        local_dir=str(tmp_path / "local"),
+        log_dir=str(tmp_path / "logs"),
+        jobs=3,
+        timeout=1,
+    ).run()
+
+
+def test_campaign_runs_concurrently_and_resumes(tmp_path: Path, monkeypatch):
+    script, csv_file = _setup(tmp_path, monkeypatch)
+    projects = read_csv(csv_file)
+    assert [project.key for project in projects] == [
+        "2:ok",
+        "3:bad",
+        "4:slow",
+        "5:traced",
+    ]
+    assert projects[3].funcs_to_trace == "mod.func"
+
+    events = io.StringIO()
+    counts = _run(tmp_path, script, csv_file, events)
+    assert counts == {QUEUED: 0, RUNNING: 0, DONE: 2, FAILED: 2}
+    state = json.loads((tmp_path / "state.json").read_text())
+    assert state["3:bad"]["returncode"] == 3
+    assert state["4:slow"]["timed_out"]
+    assert os.path.isdir(state["2:ok"]["local_project_dir"])
+    records = [json.loads(line) for line in events.getvalue().splitlines()]
+    assert sorted(r["key"] for r in records if r["event"] == "end") == sorted(state)
+    assert (tmp_path / "logs" / "2_ok.log").exists()
+
+    # A project left running by a crash is run again, the others are not
+    state["2:ok"]["status"] = RUNNING
+    (tmp_path / "state.json").write_text(json.dumps(state))
+    counts = _run(tmp_path, script, csv_file, io.StringIO())
+    assert counts[DONE] == 2
+    calls = (tmp_path / "calls.txt").read_text().split("\n")
+    assert [call.split()[0] for call in calls if call].count("ok") == 2
+    assert len([call for call in calls if call]) == 5
+    # Traced projects are analysed in the same directory every time
+    assert [call.split()[1] for call in calls if call.startswith("traced")] == [
+        str(tmp_path / "local" / "traced" / "4c8194cd")
+    ]
+
+
+def test_campaign_prefetches(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(campaign, "POLL_INTERVAL", 0.05)
+    origin = tmp_path / "origin"
+    subprocess.run(["git", "init", "--quiet", str(origin)], check=True)
+    (origin / "file.txt").write_text("content")
+    subprocess.run(["git", "-C", str(origin), "add", "file.txt"], check=True)
+    subprocess.run(
+        ["git", "-C", str(origin), "-c", "user.name=FlaPy", "-c"]
+        + ["user.email=flapy@example.org", "commit", "--quiet", "-m", "init"],
+        check=True,
+    )
+    script = tmp_path / "run_execution.sh"
+    script.write_text(
+        "#!/bin/sh\n"
+        'test -f "$7/$1/file.txt" && echo "$1" >> "$(dirname "$0")/prepared.txt"\n'
+        "sleep 0.5\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    csv_file = tmp_path / "input.csv"
+    csv_file.write_text(
+        f"first,{origin.as_uri()},HEAD\n"
+        f"second,{origin.as_uri()},HEAD\n"
+        f"missing,{(tmp_path / 'missing').as_uri()},HEAD\n"
+    )
+
+    events = io.StringIO()
+    counts = Campaign(
+        read_csv(str(csv_file)),
+        CampaignState(str(tmp_path / "state.json")),
+        EventLog(events),
+        script=str(script),
+        local_dir=str(tmp_path / "local"),
+        log_dir=str(tmp_path / "logs"),
+        jobs=1,
+        prefetch=2,
+    ).run()
+    assert counts[DONE] == 3
+    records = [json.loads(line) for line in events.getvalue().splitlines()]
+    prepared = {r["key"]: r["succeeded"] for r in records if r["event"] == "prepared"}
+    assert prepared == {"1:first": True, "2:second": True, "3:missing": False}
+    # The second project was checked out while the first one ran
+    started = {r["key"]: r for r in records if r["event"] == "start"}
+    assert started["2:second"]["prepared"]
+    assert started["2:second"]["setup_hidden_seconds"] > 0
+    assert not started["3:missing"]["prepared"]
+    assert (tmp_path / "prepared.txt").read_text().split() == ["first", "second"]
+    summary = [r for r in records if r["event"] == "prefetch"][0]
+    assert 0 < summary["hidden_seconds"] <= summary["setup_seconds"]
@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+
+from flapy.campaign import DONE, FAILED, QUEUED, RUNNING, CampaignState, read_csv
+from flapy.cluster_plan import (
+    Estimate,
+    Estimator,
+    campaign_history,
+    first_fit_decreasing,
+    pack,
+    unfinished,
+)
+from flapy.durations import DurationStore
+
+
+def test_first_fit_decreasing():
+    estimates = [Estimate(None, seconds, "fallback") for seconds in [2, 5, 4, 7, 1]]
+    groups = first_fit_decreasing(estimates, capacity=8)
+    assert [[e.seconds for e in group] for group in groups] == [[7, 1], [5, 2], [4]]
+    groups = first_fit_decreasing(estimates, capacity=0)
+    assert len(groups) == 5
+
+
+def test_pack_and_requeue(tmp_path: Path):
+    csv_file = tmp_path / "input.csv"
+    csv_file.write_text(
+        "PROJECT_NAME,PROJECT_URL,PROJECT_HASH,FUNCS,TESTS,NUM_RUNS\n"
+        "known,file:///known,aaa,,,5\n"
+        "measured,file:///measured,bbb,,tests/test_a.py,10\n"
+        "unknown1,file:///unknown1,ccc,,,5\n"
+        "unknown2,file:///unknown2,ddd,,,5\n"
+    )
+    old_state = CampaignState(str(tmp_path / "old.state.json"))
+    old_state.projects = {
+        "2:known": {"project": "known", "status": DONE, "start": 0, "end": 3000},
+        "3:unknown1": {"project": "unknown1", "status": RUNNING, "start": 0},
+    }
+    old_state.save()
+    with DurationStore(str(tmp_path / "durations.sqlite")) as store:
+        store.record("bbb", [("tests/test_a.py::test_x", 6.0)])
+        store.record("bbb", [("tests/test_b.py::test_y", 600.0)])
+        estimator = Estimator(
+            campaign_history([str(tmp_path / "old.state.json")]),
+            store,
+            setup=60,
+            fallback=1200,
+        )
+        groups = pack(str(csv_file), str(tmp_path / "plan"), estimator, 3600)
+
+    # known: 3000s, measured: 60 + 10 * 6 = 120s, unknown1/2: 1200s each
+    assert [[e.project.name for e in group] for group in groups] == [
+        ["known", "measured"],
+        ["unknown1", "unknown2"],
+    ]
+    plan = json.loads((tmp_path / "plan" / "plan.json").read_text())
+    assert [p["source"] for p in plan[0]["projects"]] == ["campaign", "durations"]
+    assert plan[1]["seconds"] == 2400
+    task_2 = tmp_path / "plan" / "task_2.csv"
+    assert task_2.read_text() == (
+        "unknown1,file:///unknown1,ccc,,,5\nunknown2,file:///unknown2,ddd,,,5\n"
+    )
+
+    # The first task finished, the second one was killed while running unknown1
+    task_1 = tmp_path / "plan" / "task_1.csv"
+    for task_file, statuses in [(task_1, [DONE, FAILED]), (task_2, [RUNNING, QUEUED])]:
+        state = CampaignState(str(task_file) + ".state.json")
+        state.add(read_csv(str(task_file)))
+        for key, status in zip(list(state.projects), statuses):
+            state.update(key, status=status)
+    assert [project.name for project in unfinished(str(tmp_path / "plan"))] == [
+        "unknown1",
+        "unknown2",
+    ]
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import pytest
+
+from flapy.coverage_policy import CoverageOverhead, wants_coverage
+
+
+def test_wants_coverage():
+    assert [wants_coverage("first", i, 3) for i in range(4)] == [1, 0, 0, 0]
+    assert [wants_coverage("sampled", i, 3) for i in range(7)] == [
+        1,
+        0,
+        0,
+        1,
+        0,
+        0,
+        1,
+    ]
+    assert not any(wants_coverage("off", i, 3) for i in range(4))
+    assert all(wants_coverage("always", i, 3) for i in range(4))
+
+
+def _junit_xml(path: Path, durations) -> str:
+    path.write_text(
+        "<testsuites><testsuite>"
+        + "".join(
+            f'<testcase classname="tests.test_a" name="{name}" time="{time}"/>'
+            for name, time in durations.items()
+        )
+        + "</testsuite></testsuites>"
+    )
+    return str(path)
+
+
+def test_coverage_overhead(tmp_path: Path):
+    overhead = CoverageOverhead()
+    overhead.record(
+        _junit_xml(tmp_path / "0.xml", {"test_x": 3.0, "test_y": 1.0}), True
+    )
+    assert overhead.estimate() is None
+    overhead.record(
+        _junit_xml(tmp_path / "1.xml", {"test_x": 2.0, "test_y": 0.0}), False
+    )
+    factor, seconds = overhead.estimate()
+    assert factor == pytest.approx(2.0)
+    assert seconds == pytest.approx(2.0)
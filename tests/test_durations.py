@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import pytest
+
+from flapy.durations import MAX_SAMPLES, DurationStore, derive_timeouts, percentile
+
+
+def test_percentile():
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 90) == pytest.approx(4.6)
+
+
+def test_store(tmp_path: Path):
+    path = str(tmp_path / "durations.sqlite")
+    with DurationStore(path) as store:
+        store.record(
+            "abc",
+            [
+                ("tests/test_a.py::test_x[1-2]", 1.0),
+                ("tests/test_a.py::test_x[2-2]", 3.0),
+                ("tests/test_b.py::test_y", 10.0),
+            ],
+        )
+        store.record("def", [("tests/test_a.py::test_x", 100.0)])
+
+    with DurationStore(path) as store:
+        store.record("abc", [("tests/test_a.py::test_x", 2.0)])
+        assert store.percentile("abc", "tests/test_a.py::test_x[1-2]", 50) == 2.0
+        assert store.percentile("abc", "tests/test_a.py::test_z", 50) is None
+        assert store.estimate("abc") == 12.0
+        assert store.estimate("abc", ["tests/test_a.py"]) == 2.0
+        assert store.estimate("abc", ["tests/test_c.py"]) == 0
+        rows = store.export()
+        assert [(row["project"], row["nodeid"], row["runs"]) for row in rows] == [
+            ("abc", "tests/test_a.py::test_x", 3),
+            ("abc", "tests/test_b.py::test_y", 1),
+            ("def", "tests/test_a.py::test_x", 1),
+        ]
+
+        store.record("abc", [("tests/test_b.py::test_y", 1.0)] * MAX_SAMPLES)
+        assert store.samples("abc")["tests/test_b.py::test_y"] == [1.0] * MAX_SAMPLES
+
+
+def test_derive_timeouts():
+    timeouts = derive_timeouts(
+        {"fast": [0.01, 0.02], "slow": [3.0, 3.2], "hung": [120.0]},
+        factor=5,
+        floor=2,
+        ceiling=60,
+    )
+    assert timeouts == {"fast": 2.0, "slow": 16.0, "hung": 60.0}
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from flapy.failures import FailureTracker, InfrastructureFailure, classify_run
+from flapy.install_planner import InstallReport
+
+
+def test_classify_run(tmp_path: Path):
+    xml = str(tmp_path / "output.xml")
+    failed_install = InstallReport(installed=["pytest"], failed=["numpy==0.1"])
+
+    assert classify_run("", "", failed_install, xml)[0] == InfrastructureFailure.INSTALL
+    assert (
+        classify_run("", "bash: runexec: command not found", None, xml)[0]
+        == InfrastructureFailure.RUNEXEC
+    )
+    assert (
+        classify_run("Interrupted: 1 error during collection", "", None, xml)[0]
+        == InfrastructureFailure.COLLECTION
+    )
+    assert classify_run("", "", None, xml)[0] == InfrastructureFailure.NO_XML
+
+    Path(xml).write_text(
+        '<testsuite><testcase classname="" name="tests.test_a">'
+        '<error message="collection failure">ImportError</error>'
+        "</testcase></testsuite>"
+    )
+    assert classify_run("", "", None, xml) == (
+        InfrastructureFailure.COLLECTION,
+        "Could not collect tests.test_a",
+    )
+    Path(xml).write_text(
+        '<testsuite><testcase classname="tests.test_a" name="test_a"/></testsuite>'
+    )
+    assert classify_run("", "", failed_install, xml) == (None, "")
+
+
+def test_failure_tracker():
+    tracker = FailureTracker(2)
+    assert not tracker.record(InfrastructureFailure.NO_XML)
+    assert not tracker.record(InfrastructureFailure.INSTALL)
+    assert tracker.record(InfrastructureFailure.INSTALL)
+
+    # Once the tests ran, failures do not abort the project
+    tracker = FailureTracker(1)
+    assert not tracker.record(None)
+    assert not tracker.record(InfrastructureFailure.INSTALL)
+    assert tracker.failures == {InfrastructureFailure.INSTALL: 1}
+    assert not FailureTracker(0).record(InfrastructureFailure.INSTALL)
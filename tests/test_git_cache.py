@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import subprocess
+from pathlib import Path
+
+from flapy.git_cache import GitMirrorCache
+
+
+def _commit(repo: Path, content: str) -> str:
+    (repo / "file.txt").write_text(content)
+    subprocess.run(["git", "-C", str(repo), "add", "file.txt"], check=True)
+    subprocess.run(
+        [
+            "git",
+            "-C",
+            str(repo),
+            "-c",
+            "user.name=FlaPy",
+            "-c",
+            "user.email=flapy@example.org",
+            "commit",
+            "--quiet",
+            "-m",
+            content,
+        ],
+        check=True,
+    )
+    return subprocess.run(
+        ["git", "-C", str(repo), "rev-parse", "HEAD"],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+def _origin_repo(tmp_path: Path) -> Path:
+    repo = tmp_path / "origin"
+    repo.mkdir()
+    subprocess.run(["git", "init", "--quiet", str(repo)], check=True)
+    return repo
+
+
+def _checkout(root: str, url: str, git_hash: str, directory: str) -> bool:
+    return GitMirrorCache(root).checkout(url, git_hash, directory)
+
+
+def test_checkout(tmp_path: Path):
+    repo = _origin_repo(tmp_path)
+    url = repo.as_uri()
+    first = _commit(repo, "first")
+    cache = GitMirrorCache(str(tmp_path / "cache"))
+
+    assert cache.checkout(url, first, str(tmp_path / "a"))
+    assert (tmp_path / "a" / "file.txt").read_text() == "first"
+
+    # A commit the mirror does not have yet is fetched
+    second = _commit(repo, "second")
+    assert cache.checkout(url, second, str(tmp_path / "b"), dissociate=True)
+    assert (tmp_path / "b" / "file.txt").read_text() == "second"
+    assert os.listdir(tmp_path / "cache" / "mirrors") == [
+        cache.compute_key(url) + ".git"
+    ]
+    remote = subprocess.run(
+        ["git", "-C", str(tmp_path / "b"), "remote", "get-url", "origin"],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+    assert remote == url
+
+    assert not cache.checkout(url, "0" * 40, str(tmp_path / "c"))
+
+
+def test_concurrent_checkouts(tmp_path: Path):
+    repo = _origin_repo(tmp_path)
+    git_hash = _commit(repo, "content")
+    arguments = [
+        (str(tmp_path / "cache"), repo.as_uri(), git_hash, str(tmp_path / str(i)))
+        for i in range(4)
+    ]
+    with multiprocessing.Pool(4) as pool:
+        assert pool.starmap(_checkout, arguments) == [True] * 4
+    for i in range(4):
+        assert (tmp_path / str(i) / "file.txt").read_text() == "content"
+
+
+def test_evict(tmp_path: Path):
+    repos = []
+    for name in ["x", "y"]:
+        repo = tmp_path / name
+        repo.mkdir()
+        subprocess.run(["git", "init", "--quiet", str(repo)], check=True)
+        repos.append((repo.as_uri(), _commit(repo, name)))
+
+    cache = GitMirrorCache(str(tmp_path / "cache"), max_size=1)
+    for i, (url, git_hash) in enumerate(repos):
+        assert cache.checkout(url, git_hash, str(tmp_path / f"checkout{i}"))
+    # Both mirrors were used within the grace period
+    assert len(os.listdir(tmp_path / "cache" / "mirrors")) == 2
+
+    cache = GitMirrorCache(str(tmp_path / "cache"), max_size=1, grace_period=0)
+    assert cache.evict(keep=cache.compute_key(repos[1][0])) == [
+        cache.compute_key(repos[0][0])
+    ]
+
+    # An unlimited cache keeps all mirrors
+    cache = GitMirrorCache(str(tmp_path / "cache"), grace_period=0)
+    assert cache.evict() == []
+    assert len(os.listdir(tmp_path / "cache" / "mirrors")) == 1
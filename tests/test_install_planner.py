@@ -0,0 +1,59 @@
+from typing import List
+
+from flapy.install_planner import InstallPlanner
+
+
+class FakePip:
+    """Fails whenever a broken requirement is part of the invocation"""
+
+    def __init__(self, broken: List[str]):
+        self.broken = broken
+        self.invocations: List[List[str]] = []
+
+    def __call__(self, args: List[str]):
+        self.invocations.append(args)
+        return not any(b in args for b in self.broken), "", ""
+
+
+def test_single_pass():
+    pip = FakePip([])
+    report = InstallPlanner(pip).install(["a==1", "", "# comment", "b>=2", "a==1"])
+    assert report.succeeded
+    assert report.installed == ["a==1", "b>=2"]
+    assert pip.invocations == [["a==1", "b>=2"]]
+    assert "bisection" not in report.phases
+
+
+def test_bisection_finds_broken_requirements():
+    lines = [f"pkg{i}" for i in range(8)]
+    pip = FakePip(["pkg2", "pkg7"])
+    report = InstallPlanner(pip).install(lines)
+    assert sorted(report.failed) == ["pkg2", "pkg7"]
+    assert sorted(report.installed) == sorted(set(lines) - {"pkg2", "pkg7"})
+    assert set(report.phases) == {"single-pass", "bisection"}
+    assert report.pip_invocations < 2 * len(lines)
+
+
+def test_options_and_editables():
+    requirements, options = InstallPlanner.parse(
+        ["--index-url https://example.org", "-e .", "foo  # pinned later"]
+    )
+    assert requirements == [["-e", "."], ["foo"]]
+    assert options == ["--index-url", "https://example.org"]
+
+
+def test_markers_and_url_fragments():
+    requirements, options = InstallPlanner.parse(
+        [
+            'foo; python_version < "3.8"  # old interpreters only',
+            "bar @ https://example.org/bar.zip#egg=bar",
+            "-e git+https://example.org/baz.git#egg=baz",
+            "-r other.txt # more",
+        ]
+    )
+    assert requirements == [
+        ['foo; python_version < "3.8"'],
+        ["bar @ https://example.org/bar.zip#egg=bar"],
+        ["-e", "git+https://example.org/baz.git#egg=baz"],
+    ]
+    assert options == ["-r", "other.txt"]
@@ -0,0 +1,88 @@
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from flapy.junit import JunitTestcase, iter_testcases, junit_nodeid, read_hostname
+
+XML = """<?xml version="1.0" encoding="utf-8"?>
+<testsuites><testsuite name="pytest" hostname="node1">
+<testcase classname="tests.test_a" name="test_x" file="tests/test_a.py" time="0.5">
+<system-out>captured</system-out>
+</testcase>
+<testcase classname="tests.test_a.TestB" name="test_y[1-2]" time="0.25">
+<failure message="AssertionError: 1 != 2">ValueError: first
+AssertionError: 1 != 2
+</failure>
+<system-err>KeyError: key
+</system-err>
+</testcase>
+<testcase classname="tests.test_a" name="test_z"><skipped message="later"/></testcase>
+</testsuite></testsuites>
+"""
+
+
+def test_iter_testcases(tmp_path: Path):
+    xml_file = tmp_path / "output0.xml"
+    xml_file.write_text(XML)
+    records = list(iter_testcases(str(xml_file)))
+    assert records == [
+        JunitTestcase("tests.test_a", "test_x", "tests/test_a.py", 0.5),
+        JunitTestcase(
+            "tests.test_a.TestB",
+            "test_y[1-2]",
+            time=0.25,
+            result="failure",
+            message="AssertionError: 1 != 2",
+        ),
+        JunitTestcase("tests.test_a", "test_z", result="skipped", message="later"),
+    ]
+    assert records[1].nodeid == "tests/test_a.py::TestB::test_y"
+    assert records[1].failed and not records[2].failed
+
+    with open(xml_file, "rb") as file:
+        failed = list(iter_testcases(file, with_output=True))[1]
+    assert failed.result_text.endswith("AssertionError: 1 != 2\n")
+    assert failed.system_err == "KeyError: key\n"
+    assert read_hostname(str(xml_file)) == "node1"
+
+
+def test_junit_nodeid():
+    assert junit_nodeid("tests.test_a", "test_x[1-2]") == "tests/test_a.py::test_x"
+    assert (
+        junit_nodeid("tests.test_a.TestC", "test_p[a-2-2]")
+        == "tests/test_a.py::TestC::test_p[a]"
+    )
+
+
+def test_iter_testcases_yields_until_parse_error(tmp_path: Path):
+    xml_file = tmp_path / "output0.xml"
+    xml_file.write_text(
+        XML[: XML.index('<testcase classname="tests.test_a" name="test_z')]
+    )
+    records = []
+    with pytest.raises(Exception):
+        for record in iter_testcases(str(xml_file)):
+            records.append(record)
+    assert [record.name for record in records] == ["test_x", "test_y[1-2]"]
+
+
+def test_iter_testcases_memory_is_bounded(tmp_path: Path):
+    xml_file = tmp_path / "output0.xml"
+    output = "x" * 100_000
+    with open(xml_file, "w") as file:
+        file.write("<testsuites><testsuite>")
+        for i in range(300):
+            file.write(
+                f'<testcase classname="tests.test_a" name="test_{i}">'
+                f"<system-out>{output}</system-out></testcase>"
+            )
+        file.write("</testsuite></testsuites>")
+
+    tracemalloc.start()
+    count = sum(1 for _ in iter_testcases(str(xml_file)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert count == 300
+    # The file has 30 MB, a few captured outputs may be held at once
+    assert peak < 3_000_000
@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from flapy.analysis import PLUGIN_DIR
+from flapy.order import bucket_key, coverage, plan_orders, williams_rows
+
+
+def test_williams_rows_cover_all_adjacent_pairs():
+    for n in range(2, 8):
+        rows = williams_rows(n)
+        pairs = {(row[i], row[i + 1]) for row in rows for i in range(n - 1)}
+        assert len(pairs) == n * (n - 1)
+        assert len(rows) == (n if n % 2 == 0 else 2 * n)
+
+
+def test_bucket_key():
+    assert bucket_key("tests/test_a.py::TestC::test_x", "class") == (
+        "tests/test_a.py::TestC"
+    )
+    assert bucket_key("tests/test_a.py::test_x", "parent") == "tests/test_a.py"
+    assert bucket_key("tests/test_a.py::TestC::test_x", "module") == "tests/test_a.py"
+    assert bucket_key("tests/test_a.py::test_x", "package") == "tests"
+    assert bucket_key("tests/test_a.py::test_x", "global") == ""
+
+
+def test_plan_orders_keeps_buckets_together():
+    tests = [f"tests/test_{module}.py::test_{i}" for module in "abc" for i in range(3)]
+    orders, needed = plan_orders(tests, "module", "pairs", 2)
+    assert needed == 2
+    assert coverage(orders)["ordered_pairs_covered"] == len(tests) * (len(tests) - 1)
+    for order in orders:
+        modules = [bucket_key(test, "module") for test in order]
+        assert modules == sorted(modules, key=modules.index)
+
+    orders, needed = plan_orders(tests, "module", "adjacent", 6)
+    assert needed == 6
+    adjacent = {tuple(pair) for pair in coverage(orders)["adjacent_pairs"]}
+    assert all(
+        (first, second) in adjacent
+        for first in tests
+        for second in tests
+        if first != second
+        and bucket_key(first, "module") == bucket_key(second, "module")
+    )
+
+
+def test_plugin_runs_tests_in_order(tmp_path: Path):
+    (tmp_path / "test_a.py").write_text(
+        "def test_x():\n    pass\n\ndef test_y():\n    pass\n\ndef test_z():\n    pass\n"
+    )
+    order = ["test_a.py::test_z", "test_a.py::test_x"]
+    (tmp_path / "order.json").write_text(json.dumps(order))
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pytest",
+            "-p",
+            "flapy_order",
+            "-p",
+            "no:cacheprovider",
+            "--flapy-order=order.json",
+            "--flapy-order-record=record.json",
+            "test_a.py",
+        ],
+        cwd=tmp_path,
+        env=dict(os.environ, PYTHONPATH=PLUGIN_DIR),
+        check=True,
+        capture_output=True,
+    )
+    record = json.loads((tmp_path / "record.json").read_text())
+    assert record == order + ["test_a.py::test_y"]
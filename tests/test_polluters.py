@@ -0,0 +1,61 @@
+from pathlib import Path
+
+from flapy.polluters import PolluterCache, ddmin, failing_order
+
+XML = """<testsuites><testsuite>
+<testcase classname="tests.test_a" name="test_x[1-2]" time="0.1"/>
+<testcase classname="tests.test_a" name="test_x[2-2]" time="0.1"/>
+<testcase classname="tests.test_b.TestB" name="test_y[1-2]" time="0.1"/>
+<testcase classname="tests.test_b.TestB" name="test_y[2-2]" time="0.1"/>
+<testcase classname="tests.test_a" name="test_v[1-2]" time="0.1"><failure/></testcase>
+<testcase classname="tests.test_a" name="test_v[2-2]" time="0.1"><failure/></testcase>
+<testcase classname="tests.test_a" name="test_z[1-2]" time="0.1"/>
+</testsuite></testsuites>
+"""
+
+
+def test_ddmin_finds_single_polluter():
+    runs = []
+
+    def fails(tests):
+        runs.append(tests)
+        return "t13" in tests
+
+    candidates = [f"t{i}" for i in range(32)]
+    assert ddmin(candidates, fails) == ["t13"]
+    assert len(runs) <= 2 * 5
+
+
+def test_ddmin_finds_polluters_needed_together():
+    candidates = [f"t{i}" for i in range(20)]
+    assert ddmin(candidates, lambda tests: {"t3", "t17"} <= set(tests)) == [
+        "t3",
+        "t17",
+    ]
+
+
+def test_failing_order(tmp_path: Path):
+    xml_file = tmp_path / "project_output3.xml"
+    xml_file.write_text(XML)
+    assert failing_order(str(xml_file), "tests/test_a.py::test_v") == [
+        "tests/test_a.py::test_x",
+        "tests/test_b.py::TestB::test_y",
+    ]
+    assert failing_order(str(xml_file), "tests/test_a.py::test_z") is None
+
+    (tmp_path / "project_order_record3.json").write_text(
+        '["tests/test_b.py::TestB::test_y[1-2]", "tests/test_a.py::test_v[1-2]"]'
+    )
+    assert failing_order(str(xml_file), "tests/test_a.py::test_v") == [
+        "tests/test_b.py::TestB::test_y"
+    ]
+
+
+def test_polluter_cache(tmp_path: Path):
+    cache = PolluterCache(str(tmp_path / "polluters.json"))
+    assert cache.get("abc", "test_v") is None
+    cache.put("abc", "test_v", ["test_x"])
+    assert PolluterCache(str(tmp_path / "polluters.json")).get("abc", "test_v") == [
+        "test_x"
+    ]
+    assert cache.get("def", "test_v") is None
@@ -0,0 +1,150 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from flapy.analysis import PLUGIN_DIR
+from flapy.junit import iter_testcases
+from flapy.sidecar import iter_sidecar_testcases, read_summary, sidecar_file
+
+TESTS = """
+import sys
+import pytest
+
+@pytest.fixture
+def broken():
+    raise RuntimeError("setup")
+
+def test_pass():
+    pass
+
+def test_fail():
+    sys.stderr.write("KeyError: key\\n")
+    assert 1 == 2
+
+def test_error(broken):
+    pass
+
+@pytest.mark.skip(reason="later")
+def test_skip():
+    pass
+
+@pytest.mark.xfail
+def test_xfail():
+    assert False
+
+class TestA:
+    @pytest.mark.parametrize("x", [1, 2])
+    def test_param(self, x):
+        pass
+"""
+
+
+def test_plugin_writes_junit_equivalent_records(tmp_path: Path):
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "tests" / "test_a.py").write_text(TESTS)
+    xml_file = str(tmp_path / "project_output0.xml")
+    results_file = sidecar_file(xml_file)
+    assert results_file == str(tmp_path / "project_output0.jsonl")
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pytest",
+            "-p",
+            "flapy_results",
+            f"--flapy-results={results_file}",
+            f"--junitxml={xml_file}",
+            "-p",
+            "no:cacheprovider",
+            "tests",
+        ],
+        cwd=str(tmp_path),
+        env={**os.environ, "PYTHONPATH": PLUGIN_DIR},
+        stdout=subprocess.DEVNULL,
+        check=False,
+    )
+
+    summary = read_summary(results_file)
+    assert summary is not None
+    assert {k: summary[k] for k in ["passed", "failed", "error", "skipped"]} == {
+        "passed": 3,
+        "failed": 1,
+        "error": 1,
+        "skipped": 1,
+    }
+    assert summary["xfailed"] == 1
+    records = [
+        json.loads(line) for line in Path(results_file).read_text().split("\n")[:-2]
+    ]
+    assert [record["phase"] for record in records if record["outcome"] == "error"] == [
+        "setup"
+    ]
+
+    def key(case):
+        return case.classname, case.name, case.result
+
+    expected = sorted(iter_testcases(xml_file), key=key)
+    actual = sorted(iter_sidecar_testcases(results_file, with_output=True), key=key)
+    assert [key(case) for case in actual] == [key(case) for case in expected]
+    failed = next(case for case in actual if case.name == "test_fail")
+    assert failed.message == "assert 1 == 2"
+    assert failed.system_err == "KeyError: key\n"
+
+
+def test_truncated_sidecar(tmp_path: Path):
+    results_file = tmp_path / "project_output0.jsonl"
+    results_file.write_text(
+        '{"event": "test", "nodeid": "tests/test_a.py::TestA::test_x[1-2]", '
+        '"outcome": "passed", "phase": "call", "duration": 0.5, "rerun": 1}\n'
+        '{"event": "test", "nodeid": "tests/test_a.py::te'
+    )
+    cases = list(iter_sidecar_testcases(str(results_file)))
+    assert [(case.classname, case.name, case.time) for case in cases] == [
+        ("tests.test_a.TestA", "test_x[1-2]", 0.5)
+    ]
+    assert read_summary(str(results_file)) is None
+
+
+def test_timeouts_are_marked(tmp_path: Path):
+    (tmp_path / "test_t.py").write_text(
+        "import pytest\n"
+        "def test_hangs():\n"
+        "    pytest.fail('Timeout >3.0s')\n"
+        "def test_fails():\n"
+        "    assert False\n"
+    )
+    timeouts_file = tmp_path / "timeouts.json"
+    timeouts_file.write_text(json.dumps({"test_t.py::test_hangs": 3.0}))
+    xml_file = str(tmp_path / "project_output0.xml")
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pytest",
+            "-p",
+            "flapy_timeouts",
+            f"--flapy-timeouts={timeouts_file}",
+            "-p",
+            "flapy_results",
+            f"--flapy-results={sidecar_file(xml_file)}",
+            f"--junitxml={xml_file}",
+            "-p",
+            "no:cacheprovider",
+            "test_t.py",
+        ],
+        cwd=str(tmp_path),
+        env={**os.environ, "PYTHONPATH": PLUGIN_DIR},
+        stdout=subprocess.DEVNULL,
+        check=False,
+    )
+
+    for cases in [
+        iter_testcases(xml_file),
+        iter_sidecar_testcases(sidecar_file(xml_file)),
+    ]:
+        assert {case.name: case.timeout for case in cases} == {
+            "test_hangs": 3.0,
+            "test_fails": None,
+        }
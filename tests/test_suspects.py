@@ -0,0 +1,67 @@
+from pathlib import Path
+
+from flapy.suspects import rank_suspects, static_signals
+
+TEST_MODULE = """
+import time
+from random import randint
+import requests as r
+
+def test_first():
+    assert True
+
+def test_fails():
+    assert False
+
+def test_sleeps():
+    time.sleep(1)
+
+class TestNetwork:
+    def test_get(self):
+        r.get("https://example.org")
+
+    def test_dice(self):
+        assert randint(1, 6) < 7
+
+def test_last():
+    assert True
+"""
+
+XML = """<testsuites><testsuite>
+<testcase classname="tests.test_a" name="test_first[1-2]"/>
+<testcase classname="tests.test_a" name="test_fails[1-2]">
+<failure message="Failed: Timeout &gt;10.0s"/></testcase>
+<testcase classname="tests.test_a" name="test_sleeps[1-2]"/>
+<testcase classname="tests.test_a.TestNetwork" name="test_get[1-2]"/>
+<testcase classname="tests.test_a.TestNetwork" name="test_dice[1-2]"/>
+<testcase classname="tests.test_a" name="test_last[1-2]"/>
+</testsuite></testsuites>"""
+
+
+def test_static_signals(tmp_path: Path):
+    (tmp_path / "test_a.py").write_text(TEST_MODULE)
+    signals = static_signals(str(tmp_path / "test_a.py"), "test_a.py")
+    assert signals == {
+        "test_a.py::test_first": set(),
+        "test_a.py::test_fails": set(),
+        "test_a.py::test_sleeps": {"time"},
+        "test_a.py::TestNetwork::test_get": {"network"},
+        "test_a.py::TestNetwork::test_dice": {"random"},
+        "test_a.py::test_last": set(),
+    }
+
+
+def test_rank_suspects(tmp_path: Path):
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "tests" / "test_a.py").write_text(TEST_MODULE)
+    (tmp_path / "output.xml").write_text(XML)
+
+    suspects = rank_suspects([str(tmp_path / "output.xml")], str(tmp_path))
+    ranking = [(suspect.nodeid, suspect.reasons) for suspect in suspects]
+    assert ranking == [
+        ("tests/test_a.py::test_fails", ["failed", "timeout"]),
+        ("tests/test_a.py::test_sleeps", ["uses time", "next to a failed test"]),
+        ("tests/test_a.py::TestNetwork::test_dice", ["uses random"]),
+        ("tests/test_a.py::TestNetwork::test_get", ["uses network"]),
+        ("tests/test_a.py::test_first", ["next to a failed test"]),
+    ]
@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+
+from flapy.install_planner import InstallReport
+from flapy.venv_cache import VenvCache
+
+
+def fake_build(env_dir: str):
+    """Creates a minimal stand-in for a virtual environment"""
+    os.makedirs(os.path.join(env_dir, "bin"))
+    os.makedirs(os.path.join(env_dir, "lib", "site-packages"))
+    with open(os.path.join(env_dir, "bin", "activate"), "w") as file:
+        file.write(f'VIRTUAL_ENV="{env_dir}"\n')
+    with open(os.path.join(env_dir, "lib", "site-packages", "pkg.py"), "w") as file:
+        file.write("x = 1\n" * 1000)
+    return InstallReport(installed=["pytest==5.3.1"])
+
+
+def fingerprint(env_dir: str) -> str:
+    path = os.path.join(env_dir, "lib", "site-packages", "pkg.py")
+    return str(os.path.getsize(path))
+
+
+def test_hit_and_miss(tmp_path: Path):
+    cache = VenvCache(str(tmp_path / "cache"), 10 * 1024 ** 2)
+
+    first, hit = cache.provide(["pytest==5.3.1"], fake_build, fingerprint)
+    assert not hit
+    second, hit = cache.provide(["pytest==5.3.1"], fake_build, fingerprint)
+    assert hit
+    assert first != second
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+    # Scripts are relocated to the clone, the cached entry stays untouched
+    activate = Path(second) / "bin" / "activate"
+    assert activate.read_text() == f'VIRTUAL_ENV="{second}"\n'
+
+
+def test_key_depends_on_packages_and_version():
+    key = VenvCache.compute_key(["a", "b"], "CPython-3.7.9")
+    assert key == VenvCache.compute_key(["a", "b", ""], "CPython-3.7.9")
+    assert key != VenvCache.compute_key(["b", "a"], "CPython-3.7.9")
+    assert key != VenvCache.compute_key(["a", "b"], "CPython-3.8.1")
+    assert not VenvCache.is_cacheable(["-e .", "pytest"])
+
+
+def test_lru_eviction(tmp_path: Path):
+    cache = VenvCache(str(tmp_path / "cache"), 1)
+    cache.provide(["a"], fake_build, fingerprint)
+    cache.provide(["b"], fake_build, fingerprint)
+    entries = os.listdir(tmp_path / "cache" / "entries")
+    assert entries == [VenvCache.compute_key(["b"])]
+
+
+def test_failed_install_not_cached(tmp_path: Path):
+    cache = VenvCache(str(tmp_path / "cache"), 10 * 1024 ** 2)
+
+    def failing_build(env_dir: str):
+        fake_build(env_dir)
+        return InstallReport(failed=["no-such-package"])
+
+    env_dir, hit = cache.provide(["no-such-package"], failing_build, fingerprint)
+    assert not hit
+    # The environment is handed out, relocated like a clone
+    activate = Path(env_dir) / "bin" / "activate"
+    assert activate.read_text() == f'VIRTUAL_ENV="{env_dir}"\n'
+    assert os.listdir(tmp_path / "cache" / "entries") == []
+
+    _, hit = cache.provide(["no-such-package"], fake_build, fingerprint)
+    assert not hit
+    _, hit = cache.provide(["no-such-package"], fake_build, fingerprint)
+    assert hit
@@ -0,0 +1,80 @@
+import os
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from flapy.wheelhouse import Wheelhouse, normalize_requirement
+
+
+def _local_package(tmp_path: Path) -> Path:
+    """Creates a package that is only available from its path"""
+    package = tmp_path / "demo"
+    (package / "demo_pkg").mkdir(parents=True)
+    (package / "demo_pkg" / "__init__.py").write_text("VALUE = 42\n")
+    (package / "setup.py").write_text(
+        "from setuptools import setup\n"
+        'setup(name="demo-pkg", version="1.0", packages=["demo_pkg"])\n'
+    )
+    return package
+
+
+def test_normalize_requirement():
+    assert normalize_requirement("pytest==5.3.1  # for the tests") == "pytest==5.3.1"
+    assert normalize_requirement("# comment") == ""
+    assert normalize_requirement("-r other.txt") == ""
+
+
+def test_build_and_install_offline(tmp_path: Path):
+    wheelhouse = Wheelhouse(str(tmp_path / "wheels"))
+    package = _local_package(tmp_path)
+
+    assert wheelhouse.build([str(package), "", "# comment"]) == []
+    assert os.listdir(wheelhouse.directory) == ["demo_pkg-1.0-py3-none-any.whl"]
+    assert wheelhouse.build([str(tmp_path / "missing")]) == [str(tmp_path / "missing")]
+
+    target = tmp_path / "target"
+    process = subprocess.run(
+        [sys.executable, "-m", "pip", "install", "--target", str(target)]
+        + shlex.split(wheelhouse.install_options())
+        + ["demo-pkg"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+        check=False,
+    )
+    assert process.returncode == 0, process.stdout
+    assert (target / "demo_pkg" / "__init__.py").read_text() == "VALUE = 42\n"
+    assert wheelhouse.mark_used(process.stdout) == {"demo_pkg-1.0-py3-none-any.whl"}
+
+
+def test_evict_by_last_use(tmp_path: Path):
+    wheelhouse = Wheelhouse(str(tmp_path / "wheels"))
+    day = 24 * 60 * 60
+    for name, age in [
+        ("old-1.0-py3-none-any.whl", 10),
+        ("new-1.0-py3-none-any.whl", 1),
+    ]:
+        path = os.path.join(wheelhouse.directory, name)
+        Path(path).write_text("")
+        os.utime(path, (time.time() - age * day, time.time() - age * day))
+    (tmp_path / "wheels" / "notes.txt").write_text("")
+    os.utime(tmp_path / "wheels" / "notes.txt", (0, 0))
+
+    # Using a wheel renews it
+    wheelhouse.mark_used("Processing ./wheels/old-1.0-py3-none-any.whl")
+    assert wheelhouse.evict(5 * day) == []
+    assert wheelhouse.evict(0.5 * day) == ["new-1.0-py3-none-any.whl"]
+    assert sorted(os.listdir(wheelhouse.directory)) == [
+        "notes.txt",
+        "old-1.0-py3-none-any.whl",
+    ]
+
+
+def test_build_relative_to_checkout(tmp_path: Path):
+    wheelhouse = Wheelhouse(str(tmp_path / "wheels"))
+    _local_package(tmp_path)
+
+    assert wheelhouse.build(["./demo"], cwd=str(tmp_path)) == []
+    assert os.listdir(wheelhouse.directory) == ["demo_pkg-1.0-py3-none-any.whl"]
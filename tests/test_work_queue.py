@@ -0,0 +1,101 @@
+import io
+import json
+import multiprocessing
+import os
+import stat
+import time
+from pathlib import Path
+
+from flapy import campaign
+from flapy.campaign import DONE, FAILED, Campaign, CampaignState, EventLog, Project
+from flapy.work_queue import LEASED, PENDING, WorkQueue
+
+SCRIPT = """#!/bin/sh
+echo "$1" >> "$(dirname "$0")/calls.txt"
+mkdir -p "$FLAPY_RESULTS_DIR"
+touch "$FLAPY_RESULTS_DIR/$1"
+sleep 0.2
+test "$1" != "bad"
+"""
+
+
+def _worker(root: str, host: str, script: str, local_dir: str) -> None:
+    campaign.POLL_INTERVAL = 0.05
+    queue = WorkQueue(root, worker=host, lease_timeout=2)
+    Campaign(
+        [],
+        CampaignState(os.path.join(root, f"{host}.state.json")),
+        EventLog(io.StringIO()),
+        script=script,
+        local_dir=local_dir,
+        log_dir=os.path.join(root, "logs"),
+        jobs=2,
+        queue=queue,
+    ).run()
+
+
+def test_claim_and_requeue(tmp_path: Path):
+    queue = WorkQueue(str(tmp_path), worker="host1", lease_timeout=60)
+    projects = [Project("a", "file:///a", "abc", line=1), Project("b", "", "", line=2)]
+    assert queue.add(projects) == 2
+    assert queue.add(projects) == 0
+
+    first = queue.claim()
+    assert first.key == "1:a"
+    other = WorkQueue(str(tmp_path), worker="host2", lease_timeout=60)
+    assert other.claim().key == "2:b"
+    assert queue.claim() is None
+    assert queue.counts() == {PENDING: 0, LEASED: 2, DONE: 0, FAILED: 0}
+
+    # host2 dies, its lease becomes stale and is moved back to pending
+    lease = tmp_path / LEASED / "000002_b@host2"
+    os.utime(lease, (time.time() - 120, time.time() - 120))
+    assert queue.requeue_stale() == ["000002_b"]
+    assert other.heartbeat() == ["2:b"]
+    assert queue.claim().key == "2:b"
+    assert queue.complete("1:a", DONE, returncode=0)
+    assert not other.complete("2:b", DONE)
+
+    queue.release("2:b")
+    content = json.loads((tmp_path / PENDING / "000002_b").read_text())
+    assert content["attempts"] == 1
+    assert content["workers"] == ["host2", "host1"]
+    assert queue.counts() == {PENDING: 1, LEASED: 0, DONE: 1, FAILED: 0}
+
+
+def test_workers_on_several_hosts(tmp_path: Path):
+    script = tmp_path / "run_execution.sh"
+    script.write_text(SCRIPT)
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    root = tmp_path / "queue"
+    queue = WorkQueue(str(root), worker="submitter")
+    names = [f"p{i}" for i in range(12)] + ["bad"]
+    queue.add(
+        [Project(name, "", "abc", line=i) for i, name in enumerate(names, start=1)]
+    )
+    # A host died while running a project, its lease is never renewed
+    crashed = queue.claim()
+    os.utime(queue._leases[crashed.key], (time.time() - 60, time.time() - 60))
+
+    workers = [
+        multiprocessing.Process(
+            target=_worker,
+            args=(str(root), f"host{i}", str(script), str(tmp_path / f"local{i}")),
+        )
+        for i in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    assert queue.counts() == {PENDING: 0, LEASED: 0, DONE: 12, FAILED: 1}
+    calls = (tmp_path / "calls.txt").read_text().split()
+    assert sorted(calls) == sorted(names)
+    assert sorted(os.listdir(root / "results")) == sorted(names)
+    hosts = {
+        json.loads((root / DONE / name).read_text())["worker"]
+        for name in os.listdir(root / DONE)
+    }
+    assert len(hosts) > 1
@@ -0,0 +1,114 @@
+import os
+import shutil
+from pathlib import Path
+
+from flapy.workspace import (
+    CopyStrategy,
+    ExclusionSpec,
+    HardlinkStrategy,
+    WorkspaceSnapshot,
+    benchmark,
+    select_strategy,
+)
+
+
+def make_tree(root: Path) -> Path:
+    (root / "src" / "pkg").mkdir(parents=True)
+    (root / "src" / "pkg" / "mod.py").write_text("x = 1\n")
+    (root / "src" / "setup.py").write_text("setup()\n")
+    return root / "src"
+
+
+def test_copy_strategy(tmp_path: Path):
+    src = make_tree(tmp_path)
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    ignore = shutil.ignore_patterns("setup.py")
+    stats = CopyStrategy().copy_tree(src, dst, ignore=ignore)
+    assert (dst / "pkg" / "mod.py").read_text() == "x = 1\n"
+    assert not (dst / "setup.py").exists()
+    assert (stats.files_copied, stats.bytes_copied, stats.bytes_written) == (1, 6, 6)
+    assert (stats.files_skipped, stats.bytes_skipped) == (1, 8)
+
+
+def test_hardlink_strategy_protects_source(tmp_path: Path):
+    src = make_tree(tmp_path)
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    strategy = HardlinkStrategy()
+    stats = strategy.copy_tree(src, dst)
+    assert stats.bytes_written == 0
+    assert os.path.samefile(src / "setup.py", dst / "setup.py")
+    assert not os.access(src / "setup.py", os.W_OK) or os.geteuid() == 0
+
+    # The permissions of the source are restored once the copies are gone
+    shutil.rmtree(dst)
+    strategy.release(str(src))
+    assert os.access(src / "setup.py", os.W_OK)
+
+
+def test_select_and_benchmark(tmp_path: Path):
+    src = make_tree(tmp_path)
+    assert isinstance(select_strategy("copy", str(src), str(tmp_path)), CopyStrategy)
+    # Hard links make the source read-only, they are never selected automatically
+    assert not isinstance(
+        select_strategy("auto", str(src), str(tmp_path)), HardlinkStrategy
+    )
+    results = benchmark(str(src), str(tmp_path))
+    assert "copy" in [stats.strategy for stats in results]
+    assert all(stats.files_copied == 2 for stats in results)
+    assert sorted(os.listdir(tmp_path)) == ["src"]
+
+
+def test_exclusion_spec(tmp_path: Path):
+    src = make_tree(tmp_path)
+    (src / ".git").mkdir()
+    (src / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (src / "pkg" / "__pycache__").mkdir()
+    (src / "build").mkdir()
+    (src / "build" / "lib.so").write_text("binary")
+    (src / "pkg" / "data.log").write_text("log")
+    (src / "pkg" / "keep.log").write_text("log")
+    (src / ".gitignore").write_text("/build/\n*.log\n!keep.log\n")
+
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    spec = ExclusionSpec(str(src), honor_gitignore=True)
+    stats = CopyStrategy().copy_tree(src, dst, ignore=spec)
+    copied = sorted(
+        os.path.relpath(os.path.join(root, name), dst)
+        for root, _, files in os.walk(dst)
+        for name in files
+    )
+    assert copied == [".gitignore", "pkg/keep.log", "pkg/mod.py", "setup.py"]
+    assert (stats.files_skipped, stats.bytes_skipped) == (3, 30)
+
+    spec = ExclusionSpec(str(src), patterns=["pkg/*.log"])
+    assert spec(str(src / "pkg"), ["data.log", "mod.py"]) == {"data.log"}
+    assert spec(str(src), [".git", "build"]) == set()
+
+
+def test_workspace_snapshot_reset(tmp_path: Path):
+    src = make_tree(tmp_path)
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    CopyStrategy().copy_tree(src, dst)
+    snapshot = WorkspaceSnapshot(str(dst), str(src))
+
+    (dst / "pkg" / "mod.py").write_text("x = 2\n")
+    (dst / "setup.py").unlink()
+    (dst / "pkg" / "new").mkdir()
+    (dst / "pkg" / "new" / "out.txt").write_text("result")
+    assert snapshot.changes() == (
+        ["pkg/new", "pkg/new/out.txt"],
+        ["pkg/mod.py"],
+        ["setup.py"],
+    )
+
+    stats = snapshot.reset()
+    assert stats.verified
+    assert (stats.created, stats.modified, stats.deleted) == (2, 1, 1)
+    assert (dst / "pkg" / "mod.py").read_text() == "x = 1\n"
+    assert (dst / "setup.py").exists()
+    assert not (dst / "pkg" / "new").exists()
+    assert snapshot.changes() == ([], [], [])
@@ -0,0 +1,55 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from flapy.analysis import ZYGOTE_SCRIPT
+
+
+def test_zygote_runs_forked_children(tmp_path: Path):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "data.txt").write_text("original")
+    (project / "test_a.py").write_text(
+        "import os\nIMPORTED_BY = os.getpid()\n"
+        "def test_fork():\n    assert IMPORTED_BY != os.getpid()\n"
+        "def test_writes():\n"
+        "    assert not os.path.exists('created.txt')\n"
+        "    assert open('data.txt').read() == 'original'\n"
+        "    open('created.txt', 'w').write('new')\n"
+        "    open('data.txt', 'w').write('changed')\n"
+    )
+    plan = {
+        "collect": ["--rootdir=.", "test_a.py"],
+        "runs": [
+            {
+                "args": [
+                    "--rootdir=.",
+                    "test_a.py",
+                    f"--junitxml={tmp_path / f'out{i}.xml'}",
+                ],
+                "output": str(tmp_path / f"out{i}.log"),
+            }
+            for i in range(2)
+        ],
+        "backup": str(tmp_path / "backup"),
+        "report": str(tmp_path / "report.json"),
+    }
+    (tmp_path / "plan.json").write_text(json.dumps(plan))
+
+    subprocess.run(
+        [sys.executable, ZYGOTE_SCRIPT, str(tmp_path / "plan.json")],
+        cwd=str(project),
+        check=True,
+    )
+
+    # The test module is only imported by the parent, thus the children pass, and
+    # the changes of the first child are undone before the second one
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert [run["exit_code"] for run in report["runs"]] == [0, 0]
+    # created.txt, data.txt and the cache of pytest
+    assert report["runs"][1]["reset_files"] >= 2
+    assert (tmp_path / "out0.xml").exists() and (tmp_path / "out1.xml").exists()
+    assert "2 passed" in (tmp_path / "out1.log").read_text()
+    assert report["saved"] >= 0
+    assert not (tmp_path / "backup").exists()